@@ -0,0 +1,278 @@
+"""Локальный заменитель YouTube для замеров загрузки: resumable-протокол videos.insert
+(как его использует googleapiclient) с имитацией плохой сети.
+
+Протокол:
+    POST /upload/youtube/v3/videos?uploadType=resumable  — метаданные, ответ 200 + Location сессии
+    PUT  /upload/session/<id>  Content-Range: bytes a-b/total  — чанк, ответ 308 + Range или 200 + ресурс видео
+    PUT  /upload/session/<id>  Content-Range: bytes */total     — запрос подтверждённого диапазона
+
+Имитация сети (NetworkProfile): задержка ответа, ограничение скорости приёма,
+доля ответов 503 и доля соединений, оборванных посреди тела чанка. Сервер принимает
+только байты, продолжающие подтверждённый диапазон, и считает их sha256 — бенчмарк
+сверяет его с исходным файлом.
+
+Запуск отдельно (для ручной проверки окна с root_url):
+    python bench/fake_youtube.py --port 8765 --latency 0.05 --bandwidth-kbps 2048 --error-rate 0.05
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import urlparse, parse_qs
+
+# не последний чанк resumable-загрузки должен быть кратен 256 KB
+CHUNK_GRANULARITY = 256 * 1024
+READ_BLOCK = 64 * 1024
+
+
+@dataclass
+class NetworkProfile:
+    name: str = 'lan'
+    latency: float = 0.0            # с, перед каждым ответом
+    bandwidth: int = 0              # байт/с приёма тела, 0 — без ограничения
+    error_rate: float = 0.0         # доля чанков, на которые отвечаем 503
+    drop_rate: float = 0.0          # доля чанков, на которых рвём соединение посреди тела
+
+
+PROFILES = {
+    'lan': NetworkProfile('lan', latency=0.002),
+    'office': NetworkProfile('office', latency=0.03, bandwidth=8 * 1024 * 1024),
+    'dsl': NetworkProfile('dsl', latency=0.06, bandwidth=1536 * 1024),
+    'lossy': NetworkProfile('lossy', latency=0.08, bandwidth=4 * 1024 * 1024, error_rate=0.08, drop_rate=0.05),
+}
+
+
+class _Session:
+    def __init__(self, total, meta):
+        self.total = total              # None — размер неизвестен до последнего чанка
+        self.meta = meta
+        self.received = 0
+        self.digest = hashlib.sha256()
+        self.video_id = None
+        self.lock = Lock()
+
+
+class FakeYouTubeServer(ThreadingHTTPServer):
+    """HTTP-сервер с сессиями загрузки; счётчики для отчёта бенчмарка — в stats."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, profile=None, seed=None):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.profile = profile or PROFILES['lan']
+        self.sessions = {}
+        self.videos = {}                # video_id -> {'size', 'sha256', 'meta'}
+        self.stats = {'requests': 0, 'chunks': 0, 'errors': 0, 'drops': 0, 'status_queries': 0}
+        self._lock = Lock()
+        self._random = random.Random(seed)
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def roll(self, rate):
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def start(self):
+        self._thread = Thread(target=self.serve_forever, name='fake-youtube', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: FakeYouTubeServer
+
+    def log_message(self, fmt, *args):
+        logging.debug('fake-youtube: ' + fmt, *args)
+
+    def _reply(self, code, body=None, headers=None):
+        time.sleep(self.server.profile.latency)
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, code, reason, message):
+        self._reply(code, {'error': {'code': code, 'message': message,
+                                     'errors': [{'reason': reason, 'message': message}]}})
+
+    def _read_body(self, length, sink=None, drop_at=None):
+        """Прочитать тело с ограничением скорости. False — соединение оборвано (drop_at)."""
+        bandwidth = self.server.profile.bandwidth
+        started = time.monotonic()
+        done = 0
+        while done < length:
+            if drop_at is not None and done >= drop_at:
+                try:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                self.close_connection = True
+                return False
+            block = self.rfile.read(min(READ_BLOCK, length - done))
+            if not block:
+                self.close_connection = True
+                return False
+            done += len(block)
+            if sink is not None:
+                sink(block)
+            if bandwidth > 0:
+                ahead = done / bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return True
+
+    def do_POST(self):
+        self.server.count('requests')
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = bytearray()
+        self._read_body(length, raw.extend)
+        if not url.path.endswith('/videos') or parse_qs(url.query).get('uploadType') != ['resumable']:
+            self._error(404, 'notFound', f"Неизвестный запрос {url.path}")
+            return
+        try:
+            meta = json.loads(raw.decode('utf-8')) if raw else {}
+        except ValueError:
+            self._error(400, 'parseError', 'Метаданные не JSON')
+            return
+        total = self.headers.get('X-Upload-Content-Length')
+        sid = uuid.uuid4().hex
+        self.server.sessions[sid] = _Session(int(total) if total else None, meta)
+        host = self.headers.get('Host') or f"127.0.0.1:{self.server.server_address[1]}"
+        self._reply(200, headers={'Location': f"http://{host}/upload/session/{sid}"})
+
+    def do_PUT(self):
+        server = self.server
+        server.count('requests')
+        m = re.match(r'^/upload/session/([0-9a-f]+)$', urlparse(self.path).path)
+        session = server.sessions.get(m.group(1)) if m else None
+        length = int(self.headers.get('Content-Length') or 0)
+        if session is None:
+            self._read_body(length)
+            self._error(404, 'notFound', 'Сессия загрузки не найдена')
+            return
+        rng = self.headers.get('Content-Range', '')
+        status_query = re.match(r'^bytes \*/(\d+|\*)$', rng)
+        chunk = re.match(r'^bytes (\d+)-(\d+)/(\d+|\*)$', rng)
+        with session.lock:
+            if status_query:
+                server.count('status_queries')
+                if status_query.group(1) != '*':
+                    session.total = int(status_query.group(1))
+                self._read_body(length)
+                self._respond_state(session)
+                return
+            if not chunk:
+                self._read_body(length)
+                self._error(400, 'badContent', f"Неверный Content-Range: {rng}")
+                return
+            server.count('chunks')
+            first, last, total = int(chunk.group(1)), int(chunk.group(2)), chunk.group(3)
+            if total != '*':
+                session.total = int(total)
+            is_last = session.total is not None and last + 1 == session.total
+            if length != last - first + 1 or (not is_last and length % CHUNK_GRANULARITY):
+                self._read_body(length)
+                self._error(400, 'badContent', f"Чанк {length} байт не кратен 256 KB или не совпадает с Content-Range")
+                return
+            if server.roll(server.profile.drop_rate):
+                server.count('drops')
+                self._read_body(length, drop_at=length // 2)
+                return
+            if server.roll(server.profile.error_rate):
+                server.count('errors')
+                self._read_body(length)
+                self._error(503, 'backendError', 'Имитация сбоя сервера')
+                return
+            if first > session.received:
+                self._read_body(length)
+                self._error(400, 'badContent', f"Пропуск байт: подтверждено {session.received}, чанк с {first}")
+                return
+            skip = session.received - first
+
+            def sink(block, state={'skip': skip}):
+                # байты, которые сервер уже подтвердил, повторно не учитываем
+                if state['skip'] >= len(block):
+                    state['skip'] -= len(block)
+                    return
+                block = block[state['skip']:]
+                state['skip'] = 0
+                session.digest.update(block)
+                session.received += len(block)
+
+            if not self._read_body(length, sink):
+                return
+            self._respond_state(session)
+
+    def _respond_state(self, session):
+        if session.total is not None and session.received >= session.total:
+            if session.video_id is None:
+                session.video_id = uuid.uuid4().hex[:11]
+                self.server.videos[session.video_id] = {'size': session.received,
+                                                        'sha256': session.digest.hexdigest(),
+                                                        'meta': session.meta}
+            meta = session.meta or {}
+            self._reply(200, {'kind': 'youtube#video', 'id': session.video_id,
+                              'snippet': meta.get('snippet', {}),
+                              'status': dict(meta.get('status', {}), uploadStatus='uploaded')})
+            return
+        headers = {'Range': f"bytes=0-{session.received - 1}"} if session.received else {}
+        self._reply(308, headers=headers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Локальный сервер resumable-загрузки YouTube с имитацией сети.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='lan')
+    parser.add_argument('--latency', type=float, help='задержка ответа, с')
+    parser.add_argument('--bandwidth-kbps', type=int, help='ограничение скорости приёма, КБ/с')
+    parser.add_argument('--error-rate', type=float, help='доля ответов 503 на чанки')
+    parser.add_argument('--drop-rate', type=float, help='доля оборванных соединений')
+    args = parser.parse_args(argv)
+    base = PROFILES[args.profile]
+    profile = NetworkProfile(
+        'custom' if any(v is not None for v in (args.latency, args.bandwidth_kbps, args.error_rate, args.drop_rate))
+        else base.name,
+        latency=base.latency if args.latency is None else args.latency,
+        bandwidth=base.bandwidth if args.bandwidth_kbps is None else args.bandwidth_kbps * 1024,
+        error_rate=base.error_rate if args.error_rate is None else args.error_rate,
+        drop_rate=base.drop_rate if args.drop_rate is None else args.drop_rate,
+    )
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = FakeYouTubeServer(args.port, profile)
+    logging.info(f"Сервер на {server.url} ({profile})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Бенчмарк загрузки: настоящий цикл UploadJob (чанки, AdaptiveChunkSizer, повторы,
+журнал сессий, пул соединений) против локального bench/fake_youtube.py — без YouTube и без квоты.
+
+Для каждого профиля сети и размера файла печатает время, среднюю скорость, число
+чанков и повторов, счётчики сервера (503, обрывы) и сверяет sha256 принятых байт с файлом.
+
+Примеры (из корня репозитория):
+    python bench/upload_bench.py
+    python bench/upload_bench.py --sizes 16 128 --profiles lan lossy --repeat 3
+    python bench/upload_bench.py --profiles dsl --limit-kbps 1024 --json results.json
+
+Проверка видео (ffmpeg) в замер не входит — файлы заполнены случайными байтами.
+Журнал, индекс содержимого и кэши пишутся во временную папку, а не в рабочую.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_youtube import FakeYouTubeServer, PROFILES  # noqa: E402
+
+WRITE_BLOCK = 4 * 1024 * 1024
+
+
+def make_file(directory, size_mb, seed):
+    """Файл size_mb MB псевдослучайных байт и его sha256."""
+    path = os.path.join(directory, f"bench_{size_mb}mb.mp4")
+    digest = hashlib.sha256()
+    block = hashlib.sha256(str(seed).encode()).digest() * (WRITE_BLOCK // 32)
+    left = size_mb * 1024 * 1024
+    with open(path, 'wb') as f:
+        i = 0
+        while left > 0:
+            # каждый блок отличается первыми байтами — без повторов на границах чанков
+            data = i.to_bytes(8, 'big') + block[8:min(WRITE_BLOCK, left)]
+            f.write(data)
+            digest.update(data)
+            left -= len(data)
+            i += 1
+    return path, digest.hexdigest()
+
+
+def run_case(core, server, path, expected_sha, title):
+    class BenchUploadJob(core.UploadJob):
+        def _validate_video_file(self, path):
+            pass
+
+    from google.oauth2.credentials import Credentials
+
+    job = BenchUploadJob(Credentials(token='bench'), path, title, core.build_description('http://bench.local/'))
+    started = time.monotonic()
+    job.run()
+    wall = time.monotonic() - started
+    ok, msg = job.result or (False, 'отменено')
+    summary = job.stats.summary() if job.stats is not None else {}
+    video = server.videos.get(job.video_id) if ok else None
+    return {
+        'ok': bool(ok),
+        'error': None if ok else msg,
+        'wall': round(wall, 2),
+        'mb_s': round(os.path.getsize(path) / (1024 * 1024) / wall, 2) if wall > 0 else 0,
+        'chunks': summary.get('chunks', 0),
+        'retries': summary.get('retries', 0),
+        'retry_wait': summary.get('retry_wait', 0),
+        'latency_avg_ms': round((summary.get('latency_avg') or 0) * 1000),
+        'verified': bool(video and video['sha256'] == expected_sha),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер загрузки UploadJob через локальный сервер YouTube.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 64, 256], help='размеры файлов, MB')
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['lan', 'dsl', 'lossy'])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--limit-kbps', type=int, default=0, help='ограничение upload_bandwidth, КБ/с')
+    parser.add_argument('--seed', type=int, default=1, help='зерно случайных сбоев сервера')
+    parser.add_argument('--json', help='сохранить результаты в файл')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    workdir = tempfile.mkdtemp(prefix='helper_bench_')
+    cwd = os.getcwd()
+    results = []
+    try:
+        # журнал загрузок и индексы uploader_core — относительные пути, пишем их во временную папку
+        os.chdir(workdir)
+        import uploader_core as core
+        core.upload_bandwidth.set_rate(args.limit_kbps * 1024)
+        files = {size: make_file(workdir, size, size) for size in args.sizes}
+
+        print(f"{'профиль':<8} {'MB':>5} {'время, c':>9} {'MB/s':>7} {'чанков':>7} {'повт.':>6} "
+              f"{'503':>4} {'обрыв':>6} {'ответ, мс':>10}  итог")
+        for name in args.profiles:
+            for size in args.sizes:
+                path, sha = files[size]
+                for rep in range(args.repeat):
+                    server = FakeYouTubeServer(profile=PROFILES[name], seed=args.seed + rep).start()
+                    core.youtube_services = core.YouTubeServiceFactory(root_url=server.url)
+                    try:
+                        res = run_case(core, server, path, sha, f"bench {name} {size}MB #{rep + 1}")
+                    finally:
+                        server.stop()
+                    res.update(profile=name, size_mb=size, run=rep + 1, server=dict(server.stats))
+                    results.append(res)
+                    verdict = 'ok' if res['ok'] and res['verified'] else (res['error'] or 'sha256 не совпал')
+                    print(f"{name:<8} {size:>5} {res['wall']:>9.2f} {res['mb_s']:>7.2f} {res['chunks']:>7} "
+                          f"{res['retries']:>6} {server.stats['errors']:>4} {server.stats['drops']:>6} "
+                          f"{res['latency_avg_ms']:>10}  {verdict}", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0 if all(r['ok'] and r['verified'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
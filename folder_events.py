@@ -0,0 +1,164 @@
+"""Уведомления о новых файлах в папках без Qt и сторонних модулей: ReadDirectoryChangesW
+(Windows) и inotify (Linux) через ctypes.
+
+Используется наблюдением за папками записи в окне (youtube_uploader.FolderWatcher).
+"""
+import os
+import sys
+import ctypes
+import select
+import struct
+import logging
+from threading import Thread
+
+
+class NativeFolderEvents:
+    """События создания/переименования файлов в папках без сторонних модулей:
+    ReadDirectoryChangesW (Windows) или inotify (Linux), в фоновых потоках.
+
+    Подписка только на имена файлов — запись в уже созданный файл событий не порождает,
+    папка не перечитывается. on_file(path) вызывается из фонового потока; on_overflow(folder) —
+    если ОС потеряла события (переполнен буфер), тогда папку нужно сверить целиком.
+    """
+    BUFFER_SIZE = 64 * 1024
+    POLL_SECONDS = 0.5
+
+    def __init__(self, folders, on_file, on_overflow):
+        self.folders = list(folders)
+        self.on_file = on_file
+        self.on_overflow = on_overflow
+        self._stopped = False
+        self._threads = []
+        self._handles = []
+        self._fd = None
+
+    @staticmethod
+    def supported():
+        return os.name == 'nt' or sys.platform.startswith('linux')
+
+    def start(self):
+        """True — наблюдение запущено; False — платформа не поддерживается или ошибка ОС."""
+        try:
+            if os.name == 'nt':
+                self._start_windows()
+            elif sys.platform.startswith('linux'):
+                self._start_inotify()
+            else:
+                return False
+            return True
+        except Exception as e:
+            logging.warning(f"Системные уведомления о файлах недоступны: {e}")
+            self.stop()
+            return False
+
+    def stop(self):
+        self._stopped = True
+        if os.name == 'nt' and self._handles:
+            from ctypes import wintypes
+            k32 = ctypes.windll.kernel32
+            for handle in self._handles:
+                # прерывает ReadDirectoryChangesW, ожидающий в потоке папки
+                k32.CancelIoEx(wintypes.HANDLE(handle), None)
+        for th in self._threads:
+            th.join(2)
+        self._threads = []
+        if os.name == 'nt' and self._handles:
+            for handle in self._handles:
+                k32.CloseHandle(wintypes.HANDLE(handle))
+        self._handles = []
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def _start_windows(self):
+        from ctypes import wintypes
+        k32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        k32.CreateFileW.restype = wintypes.HANDLE
+        k32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                    wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+        k32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD, wintypes.BOOL,
+                                              wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID,
+                                              wintypes.LPVOID]
+        FILE_LIST_DIRECTORY = 0x0001
+        SHARE_ALL = 0x00000007
+        OPEN_EXISTING = 3
+        FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+        FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+        FILE_ACTION_ADDED, FILE_ACTION_RENAMED_NEW_NAME = 1, 5
+        invalid = wintypes.HANDLE(-1).value
+        for folder in self.folders:
+            handle = k32.CreateFileW(folder, FILE_LIST_DIRECTORY, SHARE_ALL, None, OPEN_EXISTING,
+                                     FILE_FLAG_BACKUP_SEMANTICS, None)
+            if handle in (None, invalid):
+                raise OSError(ctypes.get_last_error(), f"CreateFileW {folder}")
+            self._handles.append(handle)
+
+            def loop(folder=folder, handle=handle):
+                buf = ctypes.create_string_buffer(self.BUFFER_SIZE)
+                returned = wintypes.DWORD()
+                while not self._stopped:
+                    if not k32.ReadDirectoryChangesW(handle, buf, len(buf), False, FILE_NOTIFY_CHANGE_FILE_NAME,
+                                                     ctypes.byref(returned), None, None):
+                        if not self._stopped:
+                            logging.warning(f"Наблюдение за {folder} прервано: ошибка {ctypes.get_last_error()}")
+                        return
+                    if returned.value == 0:
+                        self.on_overflow(folder)
+                        continue
+                    raw, offset = buf.raw, 0
+                    while True:
+                        next_offset, action, name_len = struct.unpack_from('<III', raw, offset)
+                        if action in (FILE_ACTION_ADDED, FILE_ACTION_RENAMED_NEW_NAME):
+                            name = raw[offset + 12:offset + 12 + name_len].decode('utf-16-le')
+                            self.on_file(os.path.join(folder, name))
+                        if not next_offset:
+                            break
+                        offset += next_offset
+
+            th = Thread(target=loop, name='folder-events', daemon=True)
+            self._threads.append(th)
+        for th in self._threads:
+            th.start()
+
+    def _start_inotify(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        IN_MOVED_TO, IN_CREATE, IN_Q_OVERFLOW, IN_ISDIR = 0x80, 0x100, 0x4000, 0x40000000
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self._fd = fd
+        watches = {}
+        for folder in self.folders:
+            wd = libc.inotify_add_watch(fd, os.fsencode(folder), IN_CREATE | IN_MOVED_TO)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {folder}")
+            watches[wd] = folder
+
+        def loop():
+            while not self._stopped:
+                try:
+                    ready, _, _ = select.select([fd], [], [], self.POLL_SECONDS)
+                    if not ready:
+                        continue
+                    raw = os.read(fd, self.BUFFER_SIZE)
+                except OSError:
+                    if not self._stopped:
+                        logging.exception('Ошибка чтения событий inotify')
+                    return
+                offset = 0
+                while offset + 16 <= len(raw):
+                    wd, mask, _cookie, name_len = struct.unpack_from('iIII', raw, offset)
+                    name = raw[offset + 16:offset + 16 + name_len].rstrip(b'\0')
+                    offset += 16 + name_len
+                    if mask & IN_Q_OVERFLOW:
+                        for folder in watches.values():
+                            self.on_overflow(folder)
+                    elif name and not mask & IN_ISDIR and wd in watches:
+                        self.on_file(os.path.join(watches[wd], os.fsdecode(name)))
+
+        th = Thread(target=loop, name='folder-events', daemon=True)
+        self._threads.append(th)
+        th.start()
@@ -0,0 +1,278 @@
+"""Консольная пакетная загрузка видео на YouTube — без окна и без PyQt6 (для cron и машины записи).
+
+Использует ту же логику загрузки, что и окно (uploader_core.UploadJob), и тот же token.pickle
+(авторизуйтесь один раз в окне программы).
+
+Примеры:
+    python helper_cli.py "D:/clips/*.mp4" --link https://forum.example/complaint/123
+    python helper_cli.py a.mp4 b.mp4 --link https://... --title "Жалоба {index}: {stem}" --concurrency 3
+    python helper_cli.py --manifest batch.json
+
+batch.json: [{"path": "...", "title": "...", "link": "...", "desc": "...", "privacy": "unlisted"}, ...]
+
+Результат — по одной JSON-строке на файл в stdout (по мере завершения), журнал — в stderr.
+status: uploaded | duplicate | deferred | failed | cancelled.
+Код выхода: 0 — всё загружено, 1 — есть неудачные/отложенные, 2 — неверные аргументы или нет авторизации.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+
+CREDENTIALS_FILE = 'token.pickle'
+CONFIG_FILE = 'config.json'
+PRIVACY_CHOICES = ('private', 'unlisted', 'public')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетная загрузка видео-доказательств на YouTube без окна.')
+    parser.add_argument('files', nargs='*', help='файлы или шаблоны (glob), например "clips/*.mp4"')
+    parser.add_argument('--manifest', help='JSON-список заданий: path, title, link, desc, privacy')
+    parser.add_argument('--link', help='ссылка на жалобу (для всех файлов из командной строки)')
+    parser.add_argument('--title', default='{stem}',
+                        help='заголовок; подстановки {stem}, {name}, {index} (по умолчанию: имя файла)')
+    parser.add_argument('--desc', default='', help='дополнительный текст описания')
+    parser.add_argument('--privacy', choices=PRIVACY_CHOICES, help='приватность (по умолчанию из config.json)')
+    parser.add_argument('--concurrency', type=int, default=2, help='одновременных загрузок (по умолчанию 2)')
+    parser.add_argument('--validation', choices=('probe', 'sampled', 'full'),
+                        help='глубина проверки видео (по умолчанию из config.json)')
+    parser.add_argument('--faststart', action='store_true',
+                        help='перенести индекс MP4 (moov) в начало файла перед загрузкой (копия во временной папке)')
+    parser.add_argument('--no-faststart', action='store_true',
+                        help='не переносить индекс MP4 в начало, даже если это включено в config.json')
+    parser.add_argument('--allow-missing-ffmpeg', action='store_true', help='загружать без проверки, если нет ffmpeg')
+    parser.add_argument('--allow-duplicates', action='store_true',
+                        help='загружать, даже если такое же видео уже загружено')
+    parser.add_argument('--limit-kbps', type=int, help='ограничение скорости, КБ/с (0 — без ограничения)')
+    parser.add_argument('--token', default=CREDENTIALS_FILE, help='файл авторизации (token.pickle)')
+    parser.add_argument('--progress', action='store_true', help='печатать прогресс в stderr')
+    parser.add_argument('-v', '--verbose', action='store_true', help='подробный журнал в stderr')
+    return parser.parse_args(argv)
+
+
+def load_config():
+    try:
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                cfg = json.load(f)
+                if isinstance(cfg, dict):
+                    return cfg
+    except Exception:
+        logging.exception('Не удалось прочитать config.json')
+    return {}
+
+
+def collect_jobs(args, cfg):
+    """Список заданий {'path', 'title', 'link', 'desc', 'privacy'} из манифеста и аргументов."""
+    privacy = args.privacy or cfg.get('default_privacy', 'private')
+    jobs = []
+    if args.manifest:
+        with open(args.manifest, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        if not isinstance(entries, list):
+            raise ValueError('манифест должен быть JSON-списком')
+        for e in entries:
+            jobs.append({
+                'path': e['path'],
+                'title': e.get('title') or os.path.splitext(os.path.basename(e['path']))[0],
+                'link': e.get('link') or args.link,
+                'desc': e.get('desc', args.desc),
+                'privacy': e.get('privacy', privacy),
+            })
+    seen = {os.path.abspath(j['path']) for j in jobs}
+    for pattern in args.files:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for path in matches:
+            if os.path.abspath(path) in seen:
+                continue
+            seen.add(os.path.abspath(path))
+            name = os.path.basename(path)
+            jobs.append({
+                'path': path,
+                'title': args.title.format(stem=os.path.splitext(name)[0], name=name, index=len(jobs) + 1),
+                'link': args.link,
+                'desc': args.desc,
+                'privacy': privacy,
+            })
+    for j in jobs:
+        if not j['link'] or not str(j['link']).startswith(('http://', 'https://')):
+            raise ValueError(f"нет ссылки на жалобу (http/https) для {j['path']}")
+        if j['privacy'] not in PRIVACY_CHOICES:
+            j['privacy'] = 'private'
+        if not j['title']:
+            raise ValueError(f"пустой заголовок для {j['path']}")
+    return jobs
+
+
+def load_credentials(path):
+    """Учётные данные из token.pickle (с обновлением истёкшего токена) или None."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        creds = pickle.load(f)
+    if creds and not creds.valid and getattr(creds, 'refresh_token', None):
+        creds.refresh(core.youtube_services.auth_request())
+        with open(path, 'wb') as f:
+            pickle.dump(creds, f)
+    return creds if creds and creds.valid else None
+
+
+class BatchUploader:
+    """Параллельная загрузка списка заданий; результаты печатаются JSON-строками по мере готовности."""
+
+    def __init__(self, creds, args, cfg, out=sys.stdout):
+        self.creds = creds
+        self.args = args
+        self.validation_mode = args.validation or cfg.get('validation_mode', 'sampled')
+        self.allow_missing_ffmpeg = args.allow_missing_ffmpeg or bool(cfg.get('allow_upload_without_ffmpeg', False))
+        self.faststart = not args.no_faststart and (args.faststart or bool(cfg.get('faststart_before_upload', False)))
+        self.out = out
+        self._out_lock = Lock()
+        self._jobs = []
+        self._cancelled = False
+
+    def _print(self, result):
+        with self._out_lock:
+            self.out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            self.out.flush()
+
+    def _progress_printer(self, name):
+        last = [0.0]
+
+        def on_progress_info(info):
+            now = time.monotonic()
+            if now - last[0] >= 5:
+                last[0] = now
+                sys.stderr.write(f"{name}: {core.format_upload_progress(info)}\n")
+        return on_progress_info
+
+    def upload_one(self, spec):
+        path = spec['path']
+        result = {'path': path, 'title': spec['title']}
+        started = time.monotonic()
+        if self._cancelled:
+            return dict(result, status='cancelled')
+        if not os.path.isfile(path):
+            return dict(result, status='failed', error='файл не найден')
+        # задание регистрируется до проверки дубликата: Ctrl-C отменяет и подсчёт хэша
+        job = core.UploadJob(
+            self.creds, path, spec['title'], core.build_description(spec['link'], spec.get('desc', '')),
+            allow_missing_ffmpeg=self.allow_missing_ffmpeg, privacy_status=spec['privacy'],
+            validation_mode=self.validation_mode, faststart=self.faststart,
+            on_progress_info=self._progress_printer(os.path.basename(path)) if self.args.progress else None)
+        self._jobs.append(job)
+        should_stop = lambda: self._cancelled or job._is_cancelled
+        if should_stop():
+            return dict(result, status='cancelled')
+        if not self.args.allow_duplicates:
+            digest = core.content_index.compute(path, should_stop=should_stop)
+            if digest is None:
+                return dict(result, status='cancelled')
+            existing = core.content_index.lookup(digest)
+            if existing:
+                return dict(result, status='duplicate', url=existing['url'])
+        cost = 0 if core.upload_journal.find(path) else core.QuotaLedger.COSTS['videos.insert']
+        if cost and core.quota_ledger.try_reserve('videos.insert', cost) is None:
+            return dict(result, status='deferred', error='квота YouTube на сегодня исчерпана',
+                        reset_at=core.quota_ledger.reset_at_local())
+        job.run()
+        result['elapsed'] = round(time.monotonic() - started, 1)
+        if job.result is None:
+            return dict(result, status='cancelled')
+        ok, msg = job.result
+        if not ok and cost and not job.insert_started:
+            core.quota_ledger.refund('videos.insert', cost)
+        if job.stats is not None:
+            result['stats'] = job.stats.summary()
+        if ok:
+            return dict(result, status='uploaded', url=msg, video_id=job.video_id)
+        if job.quota_exceeded:
+            return dict(result, status='deferred', error=msg, reset_at=core.quota_ledger.reset_at_local())
+        return dict(result, status='failed', error=msg)
+
+    def cancel(self):
+        self._cancelled = True
+        for job in self._jobs:
+            job.cancel()
+
+    def run(self, specs):
+        """Загрузить всё; возвращает список результатов."""
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, self.args.concurrency)) as pool:
+            futures = [pool.submit(self.upload_one, spec) for spec in specs]
+            try:
+                for fut in as_completed(futures):
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        logging.exception('Ошибка загрузки')
+                        res = {'status': 'failed', 'error': str(e)}
+                    results.append(res)
+                    self._print(res)
+            except KeyboardInterrupt:
+                logging.warning('Прервано: отменяем загрузки (сессии сохранены в журнале)')
+                self.cancel()
+                for fut in futures:
+                    fut.cancel()
+                raise
+        return results
+
+
+core = None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    cfg = load_config()
+    try:
+        specs = collect_jobs(args, cfg)
+    except (ValueError, KeyError, OSError) as e:
+        sys.stderr.write(f"Ошибка: {e}\n")
+        return 2
+    if not specs:
+        sys.stderr.write('Ошибка: не указано ни одного файла\n')
+        return 2
+
+    # тяжёлые модули (клиент Google API) — только когда есть что загружать
+    global core
+    import uploader_core as core
+
+    try:
+        creds = load_credentials(args.token)
+    except Exception as e:
+        creds = None
+        logging.warning(f"Не удалось загрузить авторизацию: {e}")
+    if creds is None:
+        sys.stderr.write(f"Ошибка: нет действующей авторизации в {args.token} — авторизуйтесь в окне программы\n")
+        return 2
+
+    try:
+        core.quota_ledger.daily_limit = max(1, int(cfg.get('daily_quota', core.quota_ledger.daily_limit)))
+    except (TypeError, ValueError):
+        pass
+    if args.limit_kbps is not None:
+        kbps = max(0, args.limit_kbps)
+    else:
+        kbps = core.scheduled_upload_limit_kbps(cfg.get('upload_limit_kbps', 0), cfg.get('work_hours_limit_kbps', 0),
+                                                cfg.get('work_hours', ''))
+    core.upload_bandwidth.set_rate(kbps * 1024)
+    core.FaststartRemuxer.prune(core.upload_journal.pending())
+
+    uploader = BatchUploader(creds, args, cfg)
+    try:
+        results = uploader.run(specs)
+    except KeyboardInterrupt:
+        return 1
+    return 0 if all(r.get('status') in ('uploaded', 'duplicate') for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""TrimPipeUpload против настоящего HttpRequest.next_chunk (googleapiclient): последний чанк
+определяется только по короткому getbytes(), а не по EOF между вызовами chunksize()."""
+import os
+import queue
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.http import HttpMockSequence, HttpRequest  # noqa: E402
+
+import uploader_core  # noqa: E402
+
+CHUNK = 256 * 1024
+
+
+class _FakeStdout:
+    """stdout ffmpeg, который тест наполняет вручную; b'' — EOF."""
+
+    def __init__(self):
+        self.blocks = queue.Queue()
+
+    def read1(self, _size):
+        return self.blocks.get()
+
+
+class _FakeProc:
+    returncode = 0
+
+    def __init__(self, *_args, stderr=None, **_kwargs):
+        self.stdout = _FakeStdout()
+        self.stderr = stderr
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+class TrimPipeUploadTest(unittest.TestCase):
+    def _media(self, proc=_FakeProc):
+        with mock.patch.object(uploader_core.subprocess, 'Popen', proc):
+            media = uploader_core.TrimPipeUpload('in.mp4', 0, 10, CHUNK)
+        self.addCleanup(media.close)
+        return media
+
+    def _request(self, media, responses):
+        http = HttpMockSequence(responses)
+        request = HttpRequest(http, lambda resp, content: content, 'http://upload.test/videos?uploadType=resumable',
+                              method='POST', body='{}', headers={'content-type': 'application/json'},
+                              resumable=media)
+        return request, http
+
+    def _put_ranges(self, http):
+        return [headers.get('Content-Range') for _uri, method, _body, headers in http.request_sequence
+                if method == 'PUT']
+
+    def test_eof_between_getbytes_and_chunksize_keeps_full_chunk(self):
+        media = self._media()
+        media._proc.stdout.blocks.put(b'a' * (CHUNK + 1000))
+        original = media.getbytes
+
+        def getbytes_then_eof(begin, length):
+            # EOF ffmpeg приходит сразу после чтения чанка, до второго chunksize() в next_chunk
+            data = original(begin, length)
+            media._proc.stdout.blocks.put(b'')
+            media._reader.join(5)
+            return data
+
+        with mock.patch.object(media, 'getbytes', getbytes_then_eof):
+            request, http = self._request(media, [
+                ({'status': '200', 'location': 'http://upload.test/session/1'}, ''),
+                ({'status': '308', 'range': f'bytes=0-{CHUNK - 1}'}, ''),
+            ])
+            status, body = request.next_chunk()
+        self.assertIsNone(body)
+        self.assertEqual(self._put_ranges(http), [f'bytes 0-{CHUNK - 1}/*'])
+
+        http._iterable.append(({'status': '200'}, '{"id": "abc"}'))
+        status, body = request.next_chunk(http=http)
+        self.assertEqual(body, b'{"id": "abc"}')
+        self.assertEqual(self._put_ranges(http)[-1], f'bytes {CHUNK}-{CHUNK + 999}/{CHUNK + 1000}')
+
+    def test_remainder_of_exactly_one_chunk_is_last(self):
+        media = self._media()
+        media._proc.stdout.blocks.put(b'b' * CHUNK)
+        media._proc.stdout.blocks.put(b'')
+        request, http = self._request(media, [
+            ({'status': '200', 'location': 'http://upload.test/session/2'}, ''),
+            ({'status': '200'}, '{"id": "xyz"}'),
+        ])
+        status, body = request.next_chunk()
+        self.assertIsNotNone(body)
+        self.assertEqual(self._put_ranges(http), [f'bytes 0-{CHUNK - 1}/{CHUNK}'])
+
+    def test_ffmpeg_failure_raises_trim_pipe_error(self):
+        class _FailingProc(_FakeProc):
+            returncode = 1
+
+        media = self._media(_FailingProc)
+        media._stderr.write(b'Invalid data found when processing input')
+        media._stderr.flush()
+        media._proc.stdout.blocks.put(b'')
+        with self.assertRaises(uploader_core.TrimPipeError) as ctx:
+            media.getbytes(0, CHUNK)
+        self.assertIn('Invalid data', str(ctx.exception))
+        self.assertEqual(uploader_core.UploadRetryPolicy().classify(ctx.exception), 'fatal')
+
+
+if __name__ == '__main__':
+    unittest.main()
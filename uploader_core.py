@@ -0,0 +1,2727 @@
+"""Ядро загрузки на YouTube без Qt: клиент API, журнал сессий, ограничение скорости,
+проверка видео, учёт квоты и сама загрузка (UploadJob).
+
+Используется окном (youtube_uploader.py) и консольной утилитой (helper_cli.py).
+"""
+import os
+import bisect
+import json
+import mmap
+import random
+import socket
+import hashlib
+import logging
+import tempfile
+import time
+import subprocess
+import shutil
+import concurrent.futures
+import multiprocessing
+import urllib.request
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from threading import Thread, Lock, Condition, Event, get_ident
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+import httplib2
+import requests
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from google.auth.transport.requests import Request, AuthorizedSession
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import MediaIoBaseUpload, MediaUpload
+from googleapiclient.errors import HttpError
+
+MAX_WORKERS = multiprocessing.cpu_count()
+
+# Оптимизация доступа к файлам
+file_lock = Lock()
+
+
+def _atomic_write_json(path, data, indent=2):
+    """Записать data в path атомарно: во временный файл рядом, затем os.replace под file_lock.
+    Сбой посреди записи не оставляет обрезанный файл; ошибки пробрасываются вызывающему."""
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.',
+                               dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        with file_lock:
+            os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class _FileLock:
+    """Межпроцессная блокировка на файле path + '.lock': GUI и helper_cli меняют одни и те же
+    учёт квоты и индекс содержимого. Не реентерабельна — внутри процесса её берут под своим Lock."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path) + '.lock'
+        self._fd = None
+
+    def __enter__(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK сдаётся примерно через 10 с — держатель ещё пишет, ждём дальше
+                        continue
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return self
+
+    def __exit__(self, *exc):
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+# Кэширование для часто используемых операций
+@lru_cache(maxsize=128)
+def get_file_size(file_path):
+    """Кэшированное получение размера файла."""
+    try:
+        return os.path.getsize(file_path)
+    except (OSError, IOError):
+        return 0
+
+
+def build_description(link, extra=''):
+    """Описание видео: ссылка на жалобу и, если есть, дополнительный текст."""
+    d = f"Ссылка на жалобу: {link}"
+    if extra:
+        d += f"\n\n{extra}"
+    return d
+
+
+class UploadCancelled(Exception):
+    """Загрузка отменена пользователем (прерывает отправку тела чанка на полпути
+    или проверку видео перед загрузкой)."""
+
+
+DISCOVERY_CACHE_FILE = 'youtube_v3_discovery.json'
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest'
+
+
+class _StreamBody:
+    """Тело запроса из файлового объекта (_StreamSlice чанка) с известной длиной:
+    requests отправляет его блоками через read(), а не целиком и не chunked-кодированием,
+    так что ограничение скорости и отмена продолжают работать внутри чанка."""
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, n=-1):
+        return self._stream.read(n)
+
+
+# соединение, на котором сейчас идёт запрос, по id потока — чтобы отмена могла оборвать сокет
+_active_connections = {}
+_active_connections_lock = Lock()
+
+
+class _TrackedPoolMixin:
+    def _make_request(self, conn, *args, **kwargs):
+        ident = get_ident()
+        with _active_connections_lock:
+            _active_connections[ident] = conn
+        try:
+            return super()._make_request(conn, *args, **kwargs)
+        finally:
+            with _active_connections_lock:
+                if _active_connections.get(ident) is conn:
+                    del _active_connections[ident]
+
+
+class _TrackedHTTPConnectionPool(_TrackedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _TrackedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter, пулы которого запоминают соединение текущего запроса (см. abort_request)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TrackedHTTPConnectionPool,
+            'https': _TrackedHTTPSConnectionPool,
+        }
+
+
+def abort_request(thread_ident):
+    """Оборвать сокет запроса, который сейчас выполняет поток thread_ident.
+
+    Заблокированные send/recv в том потоке сразу завершаются ошибкой соединения,
+    urllib3 выбрасывает такое соединение из пула. Возвращает True, если было что обрывать.
+    """
+    with _active_connections_lock:
+        conn = _active_connections.get(thread_ident)
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+        return False
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    return True
+
+
+class PooledHttp:
+    """Транспорт googleapiclient (интерфейс httplib2.Http.request) поверх общего
+    requests.Session с пулом keep-alive соединений.
+
+    Потокобезопасен: соединения берёт пул urllib3, поэтому один объект обслуживает
+    все загрузки, запросы канала и batch-запросы одновременно. Повторы и 401 обрабатывает
+    вызывающий код (UploadRetryPolicy / googleapiclient), сам транспорт запрос не повторяет.
+    """
+    CONNECT_TIMEOUT = 15
+
+    def __init__(self, session, credentials=None, timeout=120):
+        self.session = session
+        # googleapiclient берёт учётные данные у http-объекта для batch-запросов и обновления токена
+        self.credentials = credentials
+        self.timeout = timeout
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        headers = dict(headers or {})
+        if body is not None and not isinstance(body, (bytes, str)) and hasattr(body, 'read'):
+            length = headers.get('content-length') or headers.get('Content-Length')
+            if length is not None:
+                body = _StreamBody(body, int(length))
+        try:
+            r = self.session.request(method, uri, data=body, headers=headers,
+                                     timeout=(self.CONNECT_TIMEOUT, self.timeout),
+                                     allow_redirects=method in ('GET', 'HEAD'))
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        info = {k.lower(): v for k, v in r.headers.items()}
+        # тело уже распаковано requests
+        info.pop('content-encoding', None)
+        info['status'] = str(r.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = r.reason
+        return resp, r.content
+
+    def close(self):
+        pass
+
+
+class YouTubeServiceFactory:
+    """Общий на процесс клиент YouTube Data API и HTTP-транспорт.
+
+    - discovery-документ разбирается один раз: память → кэш на диске → документ,
+      встроенный в googleapiclient → сеть (с сохранением на диск);
+    - клиент строится один раз на набор учётных данных;
+    - весь трафик API идёт через один AuthorizedSession с пулом keep-alive соединений
+      (PooledHttp), обновление токена — через общий auth_request(): DNS/TCP/TLS не
+      повторяются на каждую загрузку, и клиент можно использовать из нескольких потоков.
+
+    root_url — другой адрес API вместо https://www.googleapis.com/ (локальный сервер
+    bench/fake_youtube.py для замеров загрузки без расхода квоты).
+    """
+    MAX_SERVICES = 4
+    HTTP_TIMEOUT = 120
+    POOL_SIZE = 16
+
+    def __init__(self, cache_path=DISCOVERY_CACHE_FILE, root_url=None):
+        self.cache_path = cache_path
+        self.root_url = root_url
+        self._lock = Lock()
+        self._doc = None
+        self._services = {}
+        self._auth_session = None
+        self._auth_lock = Lock()
+
+    def _mount_pool(self, session):
+        # повторы делает UploadRetryPolicy/googleapiclient — urllib3 запрос не повторяет
+        adapter = _TrackedHTTPAdapter(pool_connections=4, pool_maxsize=self.POOL_SIZE, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def auth_request(self):
+        """Request для обновления токенов (creds.refresh) на общем пуле соединений."""
+        with self._auth_lock:
+            if self._auth_session is None:
+                self._auth_session = self._mount_pool(requests.Session())
+            return Request(self._auth_session)
+
+    def _discovery_doc(self):
+        if self._doc is not None:
+            return self._doc
+        doc = None
+        try:
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    doc = json.load(f)
+        except Exception:
+            logging.debug('Кэш discovery-документа повреждён, загружаем заново')
+            doc = None
+        if doc is None:
+            try:
+                from googleapiclient.discovery_cache import get_static_doc
+                raw = get_static_doc('youtube', 'v3')
+                doc = json.loads(raw) if raw else None
+            except Exception:
+                doc = None
+        if doc is None:
+            logging.info('Загрузка discovery-документа YouTube API из сети')
+            with urllib.request.urlopen(DISCOVERY_URL, timeout=15) as resp:
+                doc = json.loads(resp.read().decode('utf-8'))
+        if not os.path.exists(self.cache_path):
+            try:
+                _atomic_write_json(self.cache_path, doc, indent=None)
+            except Exception:
+                logging.debug('Не удалось сохранить discovery-документ на диск')
+        self._doc = doc
+        return doc
+
+    def _http(self, creds):
+        """Авторизованный транспорт с пулом соединений для учётных данных creds."""
+        # 401 не повторяем внутри сессии: тело чанка уже прочитано, повтор делает UploadJob
+        session = AuthorizedSession(creds, refresh_status_codes=(), auth_request=self.auth_request())
+        return PooledHttp(self._mount_pool(session), credentials=creds, timeout=self.HTTP_TIMEOUT)
+
+    def get(self, creds):
+        """Клиент youtube v3 для учётных данных creds (строится один раз)."""
+        with self._lock:
+            entry = self._services.get(id(creds))
+            if entry is not None and entry[0] is creds:
+                return entry[1]
+            started = time.monotonic()
+            doc = self._discovery_doc()
+            if self.root_url:
+                root = self.root_url.rstrip('/') + '/'
+                doc = dict(doc, rootUrl=root, mtlsRootUrl=root, baseUrl=root + doc.get('servicePath', ''))
+            service = build_from_document(doc, http=self._http(creds))
+            while len(self._services) >= self.MAX_SERVICES:
+                self._services.pop(next(iter(self._services)))
+            # держим ссылку на creds, чтобы id() не переиспользовался
+            self._services[id(creds)] = (creds, service)
+            logging.info(f"Клиент YouTube API создан за {time.monotonic() - started:.2f} c")
+            return service
+
+
+youtube_services = YouTubeServiceFactory()
+
+
+class TokenBucket:
+    """Ограничитель скорости загрузки (token bucket), общий для всех загрузок.
+
+    rate — байт/с (0 — без ограничения), лимит можно менять во время загрузки.
+    Токены расходуются на каждый прочитанный для отправки блок (ThrottledFile),
+    поэтому поток байтов ровный, а не "чанк на полной скорости — пауза".
+    """
+
+    def __init__(self, rate=0, burst=None):
+        self._cond = Condition()
+        self.rate = 0
+        self.burst = 0
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        with self._cond:
+            self._refill()
+            self.rate = max(0, int(rate or 0))
+            # по умолчанию запас ~0.25 c трафика, но не меньше 16 KB
+            self.burst = int(burst) if burst else max(16 * 1024, self.rate // 4)
+            self._tokens = min(self._tokens, float(self.burst))
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(float(self.burst), self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def consume(self, n, should_stop=None):
+        """Дождаться n байт "разрешения". Возвращает False, если should_stop() сработал раньше."""
+        while n > 0:
+            with self._cond:
+                if self.rate <= 0:
+                    return True
+                self._refill()
+                take = min(n, self.burst)
+                if self._tokens >= take:
+                    self._tokens -= take
+                    n -= take
+                    continue
+                self._cond.wait(min(0.25, (take - self._tokens) / self.rate))
+            if should_stop is not None and should_stop():
+                return False
+        return True
+
+
+def scheduled_upload_limit_kbps(base_kbps, work_kbps, work_hours, now=None):
+    """Лимит скорости (КБ/с) на текущий момент: в рабочие часы (пн–пт, 'ЧЧ:ММ-ЧЧ:ММ')
+    действует work_kbps, иначе base_kbps. 0 — без ограничения."""
+    now = now or datetime.now()
+    try:
+        if work_kbps and work_hours and now.weekday() < 5:
+            start_s, end_s = [x.strip() for x in str(work_hours).split('-', 1)]
+            sh, sm = (int(x) for x in start_s.split(':'))
+            eh, em = (int(x) for x in end_s.split(':'))
+            minutes = now.hour * 60 + now.minute
+            start, end = sh * 60 + sm, eh * 60 + em
+            inside = start <= minutes < end if start <= end else (minutes >= start or minutes < end)
+            if inside:
+                return int(work_kbps)
+    except (ValueError, TypeError):
+        logging.debug(f"Неверный формат рабочих часов: {work_hours}")
+    return int(base_kbps or 0)
+
+
+class ThrottledFile:
+    """Файловый объект для MediaIoBaseUpload: каждое чтение расходует токены TokenBucket.
+
+    http.client отправляет тело запроса блоками по 8 KB, так что ограничение работает
+    на уровне байтов внутри чанка.
+    """
+
+    def __init__(self, fd, bucket, should_stop=None, on_read=None):
+        self._fd = fd
+        self._bucket = bucket
+        self._should_stop = should_stop
+        # on_read(позиция) — после каждого отданного блока (прогресс внутри чанка)
+        self._on_read = on_read
+        self.last_read = None
+
+    def _check_stop(self):
+        if self._should_stop is not None and self._should_stop():
+            # исключение из read() обрывает отправку тела чанка — соединение закрывается
+            raise UploadCancelled('Загрузка отменена')
+
+    def read(self, n=-1):
+        self._check_stop()
+        data = self._fd.read(n)
+        if data:
+            if not self._bucket.consume(len(data), self._should_stop):
+                self._check_stop()
+            self.last_read = time.monotonic()
+            if self._on_read is not None:
+                self._on_read(self._fd.tell())
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._fd.seek(offset, whence)
+
+    def tell(self):
+        return self._fd.tell()
+
+    def close(self):
+        self._fd.close()
+
+
+class MappedChunkReader:
+    """Источник байтов загрузки из файла: mmap + упреждающее чтение в отдельном потоке.
+
+    read() отдаёт memoryview на отображённый файл — блоки уходят в сокет без промежуточных
+    копий. Пока текущий чанк в сети, вспомогательный поток подтягивает с диска следующие
+    read_ahead байт (обычно следующий чанк), поэтому задержки HDD не складываются с сетевыми.
+    Уже отправленное отпускается (MADV_DONTNEED, где есть), и память не растёт с размером файла.
+    Если mmap недоступен (пустой файл, ошибка отображения) — обычное чтение с тем же упреждением.
+    """
+    READ_AHEAD = 8 * 1024 * 1024
+    PREFETCH_BLOCK = 1024 * 1024
+
+    def __init__(self, path, read_ahead=None):
+        self.path = path
+        self._f = open(path, 'rb')
+        self._size = os.fstat(self._f.fileno()).st_size
+        self._map = None
+        self._view = None
+        if self._size > 0:
+            try:
+                self._map = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    self._map.madvise(mmap.MADV_SEQUENTIAL)
+            except (OSError, ValueError):
+                logging.debug(f"mmap недоступен для {path}, чтение без отображения")
+                self._map = None
+                self._view = None
+        # размер упреждения; UploadJob выставляет его равным размеру следующего чанка
+        self.read_ahead = int(read_ahead or self.READ_AHEAD)
+        self._pos = 0
+        self._cond = Condition()
+        self._hint = 0                  # позиция чтения для потока упреждения
+        self._closed = False
+        self._thread = Thread(target=self._prefetch_loop, name='upload-readahead', daemon=True)
+        self._thread.start()
+
+    def read(self, n=-1):
+        start = self._pos
+        end = self._size if n is None or n < 0 else min(self._size, start + n)
+        if end <= start:
+            return b''
+        if self._view is not None:
+            data = self._view[start:end]
+        else:
+            self._f.seek(start)
+            data = self._f.read(end - start)
+        self._pos = start + len(data)
+        with self._cond:
+            self._hint = self._pos
+            self._cond.notify()
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._pos = max(0, int(offset))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def _prefetch_loop(self):
+        page = mmap.ALLOCATIONGRANULARITY
+        release = hasattr(mmap, 'MADV_DONTNEED') and self._map is not None
+        buf = bytearray(self.PREFETCH_BLOCK)
+        fetched = released = 0
+        try:
+            # отдельный дескриптор: позиция основного файла принадлежит потоку загрузки
+            with open(self.path, 'rb', buffering=0) as f:
+                while True:
+                    with self._cond:
+                        while not self._closed and fetched >= min(self._size, self._hint + self.read_ahead):
+                            self._cond.wait(1.0)
+                        if self._closed:
+                            return
+                        pos, ahead = self._hint, self.read_ahead
+                    # перемотка назад (повтор чанка) или прыжок вперёд (возобновление)
+                    if fetched < pos or fetched > pos + 2 * ahead:
+                        fetched = pos
+                    f.seek(fetched)
+                    n = f.readinto(buf)
+                    if not n:
+                        fetched = self._size
+                        continue
+                    fetched += n
+                    # отпускаем отправленное с запасом в два окна (сервер может попросить повтор чанка)
+                    keep_from = (pos - 2 * ahead) // page * page
+                    if release and keep_from > released:
+                        try:
+                            self._map.madvise(mmap.MADV_DONTNEED, released, keep_from - released)
+                        except (OSError, ValueError):
+                            release = False
+                        released = keep_from
+        except Exception:
+            logging.debug('Упреждающее чтение остановлено', exc_info=True)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+        try:
+            if self._view is not None:
+                self._view.release()
+            if self._map is not None:
+                self._map.close()
+        except BufferError:
+            # блок ещё удерживается транспортом — отображение закроется при сборке мусора
+            pass
+        self._f.close()
+
+
+upload_bandwidth = TokenBucket()
+
+
+class TrimPipeError(Exception):
+    """Потоковая обрезка не дала данных для загрузки: ffmpeg завершился с ошибкой или сервер
+    запросил уже отброшенные байты. Повтор чанка этого не исправит."""
+
+
+class TrimPipeUpload(MediaUpload):
+    """Источник resumable-загрузки прямо из ffmpeg: обрезка без перекодирования
+    во фрагментированный MP4 в pipe, байты уходят на YouTube по мере появления.
+
+    Размер заранее неизвестен (size() = None), последний чанк определяется по EOF.
+    В памяти держится только неподтверждённый сервером хвост — не больше двух чанков,
+    дальше ffmpeg ждёт на записи в pipe.
+
+    next_chunk() вызывает chunksize() дважды: до getbytes() и после (короткий ответ —
+    последний чанк). Второе значение фиксирует getbytes(), поэтому EOF между вызовами
+    не превращает полный чанк в последний.
+    """
+    READ_BLOCK = 256 * 1024
+
+    def __init__(self, source, start, end, chunksize, mimetype='video/mp4', should_stop=None):
+        super().__init__()
+        self._chunksize = chunksize
+        self._mimetype = mimetype
+        self._should_stop = should_stop
+        self._cond = Condition()
+        self._buf = bytearray()
+        self._buf_start = 0             # смещение первого байта буфера в выходном потоке
+        self._eof = False
+        self._closed = False
+        self._error = None
+        # значение chunksize() для проверки после getbytes() в том же next_chunk()
+        self._latched_chunksize = None
+        self.last_read = None
+        cmd = [
+            'ffmpeg', '-nostdin', '-loglevel', 'error',
+            '-ss', str(start),
+            '-i', source,
+            '-t', str(end - start),
+            '-c', 'copy',
+            # moov в начале и фрагменты — файл можно писать последовательно, без seek
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            '-f', 'mp4', 'pipe:1'
+        ]
+        # stderr — во временный файл: канал, который никто не читает до выхода ffmpeg,
+        # при заполнении остановил бы его, а с ним и загрузку
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=self._stderr)
+        self._reader = Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    while len(self._buf) > 2 * self._chunksize and not self._closed:
+                        self._cond.wait(0.5)
+                    if self._closed:
+                        return
+                block = self._proc.stdout.read1(self.READ_BLOCK)
+                if not block:
+                    break
+                with self._cond:
+                    self._buf.extend(block)
+                    self._cond.notify_all()
+            if self._proc.wait() != 0 and not self._closed:
+                self._stderr.seek(0)
+                err = self._stderr.read().decode('utf-8', errors='replace').strip()
+                self._error = f"ffmpeg завершился с ошибкой: {err[-300:] or self._proc.returncode}"
+        except Exception as e:
+            self._error = f"Ошибка чтения вывода ffmpeg: {e}"
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+
+    def chunksize(self):
+        with self._cond:
+            latched, self._latched_chunksize = self._latched_chunksize, None
+            return latched if latched is not None else self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return None
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def stream(self):
+        return None
+
+    @property
+    def bytes_total(self):
+        """Полный размер результата (известен после EOF)."""
+        return self._buf_start + len(self._buf)
+
+    def getbytes(self, begin, length):
+        with self._cond:
+            if begin < self._buf_start:
+                raise TrimPipeError('Сервер запросил уже отброшенные данные потоковой обрезки')
+            # всё до begin сервер подтвердил — освобождаем память
+            del self._buf[:begin - self._buf_start]
+            self._buf_start = begin
+            self._cond.notify_all()
+            # полный чанк отдаём, только если за ним есть ещё байт, иначе он должен быть последним
+            while not self._eof and len(self._buf) < length + 1:
+                if self._should_stop is not None and self._should_stop():
+                    raise UploadCancelled('Загрузка отменена')
+                self._cond.wait(0.25)
+            if self._error:
+                raise TrimPipeError(self._error)
+            data = bytes(self._buf[:length])
+            # последний чанк — только если после него ничего нет; если остаток ровно length,
+            # сообщаем размер на байт больше, чтобы библиотека сочла чтение коротким
+            last = self._eof and len(self._buf) <= length
+        upload_bandwidth.consume(len(data), self._should_stop)
+        with self._cond:
+            self._latched_chunksize = len(data) + 1 if last else length
+        self.last_read = time.monotonic()
+        return data
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait(timeout=5)
+        except Exception:
+            pass
+        try:
+            self._stderr.close()
+        except Exception:
+            pass
+
+
+UPLOAD_JOURNAL_FILE = 'upload_journal.json'
+
+
+class UploadJournal:
+    """Журнал незавершённых загрузок на диске.
+
+    Для каждого файла хранит размер/mtime, URI resumable-сессии YouTube и последнее
+    подтверждённое сервером смещение — это позволяет продолжить загрузку после
+    перезапуска приложения, а не начинать её с нуля.
+    """
+
+    # resumable-сессии YouTube живут около недели — старые записи не используем
+    SESSION_TTL = 6 * 24 * 3600
+
+    def __init__(self, path=UPLOAD_JOURNAL_FILE):
+        self.path = path
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict):
+                        return data
+        except Exception:
+            logging.exception('Не удалось прочитать журнал загрузок')
+        return {}
+
+    def _store(self, data):
+        try:
+            _atomic_write_json(self.path, data)
+        except Exception:
+            logging.exception('Не удалось сохранить журнал загрузок')
+
+    def _matches(self, entry):
+        """Запись актуальна, если файл не менялся и сессия ещё не истекла."""
+        try:
+            st = os.stat(entry['path'])
+            if st.st_size != entry.get('size') or int(st.st_mtime) != entry.get('mtime'):
+                return False
+            return time.time() - entry.get('created', 0) < self.SESSION_TTL
+        except (OSError, KeyError):
+            return False
+
+    def find(self, path):
+        """Вернуть актуальную запись для файла или None (устаревшая запись удаляется)."""
+        with self._lock:
+            data = self._load()
+            entry = data.get(self._key(path))
+            if entry is None:
+                return None
+            if not self._matches(entry):
+                data.pop(self._key(path), None)
+                self._store(data)
+                self._discard_upload_file(entry)
+                return None
+            return dict(entry)
+
+    def record(self, path, session_uri, offset, meta=None):
+        """Сохранить URI сессии и подтверждённое смещение для файла."""
+        with self._lock:
+            data = self._load()
+            key = self._key(path)
+            entry = data.get(key) or {}
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+            if entry.get('session_uri') != session_uri:
+                entry = {'created': time.time()}
+            entry.update({
+                'path': os.path.abspath(path),
+                'size': st.st_size,
+                'mtime': int(st.st_mtime),
+                'session_uri': session_uri,
+                'offset': int(offset or 0),
+                'updated': datetime.now().isoformat(),
+            })
+            if meta:
+                entry['meta'] = dict(meta)
+            data[key] = entry
+            self._store(data)
+
+    def remove(self, path, discard_prepared=False):
+        """Удалить запись. discard_prepared — удалить и подготовленный для сессии файл
+        (faststart-ремукс): сессия не будет продолжена."""
+        with self._lock:
+            data = self._load()
+            entry = data.pop(self._key(path), None)
+            if entry is not None:
+                self._store(data)
+        if entry is not None and discard_prepared:
+            self._discard_upload_file(entry)
+
+    def pending(self):
+        """Список актуальных незавершённых загрузок (устаревшие записи вычищаются)."""
+        with self._lock:
+            data = self._load()
+            alive = {k: v for k, v in data.items() if self._matches(v)}
+            if len(alive) != len(data):
+                self._store(alive)
+        for key, entry in data.items():
+            if key not in alive:
+                self._discard_upload_file(entry)
+        return [dict(v) for v in alive.values()]
+
+    @staticmethod
+    def _discard_upload_file(entry):
+        """Удалить faststart-ремукс записи, если это всё ещё тот же файл (исходник не трогается)."""
+        ident = (entry.get('meta') or {}).get('upload_file')
+        if not ident or len(ident) != 3 or not FaststartRemuxer.owns(ident[0]):
+            return
+        try:
+            st = os.stat(ident[0])
+            if [st.st_size, int(st.st_mtime)] == list(ident[1:]):
+                os.remove(ident[0])
+                logging.info(f"Удалён ремукс прерванной загрузки: {ident[0]}")
+        except OSError:
+            pass
+
+
+upload_journal = UploadJournal()
+
+
+CONTENT_INDEX_FILE = 'content_index.json'
+
+
+class ContentHashIndex:
+    """Индекс "хэш содержимого → ссылка на загруженное видео" для поиска повторных загрузок.
+
+    Хэш (SHA-256) считается блоками в фоне и кэшируется по "путь|размер|mtime",
+    так что одинаковый файл из другой папки или совпавший по байтам результат
+    повторной обрезки находится без новой загрузки и без расхода квоты.
+    """
+    READ_BLOCK = 4 * 1024 * 1024
+    MAX_FILES = 2000
+
+    def __init__(self, path=CONTENT_INDEX_FILE):
+        self.path = path
+        self._lock = Lock()
+        self._data = None
+        self._stamp = None      # st_mtime_ns прочитанного файла
+        # ключ файла -> Event идущего подсчёта: второй compute() того же файла ждёт первый
+        self._inflight = {}
+
+    @staticmethod
+    def file_key(path):
+        st = os.stat(path)
+        return f"{os.path.normcase(os.path.abspath(path))}|{st.st_size}|{int(st.st_mtime)}"
+
+    def _ensure_loaded(self):
+        """Загрузить индекс; перечитать, если файл с тех пор записал другой процесс."""
+        try:
+            stamp = os.stat(self.path).st_mtime_ns
+        except OSError:
+            stamp = None
+        if self._data is not None and stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self._data = {'files': {}, 'videos': {}}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    self._data['files'].update(data.get('files') or {})
+                    self._data['videos'].update(data.get('videos') or {})
+        except Exception:
+            logging.exception('Не удалось прочитать индекс содержимого')
+
+    def _store(self):
+        try:
+            files = self._data['files']
+            if len(files) > self.MAX_FILES:
+                # словарь хранит порядок вставки — отбрасываем самые старые записи
+                self._data['files'] = dict(list(files.items())[-self.MAX_FILES:])
+            _atomic_write_json(self.path, self._data)
+            self._stamp = os.stat(self.path).st_mtime_ns
+        except Exception:
+            logging.exception('Не удалось сохранить индекс содержимого')
+
+    def _modify(self, apply):
+        """Изменить индекс (вызывать под self._lock): перечитать файл под межпроцессной блокировкой,
+        применить apply(data) и сохранить, если apply не вернул False, — записи другого процесса
+        не теряются."""
+        with _FileLock(self.path):
+            self._data = None
+            self._ensure_loaded()
+            if apply(self._data) is not False:
+                self._store()
+
+    def cached_hash(self, path):
+        """Хэш файла из кэша или None (файл не хэшировался или изменился)."""
+        try:
+            key = self.file_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            return self._data['files'].get(key)
+
+    def compute(self, path, should_stop=None):
+        """Посчитать хэш файла (с кэшем). None — если остановлено через should_stop()."""
+        while True:
+            digest = self.cached_hash(path)
+            if digest:
+                return digest
+            key = self.file_key(path)
+            with self._lock:
+                running = self._inflight.get(key)
+                if running is None:
+                    done = self._inflight[key] = Event()
+                    break
+            # тот же файл уже хэшируется (PrevalidateThread, загрузка) — ждём результат
+            while not running.wait(0.25):
+                if should_stop is not None and should_stop():
+                    return None
+        try:
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                while True:
+                    if should_stop is not None and should_stop():
+                        return None
+                    block = f.read(self.READ_BLOCK)
+                    if not block:
+                        break
+                    h.update(block)
+            digest = h.hexdigest()
+            with self._lock:
+                self._modify(lambda data: data['files'].__setitem__(key, digest))
+            return digest
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+
+    def add_file(self, path, url, title='', should_stop=None):
+        """Добавить загруженное видео в индекс, посчитав хэш в вызывающем потоке (обычно он уже
+        в кэше после PrevalidateThread). Файл читается до возврата — после него вызывающий может
+        его удалить. Возвращает хэш или None, если подсчёт остановлен."""
+        digest = self.compute(path, should_stop)
+        self.add(digest, url, title)
+        return digest
+
+    def lookup(self, digest):
+        """Запись о загруженном видео с таким содержимым: {'url', 'title', 'time'} или None."""
+        if not digest:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._data['videos'].get(digest)
+            return dict(entry) if entry else None
+
+    def add(self, digest, url, title='', when=None):
+        if not digest or not url:
+            return
+        entry = {'url': url, 'title': title, 'time': when or datetime.now().isoformat()}
+        with self._lock:
+            self._modify(lambda data: data['videos'].__setitem__(digest, entry))
+
+    def merge_history(self, entries):
+        """Дополнить индекс записями истории загрузок, в которых сохранён хэш."""
+        def apply(data):
+            videos = data['videos']
+            changed = False
+            for e in entries or []:
+                digest = e.get('hash')
+                if digest and e.get('url') and digest not in videos:
+                    videos[digest] = {'url': e['url'], 'title': e.get('title', ''), 'time': e.get('time', '')}
+                    changed = True
+            return changed
+
+        with self._lock:
+            self._modify(apply)
+
+
+content_index = ContentHashIndex()
+
+
+class AdaptiveChunkSizer:
+    """Подбор размера чанка во время загрузки по измеренной скорости и ошибкам.
+
+    Цель — чтобы один чанк передавался примерно TARGET_SECONDS: на быстром канале
+    чанки растут (меньше HTTP round-trip), на нестабильном — уменьшаются (дешевле повтор).
+    Размер всегда кратен 256 KB, как требует resumable-протокол YouTube.
+    """
+    GRANULARITY = 256 * 1024
+    MIN_CHUNK = 2 * 256 * 1024          # 512 KB
+    MAX_CHUNK = 64 * 1024 * 1024        # 64 MB
+    TARGET_SECONDS = 8.0
+    EWMA_ALPHA = 0.3
+    ERROR_COOLDOWN = 3                  # столько успешных чанков после ошибки без роста
+
+    def __init__(self, initial=5 * 1024 * 1024):
+        self.size = self._align(initial)
+        self.ewma_bps = None
+        self._cooldown = 0
+        self.errors = 0
+        self.chunks = 0
+        self.total_bytes = 0
+        self.total_seconds = 0.0
+
+    def _align(self, n):
+        n = int(max(self.MIN_CHUNK, min(self.MAX_CHUNK, n)))
+        return max(self.MIN_CHUNK, n - n % self.GRANULARITY)
+
+    def on_success(self, nbytes, seconds):
+        """Учесть успешно переданный чанк, вернуть размер следующего."""
+        if nbytes <= 0 or seconds <= 0:
+            return self.size
+        self.chunks += 1
+        self.total_bytes += nbytes
+        self.total_seconds += seconds
+        bps = nbytes / seconds
+        self.ewma_bps = bps if self.ewma_bps is None else (
+            self.EWMA_ALPHA * bps + (1 - self.EWMA_ALPHA) * self.ewma_bps)
+        target = self.ewma_bps * self.TARGET_SECONDS
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            target = min(target, self.size)
+        # растём не более чем вдвое за шаг, уменьшаемся сразу до цели
+        new_size = self._align(min(target, self.size * 2))
+        if new_size != self.size:
+            logging.info(f"Размер чанка: {self.size / 1048576:.2f} → {new_size / 1048576:.2f} MB "
+                         f"(скорость {bps / 1048576:.2f} MB/s, сглаженная {self.ewma_bps / 1048576:.2f} MB/s)")
+            self.size = new_size
+        return self.size
+
+    def on_error(self):
+        """Ошибка передачи чанка — уменьшаем размер вдвое и временно запрещаем рост."""
+        self.errors += 1
+        self._cooldown = self.ERROR_COOLDOWN
+        new_size = self._align(self.size // 2)
+        if new_size != self.size:
+            logging.info(f"Размер чанка после ошибки: {self.size / 1048576:.2f} → {new_size / 1048576:.2f} MB")
+            self.size = new_size
+        return self.size
+
+    def summary(self):
+        avg = self.total_bytes / self.total_seconds if self.total_seconds else 0
+        return (f"чанков {self.chunks}, ошибок {self.errors}, средняя скорость {avg / 1048576:.2f} MB/s, "
+                f"итоговый размер чанка {self.size / 1048576:.2f} MB")
+
+
+class UploadStats:
+    """Статистика одной загрузки: отправлено/всего, мгновенная и сглаженная скорость,
+    ETA и задержка ответа сервера на каждый чанк.
+
+    snapshot() — словарь для сигнала UploadThread.progress_info:
+    {'sent', 'total', 'percent', 'rate', 'rate_avg', 'eta', 'chunk_latency', 'chunks', 'retries', 'elapsed'}
+    (скорости — байт/с, время — секунды, eta=None пока скорость неизвестна).
+    """
+    EWMA_ALPHA = 0.3
+    SAMPLE_SECONDS = 0.2
+
+    def __init__(self, total):
+        self.total = int(total or 0)
+        self.sent = 0
+        self.started = time.monotonic()
+        self.rate = 0.0
+        self.rate_avg = 0.0
+        self._sample = None             # (время, байт) — точка отсчёта мгновенной скорости
+        self._first_sample = None
+        self.chunk_latencies = []
+        self.chunk_durations = []
+        self.retries = 0
+        self.retry_wait = 0.0
+        self.phases = {}                # длительность этапов: проверка, подключение, передача
+
+    def phase(self, name, seconds):
+        self.phases[name] = round(self.phases.get(name, 0.0) + seconds, 3)
+
+    def update(self, sent):
+        now = time.monotonic()
+        self.sent = sent
+        if self._sample is None or sent < self._sample[1]:
+            # первая точка, возобновление или откат после повтора — только новая точка отсчёта
+            self._sample = (now, sent)
+            if self._first_sample is None:
+                self._first_sample = self._sample
+            return
+        t0, b0 = self._sample
+        if now - t0 >= self.SAMPLE_SECONDS:
+            self.rate = (sent - b0) / (now - t0)
+            self.rate_avg = self.rate if self.rate_avg <= 0 else (
+                self.EWMA_ALPHA * self.rate + (1 - self.EWMA_ALPHA) * self.rate_avg)
+            self._sample = (now, sent)
+
+    def on_chunk(self, sent, duration, latency):
+        """Чанк подтверждён сервером: duration — весь запрос, latency — ожидание ответа после отправки тела."""
+        self.chunk_durations.append(round(duration, 3))
+        self.chunk_latencies.append(round(max(0.0, latency), 3))
+        self.update(sent)
+
+    def on_retry(self, wait):
+        self.retries += 1
+        self.retry_wait += wait
+        self._sample = None
+
+    def eta(self):
+        if self.rate_avg <= 0 or not self.total:
+            return None
+        return max(0.0, (self.total - self.sent) / self.rate_avg)
+
+    def snapshot(self):
+        return {
+            'sent': self.sent,
+            'total': self.total,
+            'percent': min(100.0, self.sent / self.total * 100) if self.total else 0.0,
+            'rate': self.rate,
+            'rate_avg': self.rate_avg,
+            'eta': self.eta(),
+            'chunk_latency': self.chunk_latencies[-1] if self.chunk_latencies else None,
+            'chunks': len(self.chunk_latencies),
+            'retries': self.retries,
+            'elapsed': time.monotonic() - self.started,
+        }
+
+    def summary(self):
+        """Итог для истории загрузок: куда ушло время."""
+        elapsed = time.monotonic() - self.started
+        moved = 0.0
+        if self._first_sample is not None:
+            t0, b0 = self._first_sample
+            moved = (self.sent - b0) / max(1e-6, time.monotonic() - t0)
+        lat = self.chunk_latencies
+        return {
+            'bytes': self.total,
+            'elapsed': round(elapsed, 1),
+            'avg_rate': round(moved),
+            'chunks': len(lat),
+            'latency_avg': round(sum(lat) / len(lat), 3) if lat else None,
+            'latency_max': max(lat) if lat else None,
+            'transfer_time': round(sum(self.chunk_durations), 1),
+            'retries': self.retries,
+            'retry_wait': round(self.retry_wait, 1),
+            'phases': dict(self.phases),
+        }
+
+
+def format_upload_progress(info):
+    """Строка прогресса для UI из словаря UploadStats.snapshot()."""
+    mb = 1024 * 1024
+    text = f"{int(info.get('percent', 0))}% ({info.get('sent', 0) / mb:.1f}/{info.get('total', 0) / mb:.1f} MB)"
+    if info.get('rate_avg'):
+        text += f" · {info['rate_avg'] / mb:.2f} MB/s"
+    eta = info.get('eta')
+    if eta is not None:
+        text += f" · осталось {int(eta) // 60}:{int(eta) % 60:02d}"
+    if info.get('chunk_latency') is not None:
+        text += f" · ответ {info['chunk_latency'] * 1000:.0f} мс"
+    return text
+
+
+class UploadRetryPolicy:
+    """Классификация ошибок загрузки и экспоненциальная задержка с jitter.
+
+    - 'retryable' — сетевые сбои, 5xx, 408/429 и rate limit: повтор с backoff
+      (с учётом Retry-After);
+    - 'auth' — 401: обновляем токен и продолжаем с подтверждённого смещения;
+    - 'fatal' — квота, права, неверный запрос: повторять бессмысленно.
+    """
+    BASE_DELAY = 1.0
+    MAX_DELAY = 64.0
+    MAX_ATTEMPTS = 10       # подряд неудачных попыток для retryable-ошибок
+    MAX_AUTH_REFRESHES = 2
+
+    RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+    RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError', 'internalError'}
+    FATAL_REASONS = {'quotaExceeded', 'uploadLimitExceeded', 'dailyLimitExceeded', 'forbidden',
+                     'insufficientPermissions', 'youtubeSignupRequired'}
+
+    @staticmethod
+    def http_error_reason(e):
+        """Поле reason из JSON-тела ошибки Google API (или '')."""
+        try:
+            content = e.content.decode('utf-8') if isinstance(e.content, bytes) else str(e.content)
+            err = json.loads(content).get('error', {})
+            errors = err.get('errors') or []
+            if errors:
+                return errors[0].get('reason', '') or ''
+            return err.get('status', '') or ''
+        except Exception:
+            return ''
+
+    def classify(self, e):
+        if isinstance(e, HttpError):
+            status = getattr(e.resp, 'status', None)
+            reason = self.http_error_reason(e)
+            if status == 401:
+                return 'auth'
+            if reason in self.FATAL_REASONS:
+                return 'fatal'
+            if status in self.RETRYABLE_STATUSES or reason in self.RETRYABLE_REASONS:
+                return 'retryable'
+            if status is not None and 500 <= int(status) < 600:
+                return 'retryable'
+            return 'fatal'
+        # отмена и сбой ffmpeg потоковой обрезки — не ошибки сети
+        if isinstance(e, (UploadCancelled, TrimPipeError)):
+            return 'fatal'
+        # обновление токена не удалось — нужна повторная авторизация
+        if type(e).__name__ == 'RefreshError':
+            return 'fatal'
+        # локальные ошибки файла повтором не исправить
+        if isinstance(e, (FileNotFoundError, PermissionError, IsADirectoryError)):
+            return 'fatal'
+        # сетевые ошибки: сброс соединения, таймаут, SSL, httplib2/http.client
+        if isinstance(e, (ConnectionError, TimeoutError, OSError)):
+            return 'retryable'
+        module = type(e).__module__ or ''
+        if module.startswith(('httplib2', 'http.client', 'ssl', 'socket', 'urllib3', 'requests')):
+            return 'retryable'
+        return 'fatal'
+
+    @staticmethod
+    def retry_after(e):
+        """Значение заголовка Retry-After в секундах (число или HTTP-дата), иначе None."""
+        try:
+            value = e.resp.get('retry-after') if isinstance(e, HttpError) else None
+        except Exception:
+            value = None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            from email.utils import parsedate_to_datetime
+            when = parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+        except Exception:
+            return None
+
+    def delay(self, attempt, retry_after=None):
+        """Full jitter: случайная задержка в [0, min(MAX_DELAY, BASE*2^attempt)], но не меньше Retry-After."""
+        cap = min(self.MAX_DELAY, self.BASE_DELAY * (2 ** max(0, attempt - 1)))
+        d = random.uniform(0, cap)
+        if retry_after is not None:
+            d = max(d, min(retry_after, 3600.0))
+        return d
+
+
+def pacific_now():
+    """Текущее время по Тихоокеанскому времени — по нему сбрасывается дневная квота YouTube API."""
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo('America/Los_Angeles'))
+    except Exception:
+        # нет базы часовых поясов (Windows без tzdata) — правило перехода на летнее время США:
+        # со второго воскресенья марта 2:00 PST до первого воскресенья ноября 2:00 PDT
+        utc = datetime.now(timezone.utc)
+        march = datetime(utc.year, 3, 8, 10, tzinfo=timezone.utc)
+        dst_start = march + timedelta(days=(6 - march.weekday()) % 7)
+        november = datetime(utc.year, 11, 1, 9, tzinfo=timezone.utc)
+        dst_end = november + timedelta(days=(6 - november.weekday()) % 7)
+        offset = -7 if dst_start <= utc < dst_end else -8
+        return utc.astimezone(timezone(timedelta(hours=offset)))
+
+
+QUOTA_LEDGER_FILE = 'quota_ledger.json'
+
+
+class QuotaLedger:
+    """Локальный учёт единиц квоты YouTube Data API за текущие сутки (Pacific Time).
+
+    Каждый вызов API списывает свою стоимость (COSTS); перед загрузкой очередь проверяет
+    остаток и откладывает задание до сброса, а не упирается в quotaExceeded посреди загрузки.
+    Файл перечитывается при каждом обращении, а изменения идут под межпроцессной блокировкой —
+    GUI и helper_cli, запущенные одновременно, ведут общий учёт.
+    """
+    DAILY_LIMIT = 10000
+    COSTS = {
+        'videos.insert': 1600,
+        'videos.list': 1,
+        'videos.update': 50,
+        'channels.list': 1,
+        'playlistItems.insert': 50,
+        'thumbnails.set': 50,
+    }
+
+    def __init__(self, path=QUOTA_LEDGER_FILE, daily_limit=DAILY_LIMIT):
+        self.path = path
+        self.daily_limit = int(daily_limit)
+        self._lock = Lock()
+        self._data = None
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict):
+                        return data
+        except Exception:
+            logging.exception('Не удалось прочитать учёт квоты')
+        return {}
+
+    def _store(self):
+        try:
+            _atomic_write_json(self.path, self._data)
+        except Exception:
+            logging.exception('Не удалось сохранить учёт квоты')
+
+    def _current(self):
+        """Данные за текущие сутки Pacific Time, заново прочитанные с диска
+        (при смене суток счётчик обнуляется)."""
+        self._data = self._load()
+        today = pacific_now().date().isoformat()
+        if self._data.get('day') != today:
+            self._data = {'day': today, 'used': 0, 'calls': {}}
+        return self._data
+
+    def spend(self, method, units=None):
+        """Списать стоимость вызова method (или явно units). Возвращает списанные единицы."""
+        units = self.COSTS.get(method, 1) if units is None else int(units)
+        with self._lock, _FileLock(self.path):
+            data = self._current()
+            data['used'] = data.get('used', 0) + units
+            data['calls'][method] = data['calls'].get(method, 0) + 1
+            self._store()
+        return units
+
+    def try_reserve(self, method, units=None):
+        """Проверить остаток и списать стоимость method (или units) одной операцией под блокировкой:
+        параллельные загрузки (и другой процесс) не превысят квоту вместе.
+        Возвращает списанные единицы или None, если квоты не хватает."""
+        units = self.COSTS.get(method, 1) if units is None else int(units)
+        with self._lock, _FileLock(self.path):
+            data = self._current()
+            if self.daily_limit - data.get('used', 0) < units:
+                return None
+            data['used'] = data.get('used', 0) + units
+            data['calls'][method] = data['calls'].get(method, 0) + 1
+            self._store()
+        return units
+
+    def refund(self, method, units=None):
+        """Вернуть резерв, если вызов так и не был отправлен."""
+        units = self.COSTS.get(method, 1) if units is None else int(units)
+        with self._lock, _FileLock(self.path):
+            data = self._current()
+            data['used'] = max(0, data.get('used', 0) - units)
+            if data['calls'].get(method):
+                data['calls'][method] -= 1
+            self._store()
+
+    def mark_exhausted(self):
+        """Сервер ответил quotaExceeded — считаем квоту на сегодня израсходованной."""
+        with self._lock, _FileLock(self.path):
+            data = self._current()
+            data['used'] = max(data.get('used', 0), self.daily_limit)
+            self._store()
+
+    def used(self):
+        with self._lock:
+            return self._current().get('used', 0)
+
+    def remaining(self):
+        return max(0, self.daily_limit - self.used())
+
+    def can_afford(self, units):
+        return self.remaining() >= units
+
+    def seconds_until_reset(self):
+        now = pacific_now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo)
+        return max(0.0, (midnight - now).total_seconds())
+
+    def reset_at_local(self):
+        """Время сброса квоты в локальном времени, 'ЧЧ:ММ'."""
+        return (datetime.now() + timedelta(seconds=self.seconds_until_reset())).strftime('%H:%M')
+
+
+quota_ledger = QuotaLedger()
+
+
+VALIDATION_CACHE_FILE = 'validation_cache.json'
+
+
+def low_priority_command(cmd):
+    """Команда и аргументы subprocess для запуска внешнего процесса (ffmpeg) с пониженным приоритетом.
+
+    На POSIX — через nice: preexec_fn небезопасен, когда процессы запускаются из нескольких потоков."""
+    if os.name == 'nt':
+        return list(cmd), {'creationflags': getattr(subprocess, 'BELOW_NORMAL_PRIORITY_CLASS', 0x00004000)}
+    if shutil.which('nice'):
+        return ['nice', '-n', '10', *cmd], {}
+    return list(cmd), {}
+
+
+def run_command(cmd, should_stop=None, low_priority=True, capture_stdout=False):
+    """Запустить ffmpeg/ffprobe и дождаться завершения, опрашивая should_stop().
+    Возвращает (код возврата, stdout, stderr) текстом; stdout — только при capture_stdout.
+    Код None — процесс остановлен через should_stop."""
+    cmd, extra = low_priority_command(cmd) if low_priority else (cmd, {})
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL, **extra)
+    while True:
+        try:
+            out, err = proc.communicate(timeout=0.2)
+            return (proc.returncode, (out or b'').decode('utf-8', 'replace'),
+                    (err or b'').decode('utf-8', 'replace'))
+        except subprocess.TimeoutExpired:
+            if should_stop is not None and should_stop():
+                proc.kill()
+                proc.communicate()
+                return None, '', ''
+
+
+def run_ffmpeg(cmd, should_stop=None, low_priority=True):
+    """run_command без stdout. Возвращает (код возврата, stderr); код None — остановлен через should_stop."""
+    code, _, err = run_command(cmd, should_stop, low_priority)
+    return code, err.strip()
+
+
+class VideoValidator:
+    """Многоуровневая проверка видео вместо полного декодирования перед каждой загрузкой.
+
+    Уровни (каждый следующий включает предыдущий):
+    - 'probe'   — ffprobe: контейнер читается, есть видеопоток и длительность;
+    - 'sampled' — дополнительно декодируются несколько коротких фрагментов по всему файлу;
+    - 'full'    — полное декодирование (старое поведение, только по запросу).
+    Успешные результаты кэшируются по (путь, размер, mtime): повторная загрузка того же
+    файла проверку пропускает.
+    """
+    MODES = ('probe', 'sampled', 'full')
+    SAMPLE_COUNT = 4
+    SAMPLE_SECONDS = 2
+    MAX_CACHE_ENTRIES = 500
+
+    def __init__(self, cache_path=VALIDATION_CACHE_FILE):
+        self.cache_path = cache_path
+        self._lock = Lock()
+        self._cache = None
+        # блокировки по файлу: параллельная проверка того же файла ждёт уже идущую;
+        # путь -> [Lock, число ожидающих], запись удаляется, когда проверок файла не осталось
+        self._inflight = {}
+
+    @staticmethod
+    def _key(path):
+        st = os.stat(path)
+        return f"{os.path.normcase(os.path.abspath(path))}|{st.st_size}|{int(st.st_mtime)}"
+
+    def _load_cache(self):
+        if self._cache is None:
+            self._cache = {}
+            try:
+                if os.path.exists(self.cache_path):
+                    with open(self.cache_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                        if isinstance(data, dict):
+                            self._cache = data
+            except Exception:
+                logging.debug('Не удалось прочитать кэш проверки видео')
+        return self._cache
+
+    def _save_cache(self):
+        try:
+            items = sorted(self._cache.items(), key=lambda kv: kv[1].get('time', ''), reverse=True)
+            self._cache = dict(items[:self.MAX_CACHE_ENTRIES])
+            _atomic_write_json(self.cache_path, self._cache)
+        except Exception:
+            logging.debug('Не удалось сохранить кэш проверки видео')
+
+    def cached_level(self, path):
+        """Максимальный уровень, который файл уже прошёл (или None)."""
+        try:
+            key = self._key(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._load_cache().get(key)
+        return entry.get('mode') if entry else None
+
+    def _remember(self, path, mode, info):
+        with self._lock:
+            cache = self._load_cache()
+            cache[self._key(path)] = {'mode': mode, 'info': info, 'time': datetime.now().isoformat()}
+            self._save_cache()
+
+    @staticmethod
+    def _run(cmd, low_priority, should_stop, capture_stdout=False):
+        """run_command; остановка через should_stop() — UploadCancelled."""
+        code, out, err = run_command(cmd, should_stop, low_priority, capture_stdout)
+        if code is None:
+            raise UploadCancelled('Проверка видео отменена')
+        return code, out, err
+
+    def probe(self, path, low_priority=False, should_stop=None):
+        """Быстрая проверка заголовка через ffprobe. Возвращает dict(duration, video_codec, format)."""
+        if shutil.which('ffprobe') is None:
+            # ffprobe нет — декодируем один кадр через ffmpeg (тоже дёшево)
+            code, _, err = self._run(['ffmpeg', '-v', 'error', '-i', path, '-map', '0:v:0', '-frames:v', '1',
+                                      '-f', 'null', '-'], low_priority, should_stop)
+            if code != 0 or err.strip():
+                raise ValueError(f"Видео файл повреждён: {err.strip() or 'нет видеопотока'}")
+            return {'duration': None, 'video_codec': None, 'format': None}
+
+        code, out, err = self._run(['ffprobe', '-v', 'error', '-show_entries',
+                                    'format=duration,format_name:stream=codec_type,codec_name', '-of', 'json', path],
+                                   low_priority, should_stop, capture_stdout=True)
+        if code != 0:
+            raise ValueError(f"Видео файл повреждён: {err.strip() or 'ffprobe не смог прочитать файл'}")
+        try:
+            data = json.loads(out or '{}')
+        except ValueError:
+            raise ValueError('Не удалось разобрать ответ ffprobe')
+        video = [st for st in data.get('streams', []) if st.get('codec_type') == 'video']
+        if not video:
+            raise ValueError('В файле нет видеопотока')
+        fmt = data.get('format', {})
+        try:
+            duration = float(fmt.get('duration'))
+        except (TypeError, ValueError):
+            duration = None
+        if duration is not None and duration <= 0:
+            raise ValueError('Нулевая длительность видео')
+        return {'duration': duration, 'video_codec': video[0].get('codec_name'), 'format': fmt.get('format_name')}
+
+    def _decode(self, path, start=None, length=None, low_priority=False, should_stop=None):
+        cmd = ['ffmpeg', '-v', 'error']
+        if start is not None:
+            cmd += ['-ss', f'{start:.3f}']
+        cmd += ['-i', path]
+        if length is not None:
+            cmd += ['-t', str(length)]
+        cmd += ['-f', 'null', '-']
+        _, _, err = self._run(cmd, low_priority, should_stop)
+        if err:
+            raise ValueError(f"Видео файл повреждён: {err}")
+
+    def _sampled(self, path, duration, low_priority=False, should_stop=None):
+        """Декодирование нескольких коротких фрагментов, равномерно разнесённых по файлу."""
+        if not duration or duration <= self.SAMPLE_COUNT * self.SAMPLE_SECONDS * 2:
+            self._decode(path, low_priority=low_priority, should_stop=should_stop)
+            return
+        points = [duration * (i + 0.5) / self.SAMPLE_COUNT for i in range(self.SAMPLE_COUNT)]
+        points = [min(p, duration - self.SAMPLE_SECONDS) for p in points]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.SAMPLE_COUNT, MAX_WORKERS)) as pool:
+            for f in [pool.submit(self._decode, path, p, self.SAMPLE_SECONDS, low_priority, should_stop)
+                      for p in points]:
+                f.result()
+
+    def validate(self, path, mode='sampled', allow_missing_ffmpeg=False, low_priority=False, should_stop=None):
+        """Проверить файл на уровне mode. Исключение ValueError/FileNotFoundError при ошибке,
+        UploadCancelled — если проверка остановлена через should_stop()."""
+        if not os.path.exists(path):
+            raise FileNotFoundError("Видео файл не найден")
+        if os.path.getsize(path) == 0:
+            raise ValueError("Видео файл пуст")
+        if mode not in self.MODES:
+            mode = 'sampled'
+
+        inflight_key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            slot = self._inflight.setdefault(inflight_key, [Lock(), 0])
+            slot[1] += 1
+        try:
+            # пока тот же файл проверяет другой поток, ждём его, но не дольше отмены
+            while not slot[0].acquire(timeout=0.25):
+                if should_stop is not None and should_stop():
+                    raise UploadCancelled('Проверка видео отменена')
+            try:
+                self._validate_locked(path, mode, allow_missing_ffmpeg, low_priority, should_stop)
+            finally:
+                slot[0].release()
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] <= 0:
+                    self._inflight.pop(inflight_key, None)
+
+    def _validate_locked(self, path, mode, allow_missing_ffmpeg, low_priority, should_stop):
+        """validate() под блокировкой файла: кэш, затем проверка на уровне mode."""
+        cached = self.cached_level(path)
+        if cached in self.MODES and self.MODES.index(cached) >= self.MODES.index(mode):
+            logging.info(f"Проверка видео пропущена (кэш, уровень {cached}): {os.path.basename(path)}")
+            return
+
+        if shutil.which('ffmpeg') is None:
+            if allow_missing_ffmpeg:
+                logging.info('FFmpeg не найден, но загрузка разрешена настройкой (allow_missing_ffmpeg=True)')
+                return
+            raise ValueError("FFmpeg не найден в системе. Установите FFmpeg и добавьте его в PATH (например: C:\\ffmpeg\\bin)")
+
+        started = time.monotonic()
+        try:
+            info = self.probe(path, low_priority, should_stop)
+            if mode == 'sampled':
+                self._sampled(path, info.get('duration'), low_priority, should_stop)
+            elif mode == 'full':
+                self._decode(path, low_priority=low_priority, should_stop=should_stop)
+        except FileNotFoundError:
+            # На случай, если бинарник удалили между проверкой и запуском
+            raise ValueError("FFmpeg бинарник не найден. Убедитесь, что ffmpeg доступен в PATH")
+        logging.info(f"Проверка видео ({mode}) за {time.monotonic() - started:.2f} c: {os.path.basename(path)}")
+        self._remember(path, mode, info)
+
+
+video_validator = VideoValidator()
+
+
+KEYFRAME_CACHE_DIR = 'keyframe_cache'
+
+
+class KeyframeIndex:
+    """Времена ключевых кадров видео (по ffprobe, один раз на файл) с кэшем на диске.
+
+    Обрезка без перекодирования (-c copy) чистая, только если начало попадает на ключевой
+    кадр — иначе в начале стоп-кадр или чёрный экран. Индекс строится по флагам пакетов
+    (демультиплексирование без декодирования) и хранится в KEYFRAME_CACHE_DIR по
+    (путь, размер, mtime) файла.
+    """
+    # начало дальше от ключевого кадра — обрезка копированием уже не чистая
+    COPY_TOLERANCE = 0.05
+
+    def __init__(self, cache_dir=KEYFRAME_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = Lock()
+        self._memory = {}
+
+    def _cache_file(self, path):
+        key = VideoValidator._key(path)
+        return key, os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.json')
+
+    def cached(self, path):
+        """Индекс из памяти или с диска, без запуска ffprobe (None — ещё не построен)."""
+        try:
+            key, cache_file = self._cache_file(path)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('key') == key and isinstance(data.get('keyframes'), list):
+                with self._lock:
+                    self._memory[key] = data['keyframes']
+                return data['keyframes']
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def get(self, path, should_stop=None):
+        """Отсортированный список времён ключевых кадров (с) или None, если ffprobe недоступен."""
+        keyframes = self.cached(path)
+        if keyframes is not None:
+            return keyframes
+        if shutil.which('ffprobe') is None:
+            return None
+        started = time.monotonic()
+        cmd, extra = low_priority_command(['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                                           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path])
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, **extra)
+        keyframes = []
+        try:
+            for line in proc.stdout:
+                if should_stop is not None and should_stop():
+                    proc.kill()
+                    return None
+                pts, _, flags = line.strip().partition(',')
+                if 'K' in flags and pts not in ('', 'N/A'):
+                    try:
+                        keyframes.append(round(float(pts), 3))
+                    except ValueError:
+                        pass
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode != 0 or not keyframes:
+            logging.warning(f"Не удалось построить индекс ключевых кадров: {os.path.basename(path)}")
+            return None
+        keyframes = sorted(set(keyframes))
+        logging.info(f"Индекс ключевых кадров {os.path.basename(path)}: {len(keyframes)} за {time.monotonic() - started:.2f} c")
+        key, cache_file = self._cache_file(path)
+        with self._lock:
+            self._memory[key] = keyframes
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _atomic_write_json(cache_file, {'key': key, 'keyframes': keyframes}, indent=None)
+        except (OSError, ValueError):
+            logging.debug('Не удалось сохранить индекс ключевых кадров')
+        return keyframes
+
+    @staticmethod
+    def nearest(keyframes, t):
+        """Ближайший к t ключевой кадр (t, если список пуст)."""
+        if not keyframes:
+            return t
+        i = bisect.bisect_left(keyframes, t)
+        candidates = keyframes[max(0, i - 1):i + 1]
+        return min(candidates, key=lambda k: abs(k - t))
+
+    @classmethod
+    def is_copy_cut(cls, keyframes, start):
+        """Можно ли обрезать с начала start копированием потоков (начало на ключевом кадре)."""
+        if not keyframes:
+            return False
+        return abs(cls.nearest(keyframes, start) - start) <= cls.COPY_TOLERANCE
+
+
+keyframe_index = KeyframeIndex()
+
+class FaststartRemuxer:
+    """Перенос индекса MP4 (moov) в начало файла перед загрузкой — без перекодирования.
+
+    OBS и рекордеры игр пишут moov последним, и YouTube начинает обработку только
+    получив весь файл. После ремукса (ffmpeg -c copy -movflags +faststart) индекс
+    приходит с первыми байтами. Нужен ли ремукс, определяется по порядку атомов верхнего
+    уровня (читаются только их заголовки). Результат лежит во временной папке по пути,
+    зависящему от размера и mtime исходника, — повторная попытка и возобновление
+    загрузки используют тот же файл.
+
+    Ремукс копирует весь файл до отправки первого байта, поэтому включается только по
+    настройке (faststart_before_upload) и пропускается, если во временной папке мало места.
+    """
+    EXTENSIONS = ('.mp4', '.m4v', '.mov')
+    # после копии во временной папке должно остаться хотя бы столько
+    MIN_FREE_BYTES = 512 * 1024 * 1024
+    MAX_ATOMS = 64
+    CACHE_DIR = os.path.join(tempfile.gettempdir(), 'helper_faststart')
+    # ремукс без записи в журнале моложе этого может принадлежать идущей загрузке
+    PRUNE_MIN_AGE = 3600
+
+    @classmethod
+    def needs_remux(cls, path):
+        """True, если в файле атом mdat идёт раньше moov."""
+        if os.path.splitext(path)[1].lower() not in cls.EXTENSIONS:
+            return False
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                pos = 0
+                for _ in range(cls.MAX_ATOMS):
+                    if pos + 8 > size:
+                        return False
+                    f.seek(pos)
+                    header = f.read(16)
+                    atom_size = int.from_bytes(header[0:4], 'big')
+                    atom_type = header[4:8]
+                    if atom_size == 1 and len(header) >= 16:
+                        atom_size = int.from_bytes(header[8:16], 'big')
+                    elif atom_size == 0:
+                        atom_size = size - pos
+                    if atom_type == b'moov':
+                        return False
+                    if atom_type == b'mdat':
+                        return True
+                    if atom_size < 8:
+                        return False
+                    pos += atom_size
+        except OSError:
+            logging.debug(f"Не удалось прочитать атомы MP4: {path}")
+        return False
+
+    @classmethod
+    def cache_path(cls, path):
+        st = os.stat(path)
+        key = f"{os.path.normcase(os.path.abspath(path))}|{st.st_size}|{int(st.st_mtime)}"
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cls.CACHE_DIR, name + '.mp4')
+
+    def prepare(self, path, should_stop=None):
+        """Путь файла для загрузки: исходный или ремукс с moov в начале.
+        Ошибка ремукса не мешает загрузке — тогда загружается исходный файл."""
+        if not self.needs_remux(path):
+            return path
+        if shutil.which('ffmpeg') is None:
+            logging.info('FFmpeg не найден — faststart-ремукс пропущен')
+            return path
+        out = self.cache_path(path)
+        if os.path.exists(out) and os.path.getsize(out) > 0:
+            logging.info(f"Faststart: используем готовый ремукс {out}")
+            return out
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        try:
+            free = shutil.disk_usage(self.CACHE_DIR).free
+        except OSError:
+            free = None
+        needed = os.path.getsize(path) + self.MIN_FREE_BYTES
+        if free is not None and free < needed:
+            logging.info(f"Faststart-ремукс пропущен: во временной папке свободно {free / (1024 ** 3):.1f} GB, "
+                         f"нужно {needed / (1024 ** 3):.1f} GB")
+            return path
+        part = out + '.part'
+        cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', path,
+               '-map', '0:v', '-map', '0:a?', '-map_metadata', '0', '-c', 'copy',
+               '-movflags', '+faststart', '-f', 'mp4', part]
+        started = time.monotonic()
+        try:
+            code, err = run_ffmpeg(cmd, should_stop)
+            if code is None:
+                return path
+            if code != 0 or not os.path.exists(part):
+                logging.warning(f"Faststart-ремукс не удался ({code}): {err}")
+                return path
+            os.replace(part, out)
+        except Exception:
+            logging.exception('Ошибка faststart-ремукса')
+            return path
+        finally:
+            try:
+                if os.path.exists(part):
+                    os.remove(part)
+            except OSError:
+                pass
+        elapsed = time.monotonic() - started
+        size = os.path.getsize(out)
+        logging.info(f"Faststart-ремукс {os.path.basename(path)}: {size / (1024 * 1024):.1f} MB за {elapsed:.2f} c "
+                     f"({size / (1024 * 1024) / max(elapsed, 0.001):.0f} MB/с)")
+        return out
+
+    def discard(self, path, prepared):
+        """Удалить ремукс после успешной загрузки (исходный файл не трогается)."""
+        if prepared and prepared != path:
+            try:
+                os.remove(prepared)
+            except OSError:
+                pass
+
+    @classmethod
+    def owns(cls, path):
+        """True, если path — файл из папки ремуксов."""
+        return (os.path.normcase(os.path.dirname(os.path.abspath(path)))
+                == os.path.normcase(os.path.abspath(cls.CACHE_DIR)))
+
+    @classmethod
+    def prune(cls, journal_entries):
+        """Удалить ремуксы неудачных и отменённых загрузок: всё, на что не ссылается
+        актуальная запись журнала (journal_entries — upload_journal.pending()) и что
+        старше PRUNE_MIN_AGE. Возвращает число удалённых файлов."""
+        keep = set()
+        for entry in journal_entries or []:
+            ident = (entry.get('meta') or {}).get('upload_file')
+            if ident:
+                keep.add(os.path.normcase(os.path.abspath(ident[0])))
+        removed = 0
+        try:
+            names = os.listdir(cls.CACHE_DIR)
+        except OSError:
+            return 0
+        now = time.time()
+        for name in names:
+            path = os.path.join(cls.CACHE_DIR, name)
+            try:
+                if os.path.normcase(os.path.abspath(path)) in keep:
+                    continue
+                if now - os.path.getmtime(path) < cls.PRUNE_MIN_AGE:
+                    continue
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        if removed:
+            logging.info(f"Удалено ремуксов прерванных загрузок: {removed}")
+        return removed
+
+
+faststart_remuxer = FaststartRemuxer()
+
+
+ENCODE_STATS_FILE = 'encode_stats.json'
+
+
+class VideoEncoder:
+    """Перекодирование фрагмента видео по профилю с учётом измеренной скорости машины.
+
+    Профили:
+    - 'fast'    — один проход libx264 с постоянным качеством (CRF), основной для доказательств;
+    - 'size'    — два прохода со средним битрейтом под заданный размер файла (только когда
+                  размер действительно ограничен);
+    - 'preview' — самый быстрый пресет и не выше 720p, для черновиков и предпросмотра.
+    Скорость каждого запуска (секунд видео за секунду работы) копится в ENCODE_STATS_FILE;
+    пресет профиля сдвигается по лестнице presets так, чтобы кодирование шло не медленнее
+    TARGET_SPEED — на быстрой машине качество выше, на медленной кодирование не затягивается.
+
+    Длинные фрагменты можно кодировать параллельно (encode_parallel): отрезок делится по
+    ключевым кадрам на сегменты, каждый кодирует свой процесс ffmpeg, результат склеивается
+    без перекодирования.
+    """
+    PROFILES = {
+        'fast': {'title': 'Быстрый (CRF)', 'passes': 1, 'crf': '20',
+                 'presets': ('superfast', 'veryfast', 'faster', 'fast'), 'preset': 'veryfast'},
+        'size': {'title': 'Под размер (2 прохода)', 'passes': 2,
+                 'presets': ('veryfast', 'faster', 'fast', 'medium'), 'preset': 'fast'},
+        'preview': {'title': 'Черновик', 'passes': 1, 'crf': '28',
+                    'presets': ('ultrafast',), 'preset': 'ultrafast', 'max_height': 720},
+    }
+    DEFAULT_PROFILE = 'fast'
+    TARGET_SPEED = 1.5          # x реального времени
+    EWMA_ALPHA = 0.3
+    AUDIO_KBPS = 128
+    MIN_VIDEO_KBPS = 300
+    PARALLEL_MIN_SECONDS = 60   # короче — накладные расходы на сегменты не окупаются
+    MIN_SEGMENT_SECONDS = 10
+
+    def __init__(self, stats_path=ENCODE_STATS_FILE):
+        self.stats_path = stats_path
+        self._lock = Lock()
+        self._stats = None
+
+    def _load(self):
+        if self._stats is None:
+            self._stats = {}
+            try:
+                if os.path.exists(self.stats_path):
+                    with open(self.stats_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                        if isinstance(data, dict):
+                            self._stats = data
+            except Exception:
+                logging.debug('Не удалось прочитать статистику кодирования')
+        return self._stats
+
+    def _save(self):
+        try:
+            _atomic_write_json(self.stats_path, self._stats)
+        except Exception:
+            logging.debug('Не удалось сохранить статистику кодирования')
+
+    def preset(self, profile):
+        """Текущий пресет x264 профиля (подобранный по скорости машины)."""
+        spec = self.PROFILES[profile]
+        with self._lock:
+            preset = self._load().get(profile, {}).get('preset')
+        return preset if preset in spec['presets'] else spec['preset']
+
+    def speed(self, profile):
+        """Средняя измеренная скорость профиля (x реального времени) или None."""
+        with self._lock:
+            return self._load().get(profile, {}).get('speed')
+
+    def estimate(self, profile, seconds):
+        """Оценка времени кодирования seconds секунд видео (с) или None, если замеров ещё нет."""
+        speed = self.speed(profile)
+        return seconds / speed if speed else None
+
+    def record(self, profile, preset, media_seconds, wall_seconds):
+        """Учесть скорость запуска и при необходимости сдвинуть пресет профиля."""
+        if media_seconds <= 0 or wall_seconds <= 0:
+            return
+        speed = media_seconds / wall_seconds
+        presets = self.PROFILES[profile]['presets']
+        with self._lock:
+            entry = self._load().setdefault(profile, {})
+            prev = entry.get('speed')
+            # пресет сменился — старая скорость к нему не относится
+            if entry.get('preset') not in (None, preset):
+                prev = None
+            entry['speed'] = round(speed if prev is None else prev + self.EWMA_ALPHA * (speed - prev), 3)
+            entry['runs'] = int(entry.get('runs', 0)) + 1
+            entry['preset'] = preset
+            i = presets.index(preset) if preset in presets else 0
+            if entry['speed'] > self.TARGET_SPEED * 2 and i + 1 < len(presets):
+                entry['preset'] = presets[i + 1]
+            elif entry['speed'] < self.TARGET_SPEED / 2 and i > 0:
+                entry['preset'] = presets[i - 1]
+            entry['updated'] = datetime.now().isoformat()
+            self._save()
+        logging.info(f"Кодирование '{profile}' ({preset}): {speed:.2f}x реального времени"
+                     + (f", следующий пресет {entry['preset']}" if entry['preset'] != preset else ''))
+
+    def video_args(self, profile, preset, bitrate_kbps=None):
+        spec = self.PROFILES[profile]
+        args = ['-c:v', 'libx264', '-preset', preset, '-profile:v', 'high', '-pix_fmt', 'yuv420p']
+        if bitrate_kbps:
+            args += ['-b:v', f'{bitrate_kbps}k', '-maxrate', f'{int(bitrate_kbps * 1.5)}k',
+                     '-bufsize', f'{bitrate_kbps * 2}k']
+        else:
+            args += ['-crf', spec['crf']]
+        if spec.get('max_height'):
+            args += ['-vf', f"scale=-2:'min({spec['max_height']},ih)'"]
+        return args
+
+    @staticmethod
+    def _run(cmd, duration, on_progress=None, lo=0.0, hi=1.0, should_stop=None):
+        """ffmpeg с -progress в stdout: прогресс lo..hi. True — успешно.
+        stderr пишется во временный файл: на повреждённой записи ffmpeg выводит больше, чем
+        вмещает буфер канала, и, пока читается stdout, заполненный канал stderr его бы остановил."""
+        with tempfile.TemporaryFile() as err_file:
+            proc = subprocess.Popen(cmd[:1] + ['-nostdin', '-v', 'error', '-progress', 'pipe:1', '-nostats'] + cmd[1:],
+                                    stdout=subprocess.PIPE, stderr=err_file, text=True)
+            try:
+                for line in proc.stdout:
+                    if should_stop is not None and should_stop():
+                        proc.kill()
+                        return False
+                    key, _, value = line.strip().partition('=')
+                    if (key in ('out_time_us', 'out_time_ms') and value.isdigit() and on_progress is not None
+                            and duration > 0):
+                        done = int(value) / 1e6
+                        on_progress(lo + (hi - lo) * min(done / duration, 1.0))
+            finally:
+                proc.stdout.close()
+                proc.wait()
+            err_file.seek(0)
+            err = err_file.read().decode('utf-8', errors='replace')
+        if proc.returncode != 0:
+            logging.error(f"Ошибка кодирования ({proc.returncode}): {err.strip()}")
+        return proc.returncode == 0
+
+    def encode(self, source, start, end, output, profile=DEFAULT_PROFILE, target_mb=None,
+               on_progress=None, should_stop=None):
+        """Перекодировать [start, end) из source в output (mp4) по профилю. True — успешно."""
+        if profile not in self.PROFILES or (profile == 'size' and not target_mb):
+            profile = self.DEFAULT_PROFILE
+        spec = self.PROFILES[profile]
+        preset = self.preset(profile)
+        duration = end - start
+        src = ['-ss', f'{start:.3f}', '-i', source, '-t', f'{duration:.3f}']
+        audio = ['-c:a', 'aac', '-b:a', f'{self.AUDIO_KBPS}k']
+        started = time.monotonic()
+        if spec['passes'] == 1:
+            ok = self._run(['ffmpeg', '-y', *src, *self.video_args(profile, preset), *audio,
+                            '-movflags', '+faststart', output], duration, on_progress, should_stop=should_stop)
+        else:
+            bitrate = max(self.MIN_VIDEO_KBPS, int(target_mb * 8 * 1024 / max(duration, 0.1)) - self.AUDIO_KBPS)
+            video = self.video_args(profile, preset, bitrate)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                passlog = os.path.join(temp_dir, 'ffmpeg2pass')
+                ok = (self._run(['ffmpeg', '-y', *src, *video, '-pass', '1', '-passlogfile', passlog, '-an',
+                                 '-f', 'null', os.devnull], duration, on_progress, 0.0, 0.5, should_stop)
+                      and self._run(['ffmpeg', '-y', *src, *video, '-pass', '2', '-passlogfile', passlog, *audio,
+                                     '-movflags', '+faststart', output], duration, on_progress, 0.5, 1.0, should_stop))
+        if ok and not (should_stop is not None and should_stop()):
+            self.record(profile, preset, duration, time.monotonic() - started)
+        return ok
+
+    @staticmethod
+    def parallel_workers():
+        """Сколько процессов ffmpeg запускать одновременно (x264 сам использует несколько потоков)."""
+        return max(1, min(8, MAX_WORKERS // 2))
+
+    def segments(self, start, end, keyframes=None, count=None):
+        """Границы сегментов [(a, b), ...] для [start, end): по возможности на ключевых кадрах."""
+        duration = end - start
+        count = max(1, min(count or self.parallel_workers(), int(duration // self.MIN_SEGMENT_SECONDS)))
+        bounds = [start]
+        for i in range(1, count):
+            t = start + duration * i / count
+            if keyframes:
+                t = KeyframeIndex.nearest(keyframes, t)
+            if bounds[-1] + self.MIN_SEGMENT_SECONDS / 2 < t < end - self.MIN_SEGMENT_SECONDS / 2:
+                bounds.append(t)
+        bounds.append(end)
+        return list(zip(bounds, bounds[1:]))
+
+    def encode_parallel(self, source, start, end, output, profile=DEFAULT_PROFILE, keyframes=None, target_mb=None,
+                        on_progress=None, should_stop=None):
+        """Как encode(), но сегменты кодируются параллельно (по процессу ffmpeg на сегмент),
+        звук — одним проходом; сегменты склеиваются concat-демультиплексором без перекодирования.
+        Короткие фрагменты и одноядерные машины — обычный encode()."""
+        duration = end - start
+        workers = self.parallel_workers()
+        parts = self.segments(start, end, keyframes, workers) if duration >= self.PARALLEL_MIN_SECONDS else []
+        if len(parts) < 2:
+            return self.encode(source, start, end, output, profile, target_mb, on_progress, should_stop)
+        if profile not in self.PROFILES or (profile == 'size' and not target_mb):
+            profile = self.DEFAULT_PROFILE
+        spec = self.PROFILES[profile]
+        preset = self.preset(profile)
+        bitrate = None
+        if spec['passes'] == 2:
+            bitrate = max(self.MIN_VIDEO_KBPS, int(target_mb * 8 * 1024 / max(duration, 0.1)) - self.AUDIO_KBPS)
+        video = self.video_args(profile, preset, bitrate)
+        threads = str(max(1, MAX_WORKERS // len(parts)))
+        started = time.monotonic()
+
+        # общий прогресс: доля закодированного видео по всем сегментам (95%), склейка — остальное
+        done = {}
+        progress_lock = Lock()
+
+        def report(key, weight):
+            def cb(fraction):
+                if on_progress is None:
+                    return
+                with progress_lock:
+                    done[key] = fraction * weight
+                    on_progress(0.95 * sum(done.values()) / duration)
+            return cb
+
+        with tempfile.TemporaryDirectory(prefix='parallel_encode_') as work:
+            def encode_segment(i, a, b):
+                path = os.path.join(work, f'seg{i:03d}.ts')
+                src = ['-ss', f'{a:.3f}', '-i', source, '-t', f'{b - a:.3f}', '-map', '0:v:0', '-an']
+                cb = report(i, b - a)
+                if spec['passes'] == 1:
+                    ok = self._run(['ffmpeg', '-y', *src, *video, '-threads', threads, '-f', 'mpegts', path],
+                                   b - a, cb, should_stop=should_stop)
+                else:
+                    passlog = os.path.join(work, f'pass{i:03d}')
+                    ok = (self._run(['ffmpeg', '-y', *src, *video, '-threads', threads, '-pass', '1',
+                                     '-passlogfile', passlog, '-f', 'null', os.devnull], b - a, cb, 0.0, 0.5, should_stop)
+                          and self._run(['ffmpeg', '-y', *src, *video, '-threads', threads, '-pass', '2',
+                                         '-passlogfile', passlog, '-f', 'mpegts', path], b - a, cb, 0.5, 1.0, should_stop))
+                return path if ok else None
+
+            audio = os.path.join(work, 'audio.m4a')
+            # нет звуковой дорожки — склеиваем только видео; без ffprobe пробуем кодировать звук
+            info = SmartCutter.probe(source, should_stop)
+            with_audio = info is None or info['audio']
+
+            def encode_audio():
+                if not with_audio:
+                    return False
+                return self._run(['ffmpeg', '-y', '-ss', f'{start:.3f}', '-i', source, '-t', f'{duration:.3f}',
+                                  '-map', '0:a:0', '-vn', '-c:a', 'aac', '-b:a', f'{self.AUDIO_KBPS}k', audio],
+                                 duration, should_stop=should_stop)
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(parts) + 1) as pool:
+                audio_future = pool.submit(encode_audio)
+                futures = [pool.submit(encode_segment, i, a, b) for i, (a, b) in enumerate(parts)]
+                paths = [f.result() for f in futures]
+                has_audio = audio_future.result() and os.path.exists(audio)
+            if not all(paths) or (should_stop is not None and should_stop()):
+                return False
+            if info is not None and info['audio'] and not has_audio:
+                # у источника есть звук — ролик без него не годится, вызывающий перейдёт к другому способу
+                logging.warning(f"Не удалось закодировать звук {os.path.basename(source)}, параллельное кодирование прервано")
+                return False
+
+            concat_list = os.path.join(work, 'list.txt')
+            with open(concat_list, 'w', encoding='utf-8') as f:
+                for path in paths:
+                    f.write("file '{}'\n".format(path.replace('\\', '/').replace("'", "'\\''")))
+            join = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list]
+            if has_audio:
+                join += ['-i', audio, '-map', '0:v:0', '-map', '1:a:0']
+            join += ['-c', 'copy', '-movflags', '+faststart', output]
+            ok = self._run(join, duration, should_stop=should_stop)
+        if ok:
+            if on_progress is not None:
+                on_progress(1.0)
+            wall = time.monotonic() - started
+            logging.info(f"Параллельное кодирование '{profile}' ({preset}): {len(parts)} сегм. × {threads} потоков, "
+                         f"{duration:.1f} c видео за {wall:.1f} c ({duration / max(wall, 0.001):.2f}x)")
+        return ok
+
+
+video_encoder = VideoEncoder()
+
+
+class SmartCutter:
+    """Точная обрезка с перекодированием только краёв ("smart cut").
+
+    Фрагмент [start, end) делится ключевыми кадрами k_in (первый после start) и
+    k_out (последний до end): неполные GOP [start, k_in) и [k_out, end) перекодируются
+    (кадр-в-кадр), середина [k_in, k_out) копируется без перекодирования. Куски пишутся
+    в MPEG-TS (параметры кодека в потоке) и склеиваются concat-демультиплексором без
+    перекодирования; звук всего фрагмента кодируется одним проходом (AAC — быстро и без
+    щелчков на стыках). Для 10 минут из часовой записи перекодируется несколько секунд видео.
+    """
+    # кодек источника -> (кодировщик краёв, bitstream-фильтр для копии в MPEG-TS)
+    CODECS = {
+        'h264': ('libx264', 'h264_mp4toannexb'),
+        'hevc': ('libx265', 'hevc_mp4toannexb'),
+    }
+    # профиль источника (как его называет ffprobe) -> -profile:v кодировщика краёв
+    PROFILES = {
+        'h264': {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high',
+                 'High 10': 'high10', 'High 4:2:2': 'high422', 'High 4:4:4 Predictive': 'high444'},
+        'hevc': {'Main': 'main', 'Main 10': 'main10'},
+    }
+    # края и середина склеиваются в один поток mp4 с одним avcC/hvcC — эти параметры должны совпасть
+    MATCH_KEYS = ('codec', 'profile', 'level', 'width', 'height', 'pix_fmt')
+    EDGE_CRF = '18'             # края должны быть не хуже копируемой середины
+    MIN_COPY_SECONDS = 2.0      # середина короче — проще перекодировать всё
+
+    @staticmethod
+    def probe(path, should_stop=None):
+        """Параметры первого видеопотока: {'codec', 'profile', 'level', 'width', 'height', 'pix_fmt',
+        'frame_rate', 'time_base', 'has_b_frames', 'audio'} или None (нет ffprobe или видео)."""
+        if shutil.which('ffprobe') is None:
+            return None
+        code, out, _ = run_command(
+            ['ffprobe', '-v', 'error', '-show_entries',
+             'stream=codec_type,codec_name,profile,level,width,height,pix_fmt,r_frame_rate,time_base,has_b_frames',
+             '-of', 'json', path], should_stop, capture_stdout=True)
+        if code != 0:
+            return None
+        try:
+            streams = json.loads(out).get('streams') or []
+        except ValueError:
+            return None
+        video = [st for st in streams if st.get('codec_type') == 'video']
+        if not video:
+            return None
+        v = video[0]
+        rate = v.get('r_frame_rate') or ''
+        return {'codec': v.get('codec_name'), 'profile': v.get('profile'), 'level': v.get('level'),
+                'width': v.get('width'), 'height': v.get('height'), 'pix_fmt': v.get('pix_fmt') or 'yuv420p',
+                'frame_rate': rate if rate not in ('', '0/0') else None, 'time_base': v.get('time_base'),
+                'has_b_frames': v.get('has_b_frames') or 0,
+                'audio': any(st.get('codec_type') == 'audio' for st in streams)}
+
+    @staticmethod
+    def frame_duration(info):
+        """Длительность кадра источника, с (по r_frame_rate; 1/60, если частота неизвестна)."""
+        try:
+            num, den = (info.get('frame_rate') or '').split('/')
+            if int(num) > 0 and int(den) > 0:
+                return int(den) / int(num)
+        except ValueError:
+            pass
+        return 1 / 60
+
+    def encoder_args(self, info):
+        """Параметры кодирования краёв с профилем, уровнем и частотой кадров источника
+        или None, если профиль источника кодировщиком не повторить."""
+        codec = info.get('codec')
+        profile = self.PROFILES.get(codec, {}).get(info.get('profile'))
+        level = info.get('level')
+        if profile is None or not isinstance(level, int) or level <= 0:
+            return None
+        encoder, _ = self.CODECS[codec]
+        args = ['-c:v', encoder, '-preset', 'veryfast', '-crf', self.EDGE_CRF,
+                '-pix_fmt', info['pix_fmt'], '-profile:v', profile]
+        if codec == 'h264':
+            args += ['-level:v', f'{level / 10:g}']
+            if not info.get('has_b_frames'):
+                args += ['-bf', '0']
+        else:
+            # ffprobe даёт level HEVC как general_level_idc = 30 * уровень
+            params = f'level-idc={level / 30:g}'
+            if not info.get('has_b_frames'):
+                params += ':bframes=0'
+            args += ['-x265-params', params]
+        if info.get('frame_rate'):
+            args += ['-r', info['frame_rate']]
+        return args
+
+    def _edge_matches(self, info, path):
+        """Закодированный край совпадает с источником по MATCH_KEYS."""
+        edge = self.probe(path)
+        if not edge:
+            return False
+        diff = {k: (info.get(k), edge.get(k)) for k in self.MATCH_KEYS if info.get(k) != edge.get(k)}
+        if diff:
+            logging.info(f"Smart cut: параметры перекодированного края не совпали с источником: {diff}")
+        return not diff
+
+    def plan(self, keyframes, start, end):
+        """(k_in, k_out) для обрезки [start, end) или None, если smart cut не подходит."""
+        if not keyframes:
+            return None
+        i = bisect.bisect_left(keyframes, start - KeyframeIndex.COPY_TOLERANCE)
+        j = bisect.bisect_right(keyframes, end + KeyframeIndex.COPY_TOLERANCE) - 1
+        if i >= len(keyframes) or j < 0:
+            return None
+        k_in, k_out = keyframes[i], keyframes[j]
+        if k_out - k_in < self.MIN_COPY_SECONDS:
+            return None
+        return k_in, k_out
+
+    def cut(self, source, start, end, output, keyframes, on_progress=None, should_stop=None):
+        """Обрезать source в output (mp4). True — успешно; False — smart cut не подходит
+        или не удался (тогда нужна обычная обрезка)."""
+        if shutil.which('ffmpeg') is None:
+            return False
+        planned = self.plan(keyframes, start, end)
+        info = self.probe(source, should_stop) if planned else None
+        if not info or info['codec'] not in self.CODECS:
+            logging.info(f"Smart cut не подходит для {os.path.basename(source)}: {info and info['codec']}")
+            return False
+        edge_args = self.encoder_args(info)
+        if edge_args is None:
+            logging.info(f"Smart cut: профиль {info.get('profile')} уровня {info.get('level')} "
+                         f"не повторить при кодировании краёв — нужна полная перекодировка")
+            return False
+        k_in, k_out = planned
+        _, bsf = self.CODECS[info['codec']]
+        # -t на полкадра короче: кадр на границе (ключевой кадр k_in/k_out) не попадёт в оба куска,
+        # а -ss копии на полкадра позже k_in — поиск назад остановится на самом k_in, а не на
+        # предыдущем ключевом кадре из-за округления времени
+        half = self.frame_duration(info) / 2
+        started = time.monotonic()
+        work = tempfile.mkdtemp(prefix='smartcut_')
+
+        def edge(name, a, b):
+            path = os.path.join(work, name)
+            return path, ['ffmpeg', '-v', 'error', '-y', '-ss', f'{a:.6f}', '-i', source, '-t', f'{b - a - half:.6f}',
+                          '-map', '0:v:0', '-an', *edge_args, '-f', 'mpegts', path]
+
+        steps = []                  # (команда, путь края для сверки параметров или None)
+        pieces = []
+        if k_in - start > KeyframeIndex.COPY_TOLERANCE:
+            path, cmd = edge('head.ts', start, k_in)
+            steps.append((cmd, path))
+            pieces.append(path)
+        middle = os.path.join(work, 'middle.ts')
+        steps.append((['ffmpeg', '-v', 'error', '-y', '-ss', f'{k_in + half:.6f}', '-i', source,
+                       '-t', f'{k_out - k_in - half:.6f}', '-map', '0:v:0', '-an', '-c:v', 'copy', '-bsf:v', bsf,
+                       '-f', 'mpegts', middle], None))
+        pieces.append(middle)
+        if end - k_out > KeyframeIndex.COPY_TOLERANCE:
+            path, cmd = edge('tail.ts', k_out, end + half)
+            steps.append((cmd, path))
+            pieces.append(path)
+        audio = os.path.join(work, 'audio.m4a')
+        if info['audio']:
+            steps.append((['ffmpeg', '-v', 'error', '-y', '-ss', f'{start:.6f}', '-i', source,
+                           '-t', f'{end - start:.6f}', '-map', '0:a:0', '-vn', '-c:a', 'aac', '-b:a', '192k', audio],
+                          None))
+        concat_list = os.path.join(work, 'list.txt')
+        join = ['ffmpeg', '-v', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list]
+        if info['audio']:
+            join += ['-i', audio, '-map', '0:v:0', '-map', '1:a:0']
+        join += ['-c', 'copy']
+        timescale = str(info.get('time_base') or '').partition('/')[2]
+        if timescale.isdigit():
+            # шкала времени дорожки как у источника — длительности кадров копии не округляются
+            join += ['-video_track_timescale', timescale]
+        join += ['-movflags', '+faststart', output]
+        steps.append((join, None))
+        try:
+            with open(concat_list, 'w', encoding='utf-8') as f:
+                for piece in pieces:
+                    f.write("file '{}'\n".format(piece.replace('\\', '/').replace("'", "'\\''")))
+            for n, (cmd, check) in enumerate(steps):
+                code, err = run_ffmpeg(cmd, should_stop, low_priority=False)
+                if code is None:
+                    return False
+                if code != 0:
+                    logging.warning(f"Smart cut: шаг {n + 1}/{len(steps)} не удался: {err}")
+                    return False
+                if check is not None and not self._edge_matches(info, check):
+                    return False
+                if on_progress is not None:
+                    on_progress((n + 1) / len(steps))
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        logging.info(f"Smart cut {os.path.basename(source)} {start:.2f}–{end:.2f} c за {time.monotonic() - started:.2f} c: "
+                     f"перекодировано {(k_in - start) + (end - k_out):.2f} c, скопировано {k_out - k_in:.2f} c")
+        return True
+
+
+smart_cutter = SmartCutter()
+
+
+class UploadJob:
+    """Загрузка одного видео на YouTube: проверка файла, resumable-загрузка с журналом,
+    подстройкой чанков, повторами и учётом квоты. Без Qt — используется и окном
+    (UploadThread), и консольной утилитой (helper_cli).
+
+    Колбэки вызываются из потока загрузки:
+    on_progress(str) — этап/сообщение, on_progress_info(dict) — UploadStats.snapshot()
+    не чаще PROGRESS_INTERVAL, on_finished(bool, str) — итог (ссылка или текст ошибки);
+    при отмене on_finished не вызывается.
+    """
+    
+    # Оптимизированные константы для загрузки
+    CHUNK_SIZE = 5 * 1024 * 1024  # начальный размер чанка, далее подстраивается AdaptiveChunkSizer
+    MAX_RETRIES = 3               # Попытки подключения к API (повторы чанков — UploadRetryPolicy)
+    PROGRESS_INTERVAL = 0.5
+    
+    def __init__(self, creds, path, title, desc, allow_missing_ffmpeg=False, privacy_status='private', validation_mode='sampled',
+                 trim=None, faststart=False, on_progress=None, on_progress_info=None, on_finished=None):
+        self.creds = creds
+        self.path = path
+        self.title = title
+        self.desc = desc
+        # если True — пропускаем проверки ffmpeg и даём возможность загружать без обрезки
+        self.allow_missing_ffmpeg = bool(allow_missing_ffmpeg)
+        # уровень проверки видео: 'probe' | 'sampled' | 'full' (см. VideoValidator)
+        self.validation_mode = validation_mode if validation_mode in VideoValidator.MODES else 'sampled'
+        self._is_cancelled = False
+        # поток, выполняющий run() — его текущий HTTP-запрос обрывает cancel()
+        self._thread_ident = None
+        self._upload_progress = 0
+        self._last_progress_update = 0
+        # статистика текущей загрузки (остаётся доступной после finished)
+        self.stats = None
+        # {'start', 'end', 'duration'} в секундах — path обрезается ffmpeg во время загрузки (TrimPipeUpload)
+        self.trim = trim
+        # перенести moov в начало файла перед загрузкой, если он в конце (FaststartRemuxer)
+        self.faststart = bool(faststart)
+        # хэш содержимого загруженного файла (ContentHashIndex), для истории
+        self.content_hash = None
+        # запрос videos.insert отправлен (квота списана) / сервер ответил, что квота исчерпана
+        self.insert_started = False
+        self.quota_exceeded = False
+        self.video_id = None
+        # privacy status will be one of: 'private', 'unlisted', 'public'
+        self.privacy_status = privacy_status if privacy_status in ('private','unlisted','public') else 'private'
+        self._on_progress = on_progress
+        self._on_progress_info = on_progress_info
+        self._on_finished = on_finished
+        # итог последнего run(): (успех, ссылка или текст ошибки), None — отменено
+        self.result = None
+
+    def _progress(self, msg):
+        if self._on_progress is not None:
+            self._on_progress(msg)
+
+    def _finished(self, ok, msg):
+        self.result = (bool(ok), msg)
+        if self._on_finished is not None:
+            self._on_finished(ok, msg)
+    
+    def cancel(self):
+        """Отменить загрузку. Возвращается сразу: отправка тела чанка прерывается на
+        следующем блоке, а ожидание ответа сервера — обрывом сокета. Сессия resumable
+        остаётся в журнале, поэтому следующий запуск продолжит с подтверждённого смещения."""
+        self._is_cancelled = True
+        if self._thread_ident is not None:
+            abort_request(self._thread_ident)
+
+    def _emit_progress_info(self, sent=None, force=False):
+        if self.stats is None:
+            return
+        if sent is not None:
+            self.stats.update(sent)
+        now = time.monotonic()
+        if force or now - self._last_progress_update >= self.PROGRESS_INTERVAL:
+            self._last_progress_update = now
+            if self._on_progress_info is not None:
+                self._on_progress_info(self.stats.snapshot())
+
+    def _sleep(self, seconds):
+        """Пауза перед повтором, прерываемая отменой загрузки."""
+        deadline = time.monotonic() + seconds
+        while not self._is_cancelled and time.monotonic() < deadline:
+            time.sleep(min(0.2, max(0.0, deadline - time.monotonic())))
+    
+    def _validate_video_file(self, path):
+        """Проверка валидности видео файла (уровень задаётся validation_mode, результат кэшируется)."""
+        video_validator.validate(path, self.validation_mode, allow_missing_ffmpeg=self.allow_missing_ffmpeg,
+                                 should_stop=lambda: self._is_cancelled)
+    
+    @staticmethod
+    def _file_identity(path):
+        """[путь, размер, mtime] файла, байты которого уходят на сервер (для журнала сессий)."""
+        try:
+            st = os.stat(path)
+            return [os.path.abspath(path), st.st_size, int(st.st_mtime)]
+        except OSError:
+            return None
+
+    def _prepare_upload_body(self):
+        """Подготовка метаданных для загрузки."""
+        return {
+            'snippet': {
+                'title': self.title,
+                'description': self.desc,
+                'categoryId': '22',
+                'tags': ['complaint', 'report'],
+                'defaultLanguage': 'ru',
+                'defaultAudioLanguage': 'ru'
+            },
+            'status': {
+                'privacyStatus': self.privacy_status,
+                'selfDeclaredMadeForKids': False,
+                'embeddable': True,
+                'license': 'youtube'
+            },
+            'recordingDetails': {
+                'recordingDate': datetime.now().isoformat() + "Z"
+            }
+        }
+    
+    def run(self):
+        media_fd = None
+        source = None
+        self._thread_ident = get_ident()
+        try:
+            if self._is_cancelled:
+                return
+                
+            self.stats = UploadStats(get_file_size(self.path))
+
+            # Валидация файла перед загрузкой
+            try:
+                self._progress("Проверка видео файла...")
+                phase_started = time.monotonic()
+                self._validate_video_file(self.path)
+                self.stats.phase('validation', time.monotonic() - phase_started)
+            except UploadCancelled:
+                return
+            except Exception as e:
+                self._finished(False, f"Ошибка проверки видео: {str(e)}")
+                return
+                
+            retry_policy = UploadRetryPolicy()
+            phase_started = time.monotonic()
+
+            # Подключение к API (клиент общий и обычно уже построен — см. YouTubeServiceFactory)
+            for attempt in range(self.MAX_RETRIES):
+                try:
+                    yt = youtube_services.get(self.creds)
+                    break
+                except Exception as e:
+                    if attempt == self.MAX_RETRIES - 1:
+                        raise
+                    logging.warning(f"Попытка подключения {attempt + 1} не удалась: {e}")
+                    self._sleep(retry_policy.delay(attempt + 1))
+            
+            if self._is_cancelled:
+                return
+                
+            self.stats.phase('connect', time.monotonic() - phase_started)
+
+            # Подготовка загрузки
+            self._progress("Подготовка видео...")
+            upload_path = self.path
+            if self.faststart and not self.trim and FaststartRemuxer.needs_remux(self.path):
+                self._progress("Перенос индекса MP4 в начало файла...")
+                phase_started = time.monotonic()
+                upload_path = faststart_remuxer.prepare(self.path, should_stop=lambda: self._is_cancelled)
+                self.stats.phase('faststart', time.monotonic() - phase_started)
+            file_size = get_file_size(upload_path)  # Используем кэшированную функцию
+            self.stats.total = file_size
+            
+            if self._is_cancelled:
+                return
+                
+            self._progress("Загрузка на YouTube...")
+
+            # Подготовка метаданных
+            body = self._prepare_upload_body()
+
+            # Определяем MIME-тип на основе расширения файла
+            file_ext = os.path.splitext(upload_path)[1].lower()
+            mime_types = {
+                '.mp4': 'video/mp4',
+                '.avi': 'video/x-msvideo',
+                '.mov': 'video/quicktime',
+                '.mkv': 'video/x-matroska',
+                '.flv': 'video/x-flv',
+                '.wmv': 'video/x-ms-wmv'
+            }
+            mime_type = mime_types.get(file_ext, 'video/mp4')
+
+            if self.trim:
+                # потоковая обрезка: ffmpeg пишет в pipe, загрузка идёт параллельно с обрезкой
+                media = TrimPipeUpload(self.path, self.trim['start'], self.trim['end'],
+                                       chunksize=self.CHUNK_SIZE, should_stop=lambda: self._is_cancelled)
+                media_fd = media  # last_read/close как у ThrottledFile
+                duration = self.trim.get('duration') or 0
+                if duration > 0:
+                    # точный размер неизвестен до конца — оцениваем долей исходного файла
+                    self.stats.total = int(file_size * (self.trim['end'] - self.trim['start']) / duration)
+            else:
+                # чтение файла через ограничитель скорости (upload_bandwidth, лимит меняется на лету)
+                # файл отображается в память, следующий чанк читается заранее (MappedChunkReader)
+                source = MappedChunkReader(upload_path, read_ahead=self.CHUNK_SIZE)
+                media_fd = ThrottledFile(source, upload_bandwidth, lambda: self._is_cancelled,
+                                         on_read=self._emit_progress_info)
+                media = MediaIoBaseUpload(
+                    media_fd,
+                    mimetype=mime_type,
+                    chunksize=self.CHUNK_SIZE,
+                    resumable=True
+                )
+
+            req = yt.videos().insert(
+                part='snippet,status,recordingDetails',
+                body=body,
+                media_body=media
+            )
+
+            # Продолжаем незавершённую загрузку этого файла, если она есть в журнале
+            # (потоковую обрезку после перезапуска не продолжить — её вывод не сохраняется)
+            journal_entry = None if self.trim else upload_journal.find(self.path)
+            upload_identity = self._file_identity(upload_path)
+            if journal_entry and journal_entry.get('meta', {}).get('upload_file', self._file_identity(self.path)) != upload_identity:
+                # сессия начата с другими байтами (ремукс пересоздан или выключен) — продолжать нельзя
+                logging.info(f"Файл для загрузки {self.path} изменился после начала сессии, загрузка начнётся сначала")
+                upload_journal.remove(self.path, discard_prepared=True)
+                journal_entry = None
+            resuming = bool(journal_entry and journal_entry.get('session_uri'))
+            if resuming:
+                req.resumable_uri = journal_entry['session_uri']
+                # в "ошибочном" состоянии next_chunk() сначала спрашивает у сервера
+                # подтверждённый диапазон (PUT с Content-Range: bytes */size) и продолжает с него
+                req._in_error_state = True
+                done_mb = journal_entry.get('offset', 0) / (1024 * 1024)
+                self._progress(f"Возобновление загрузки (~{done_mb:.1f} MB уже на сервере)...")
+                logging.info(f"Возобновление загрузки {self.path} по сохранённой сессии, смещение {journal_entry.get('offset', 0)}")
+            journal_meta = {'title': self.title, 'desc': self.desc, 'privacy': self.privacy_status,
+                            'upload_file': upload_identity}
+
+            response = None
+            self.insert_started = True
+            transfer_started = time.monotonic()
+            retry_count = 0
+            auth_refreshes = 0
+            last_journal_offset = None
+            chunk_sizer = AdaptiveChunkSizer(self.CHUNK_SIZE)
+
+            # Загрузка с обработкой ошибок и возобновлением
+            while response is None:
+                if self._is_cancelled:
+                    return
+
+                try:
+                    # MediaIoBaseUpload читает chunksize() перед каждым чанком
+                    media._chunksize = chunk_sizer.size
+                    if source is not None:
+                        source.read_ahead = chunk_sizer.size
+                    sent_before = req.resumable_progress
+                    chunk_started = time.monotonic()
+                    status, response = req.next_chunk()
+                    chunk_done = time.monotonic()
+                    chunk_elapsed = chunk_done - chunk_started
+                    if response is None and not resuming:
+                        chunk_sizer.on_success(req.resumable_progress - sent_before, chunk_elapsed)
+                    # задержка ответа — от последнего отданного байта тела до ответа сервера
+                    sent_at = media_fd.last_read if media_fd.last_read and media_fd.last_read >= chunk_started else chunk_started
+                    if response is not None and self.trim:
+                        self.stats.total = media.bytes_total
+                    self.stats.on_chunk(self.stats.total if response is not None else req.resumable_progress,
+                                        chunk_elapsed, chunk_done - sent_at)
+                    self._emit_progress_info(force=True)
+                    retry_count = 0
+                    resuming = False
+
+                    if (response is None and not self.trim and req.resumable_uri
+                            and req.resumable_progress != last_journal_offset):
+                        upload_journal.record(self.path, req.resumable_uri, req.resumable_progress, journal_meta)
+                        last_journal_offset = req.resumable_progress
+
+
+                except Exception as e:
+                    if self._is_cancelled:
+                        # чанк оборван отменой; журнал не трогаем — сессию можно продолжить
+                        logging.info(f"Загрузка {self.path} отменена на смещении {req.resumable_progress}")
+                        return
+                    if resuming and isinstance(e, HttpError) and getattr(e.resp, 'status', None) in (404, 410):
+                        # сохранённая сессия истекла на сервере — начинаем загрузку заново
+                        logging.info(f"Сессия возобновления недействительна ({e.resp.status}), загрузка начнётся сначала")
+                        upload_journal.remove(self.path)
+                        req.resumable_uri = None
+                        req.resumable_progress = 0
+                        req._in_error_state = False
+                        resuming = False
+                        continue
+
+                    if isinstance(e, TrimPipeError):
+                        raise
+                    kind = retry_policy.classify(e)
+                    if kind == 'auth' and auth_refreshes < retry_policy.MAX_AUTH_REFRESHES:
+                        auth_refreshes += 1
+                        logging.warning(f"Токен отклонён сервером (401), обновляем и продолжаем: {e}")
+                        self._progress("Обновление авторизации...")
+                        # после refresh следующий next_chunk() запросит у сервера подтверждённый диапазон
+                        self.creds.refresh(youtube_services.auth_request())
+                        continue
+                    if kind != 'retryable':
+                        logging.error(f"Неустранимая ошибка загрузки ({kind}): {e}")
+                        raise
+
+                    retry_count += 1
+                    chunk_sizer.on_error()
+                    if retry_count > retry_policy.MAX_ATTEMPTS:
+                        raise
+                    wait = retry_policy.delay(retry_count, retry_policy.retry_after(e))
+                    self.stats.on_retry(wait)
+                    logging.warning(f"Ошибка при загрузке чанка (попытка {retry_count}), повтор через {wait:.1f} c: {e}")
+                    self._progress(f"Сбой сети, повтор через {wait:.0f} c...")
+                    self._sleep(wait)
+                    continue
+
+            video_id = response.get('id') if isinstance(response, dict) else None
+            if not video_id:
+                raise Exception('Не удалось получить id загруженного видео')
+            self.video_id = video_id
+
+            if not self.trim:
+                upload_journal.remove(self.path)
+                faststart_remuxer.discard(self.path, upload_path)
+            self.stats.phase('transfer', time.monotonic() - transfer_started)
+            logging.info(f"Статистика загрузки {os.path.basename(self.path)}: {chunk_sizer.summary()}; "
+                         f"{json.dumps(self.stats.summary(), ensure_ascii=False)}")
+            url = f"https://www.youtube.com/watch?v={video_id}"
+            logging.info(f"Видео успешно загружено: {url}")
+            if not self.trim:
+                # хэш — до _finished: очередь после него удаляет временный файл обрезки.
+                # Обычно он уже посчитан в PrevalidateThread (или дожидается идущего подсчёта)
+                if content_index.cached_hash(self.path) is None:
+                    self._progress('Подсчёт хэша для поиска повторов...')
+                try:
+                    self.content_hash = content_index.add_file(self.path, url, self.title,
+                                                               should_stop=lambda: self._is_cancelled)
+                except Exception:
+                    logging.exception('Не удалось добавить видео в индекс содержимого')
+            self._finished(True, url)
+            
+        except Exception as e:
+            if self._is_cancelled or isinstance(e, UploadCancelled):
+                return
+            if isinstance(e, TrimPipeError):
+                logging.error(f"Потоковая обрезка {os.path.basename(self.path)} не удалась: {e}")
+                self._finished(False, f"Ошибка обрезки: {e}")
+                return
+            logging.exception("Ошибка при загрузке видео")
+            error_msg = str(e)
+            reason = UploadRetryPolicy.http_error_reason(e) if isinstance(e, HttpError) else ''
+            if reason in ('quotaExceeded', 'dailyLimitExceeded') or "quota" in error_msg.lower():
+                # локальный учёт разошёлся с сервером — очередь отложит задание до сброса квоты
+                self.quota_exceeded = True
+                quota_ledger.mark_exhausted()
+                error_msg = "Превышен дневной лимит загрузок YouTube. Попробуйте позже."
+            elif "credentials" in error_msg.lower():
+                error_msg = "Ошибка авторизации. Попробуйте авторизоваться заново."
+            self._finished(False, f"Ошибка: {error_msg}")
+        finally:
+            # поток может взять следующее задание (пул в helper_cli) — cancel() его не касается
+            self._thread_ident = None
+            try:
+                if media_fd is not None:
+                    media_fd.close()
+            except Exception:
+                pass
@@ -2,38 +2,43 @@ import sys
 import os
 import pickle
 import json
-import glob
 import webbrowser
 import urllib.request
 import urllib.error
 from typing import Optional
 import logging
 import tempfile
+import time
 import subprocess
 import shutil
 import concurrent.futures
-import multiprocessing
 from functools import partial, lru_cache
 from datetime import datetime
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QDateEdit, QDialog, QMessageBox,
     QFileDialog, QComboBox, QCheckBox, QGroupBox, QFrame, QScrollArea, QTextEdit,
-    QSlider, QStackedWidget, QProgressDialog, QProgressBar, QGraphicsDropShadowEffect, QSizePolicy, QListWidget, QListWidgetItem
+    QSlider, QStackedWidget, QProgressDialog, QProgressBar, QGraphicsDropShadowEffect, QSizePolicy, QListWidget, QListWidgetItem,
+    QSpinBox
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QDate, QTimer, QEvent, QUrl
+from PyQt6.QtCore import Qt, QObject, QThread, pyqtSignal, QDate, QTimer, QEvent, QUrl, QFileSystemWatcher
 from PyQt6.QtGui import QPainter, QBrush, QLinearGradient, QColor, QPen
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QVideoWidget
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from folder_events import NativeFolderEvents
+from uploader_core import (
+    MAX_WORKERS, file_lock, get_file_size, build_description,
+    youtube_services, upload_bandwidth, scheduled_upload_limit_kbps,
+    upload_journal, content_index, quota_ledger, QuotaLedger,
+    UploadJob, UploadRetryPolicy, UploadCancelled, format_upload_progress,
+    VideoValidator, video_validator, KeyframeIndex, keyframe_index, smart_cutter,
+    VideoEncoder, video_encoder, FaststartRemuxer,
+)
 from urllib.parse import urlparse
 
 # Оптимизация для многопоточных операций
-MAX_WORKERS = multiprocessing.cpu_count()
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
 GITHUB_REPO = 'Jokissmens/Helper'
@@ -159,21 +164,7 @@ def fetch_github_file(repo: str, path: str, ref: str = None, timeout: float = 6.
     except Exception as e:
         logging.debug(f'Ошибка при обращении к GitHub contents API: {e}')
         return None
-# Оптимизация доступа к файлам
-file_lock = Lock()
-
-# Кэширование для часто используемых операций
-@lru_cache(maxsize=128)
-def get_file_size(file_path):
-    """Кэшированное получение размера файла."""
-    try:
-        return os.path.getsize(file_path)
-    except (OSError, IOError):
-        return 0
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from urllib.parse import urlparse
 
 # Оптимизация настроек окружения и Qt
@@ -377,205 +368,766 @@ THEMES = {
 }
 
 class UploadThread(QThread):
+    """Загрузка одного видео в фоне: Qt-обёртка над UploadJob (uploader_core)."""
     progress = pyqtSignal(str)
+    # структурированный прогресс (см. UploadStats.snapshot), не чаще UploadJob.PROGRESS_INTERVAL
+    progress_info = pyqtSignal(dict)
     finished = pyqtSignal(bool, str)
-    
-    # Оптимизированные константы для загрузки
-    CHUNK_SIZE = 5 * 1024 * 1024  # 5MB chunks для лучшей производительности
-    MAX_RETRIES = 3               # Максимальное количество попыток при ошибках
-    RETRY_DELAY = 2               # Задержка между попытками в секундах
-    
-    def __init__(self, creds, path, title, desc, allow_missing_ffmpeg=False, privacy_status='private'):
+    # загрузка отменена: UploadJob завершился без результата, finished не приходит
+    stopped = pyqtSignal()
+
+    def __init__(self, creds, path, title, desc, allow_missing_ffmpeg=False, privacy_status='private', validation_mode='sampled',
+                 trim=None, faststart=False):
         super().__init__()
-        self.creds = creds
-        self.path = path
-        self.title = title
-        self.desc = desc
-        # если True — пропускаем проверки ffmpeg и даём возможность загружать без обрезки
-        self.allow_missing_ffmpeg = bool(allow_missing_ffmpeg)
-        self._is_cancelled = False
-        self._upload_progress = 0
-        self._last_progress_update = 0
-        # privacy status will be one of: 'private', 'unlisted', 'public'
-        self.privacy_status = privacy_status if privacy_status in ('private','unlisted','public') else 'private'
-    
+        self.job = UploadJob(creds, path, title, desc, allow_missing_ffmpeg=allow_missing_ffmpeg,
+                             privacy_status=privacy_status, validation_mode=validation_mode, trim=trim,
+                             faststart=faststart,
+                             on_progress=self.progress.emit, on_progress_info=self.progress_info.emit,
+                             on_finished=self.finished.emit)
+
     def cancel(self):
-        self._is_cancelled = True
-    
-    def _validate_video_file(self, path):
-        """Проверка валидности видео файла."""
-        if not os.path.exists(path):
-            raise FileNotFoundError("Видео файл не найден")
-            
-        file_size = get_file_size(path)  # Используем кэшированную функцию
-        if file_size == 0:
-            raise ValueError("Видео файл пуст")
-            
-        # Проверка формата файла и его читаемости через ffmpeg
-        if shutil.which('ffmpeg') is None:
-            # если настройка разрешает загрузку без ffmpeg — пропускаем проверку
-            if getattr(self, 'allow_missing_ffmpeg', False):
-                logging.info('FFmpeg не найден, но загрузка разрешена настройкой (allow_missing_ffmpeg=True)')
+        self.job.cancel()
+
+    def run(self):
+        self.job.run()
+        if self.job.result is None:
+            self.stopped.emit()
+
+
+class UploadQueue(QObject):
+    """Очередь загрузок: каждое видео со своими заголовком/описанием/приватностью,
+    одновременно выполняется не более max_concurrent потоков UploadThread."""
+    item_changed = pyqtSignal(int)
+    item_finished = pyqtSignal(int, bool, str)
+
+    STATUS_TEXT = {
+        'queued': 'В очереди',
+        'deferred': 'Отложено до сброса квоты',
+        'running': 'Загрузка',
+        'done': 'Готово',
+        'error': 'Ошибка',
+        'cancelled': 'Отменено',
+    }
+
+    def __init__(self, creds_getter, max_concurrent=2, parent=None):
+        super().__init__(parent)
+        # creds_getter — вызывается при старте каждого элемента (токен мог обновиться)
+        self._creds_getter = creds_getter
+        self.max_concurrent = max(1, int(max_concurrent or 1))
+        self.validation_mode = 'sampled'
+        # перенос moov в начало MP4 перед загрузкой (см. FaststartRemuxer)
+        self.faststart = False
+        self.items = []
+        self._next_id = 1
+        # повторный запуск отложенных по квоте заданий после её сброса
+        self._quota_timer = QTimer(self)
+        self._quota_timer.setSingleShot(True)
+        self._quota_timer.timeout.connect(self._schedule)
+
+    def set_max_concurrent(self, n):
+        self.max_concurrent = max(1, int(n or 1))
+        self._schedule()
+
+    def get(self, item_id):
+        for it in self.items:
+            if it['id'] == item_id:
+                return it
+        return None
+
+    def active_count(self):
+        return sum(1 for it in self.items if it['status'] == 'running')
+
+    def pending_count(self):
+        return sum(1 for it in self.items if it['status'] in ('queued', 'deferred', 'running'))
+
+    def enqueue(self, path, title, desc, privacy, allow_missing_ffmpeg=False, temp_file=False, trim=None):
+        item = {
+            'id': self._next_id,
+            'path': path,
+            'title': title,
+            'desc': desc,
+            'privacy': privacy,
+            'allow_missing_ffmpeg': bool(allow_missing_ffmpeg),
+            # временный файл после обрезки — очередь удаляет его, когда загрузка завершена или отменена
+            'temp_file': bool(temp_file),
+            # отрезок для потоковой обрезки во время загрузки (см. TrimPipeUpload)
+            'trim': trim,
+            'status': 'queued',
+            'message': '',
+            'result': None,
+            'thread': None,
+            # последний UploadStats.snapshot() и итог загрузки (UploadStats.summary)
+            'progress': None,
+            'stats': None,
+            'hash': None,
+            'video_id': None,
+        }
+        self._next_id += 1
+        self.items.append(item)
+        logging.info(f"В очередь добавлено: {os.path.basename(path)} ({title})")
+        self.item_changed.emit(item['id'])
+        self._schedule()
+        return item['id']
+
+    def _insert_cost(self, it):
+        """Единицы квоты на запуск элемента: продолжение сохранённой сессии новый videos.insert не тратит."""
+        if not it.get('trim') and upload_journal.find(it['path']):
+            return 0
+        return QuotaLedger.COSTS['videos.insert']
+
+    def _defer(self, it):
+        it['status'] = 'deferred'
+        it['thread'] = None
+        it['message'] = f"Отложено до сброса квоты YouTube ({quota_ledger.reset_at_local()})"
+        self.item_changed.emit(it['id'])
+        if not self._quota_timer.isActive():
+            # с запасом минута на расхождение часов
+            self._quota_timer.start(int((quota_ledger.seconds_until_reset() + 60) * 1000))
+
+    def _schedule(self):
+        for it in self.items:
+            if self.active_count() >= self.max_concurrent:
+                break
+            if it['status'] not in ('queued', 'deferred'):
+                continue
+            cost = self._insert_cost(it)
+            # проверка и резерв квоты — одна операция, чтобы параллельные запуски не превысили остаток
+            spent = quota_ledger.try_reserve('videos.insert', cost) if cost else 0
+            if spent is None:
+                if it['status'] != 'deferred':
+                    logging.info(f"Квоты не хватает (осталось {quota_ledger.remaining()}), "
+                                 f"загрузка {os.path.basename(it['path'])} отложена")
+                    self._defer(it)
+                continue
+            it['quota_spent'] = spent
+            self._start_item(it)
+
+    def _start_item(self, it):
+        th = UploadThread(self._creds_getter(), it['path'], it['title'], it['desc'],
+                          allow_missing_ffmpeg=it['allow_missing_ffmpeg'], privacy_status=it['privacy'],
+                          validation_mode=self.validation_mode, trim=it.get('trim'), faststart=self.faststart)
+        item_id = it['id']
+        th.progress.connect(lambda m, i=item_id: self._on_progress(i, m))
+        th.progress_info.connect(lambda info, i=item_id: self._on_progress_info(i, info))
+        th.finished.connect(lambda ok, r, i=item_id: self._on_finished(i, ok, r))
+        th.stopped.connect(lambda i=item_id: self._release(self.get(i)))
+        it['thread'] = th
+        it['status'] = 'running'
+        it['message'] = 'Подготовка...'
+        self.item_changed.emit(item_id)
+        th.start()
+
+    def _on_progress(self, item_id, msg):
+        it = self.get(item_id)
+        if it is not None:
+            it['message'] = msg
+            self.item_changed.emit(item_id)
+
+    def _on_progress_info(self, item_id, info):
+        it = self.get(item_id)
+        if it is not None and it['status'] == 'running':
+            it['progress'] = info
+            it['message'] = format_upload_progress(info)
+            self.item_changed.emit(item_id)
+
+    def _remove_temp_file(self, it):
+        """Удалить временный файл обрезки элемента (поток загрузки его уже не читает)."""
+        if not it['temp_file']:
+            return
+        it['temp_file'] = False
+        try:
+            if os.path.exists(it['path']):
+                os.unlink(it['path'])
+        except Exception:
+            logging.debug(f"Не удалось удалить временный файл {it['path']}")
+
+    def _refund_unused(self, it):
+        """Вернуть резерв квоты, если до videos.insert дело не дошло (проверка не прошла, отмена)."""
+        th = it.get('thread')
+        if th is not None and not th.job.insert_started and it.get('quota_spent'):
+            quota_ledger.refund('videos.insert', it['quota_spent'])
+            it['quota_spent'] = 0
+
+    def _release(self, it):
+        """Отменённый элемент, поток которого завершился: резерв квоты и временный файл больше не нужны.
+        Повторный вызов ничего не делает."""
+        if it is None:
+            return
+        self._refund_unused(it)
+        self._remove_temp_file(it)
+
+    def _on_finished(self, item_id, ok, result):
+        it = self.get(item_id)
+        if it is None:
+            return
+        th = it.get('thread')
+        if not ok:
+            self._refund_unused(it)
+        if it['status'] == 'cancelled':
+            self._release(it)
+            return
+        if not ok and th is not None:
+            if th.job.quota_exceeded:
+                self._defer(it)
+                self._schedule()
                 return
-            # Ясное сообщение — ffmpeg недоступен в PATH
-            raise ValueError("FFmpeg не найден в системе. Установите FFmpeg и добавьте его в PATH (например: C:\\ffmpeg\\bin)")
+        if th is not None and th.job.stats is not None:
+            it['stats'] = th.job.stats.summary()
+        if th is not None:
+            it['hash'] = th.job.content_hash
+            it['video_id'] = th.job.video_id
+        it['status'] = 'done' if ok else 'error'
+        it['result'] = result
+        it['message'] = result
+        self._remove_temp_file(it)
+        self.item_changed.emit(item_id)
+        self.item_finished.emit(item_id, bool(ok), result)
+        self._schedule()
+
+    def cancel_all(self, wait_ms=1500):
+        """Отменить ожидающие и выполняющиеся загрузки (журнал сессий сохраняется).
+
+        Сначала отменяются все потоки (cancel() обрывает текущий запрос и проверку видео
+        сразу), затем ожидание их завершения — общее, не дольше wait_ms на всю очередь.
+        Возвращает потоки, которые ещё не завершились.
+        """
+        self._quota_timer.stop()
+        running = []
+        for it in self.items:
+            if it['status'] in ('queued', 'deferred', 'running'):
+                th = it.get('thread')
+                it['status'] = 'cancelled'
+                it['message'] = self.STATUS_TEXT['cancelled']
+                if th is not None and th.isRunning():
+                    th.cancel()
+                    running.append(it)
+                else:
+                    self._release(it)
+                self.item_changed.emit(it['id'])
+        deadline = time.monotonic() + wait_ms / 1000
+        pending = []
+        for it in running:
+            th = it['thread']
+            if not th.wait(max(0, int((deadline - time.monotonic()) * 1000))):
+                logging.warning('Поток загрузки не завершился вовремя после отмены')
+                pending.append(th)
+            else:
+                # сигнал stopped при закрытии окна может уже не обработаться
+                self._release(it)
+        return pending
+
+    def clear_finished(self):
+        self.items = [it for it in self.items if it['status'] in ('queued', 'deferred', 'running')]
+
+    def overall_progress(self):
+        """Суммарный прогресс выполняющихся загрузок: (отправлено, всего, скорость байт/с)."""
+        sent = total = rate = 0
+        for it in self.items:
+            info = it.get('progress')
+            if it['status'] == 'running' and info:
+                sent += info.get('sent', 0)
+                total += info.get('total', 0)
+                rate += info.get('rate_avg', 0)
+        return sent, total, rate
+
+    def describe(self, it):
+        """Текст строки очереди для UI."""
+        icon = {'queued': '🕒', 'deferred': '⏸', 'running': '⏳', 'done': '✓', 'error': '❌', 'cancelled': '✕'}.get(it['status'], '')
+        name = os.path.basename(it['path']) + (' ✂' if it.get('trim') else '')
+        msg = it['message'] if it['status'] in ('running', 'deferred', 'error') else self.STATUS_TEXT.get(it['status'], '')
+        return f"{icon} {it['title']} — {name}\n{msg}"
+
+
+class PostUploadBatcher(QObject):
+    """Операции после загрузки (добавление в плейлист доказательств): копятся FLUSH_DELAY_MS
+    и уходят batch-запросами API (до BATCH_LIMIT вызовов) вместо HTTP round-trip на каждое видео.
+
+    Ошибки отдельных операций повторяются поштучно (UploadRetryPolicy), успешные не переотправляются.
+    Статус обработки видео сюда не входит — его опрашивает ProcessingPoller.
+    """
+    # video_id, операция ('playlist'), успех, ответ API (dict) или текст ошибки
+    op_done = pyqtSignal(str, str, bool, object)
+
+    BATCH_LIMIT = 50            # вызовов в одном batch-запросе
+    FLUSH_DELAY_MS = 5000       # ждём остальные видео очереди перед отправкой
+    MAX_ATTEMPTS = 4
+
+    def __init__(self, creds_getter, parent=None):
+        super().__init__(parent)
+        self._creds_getter = creds_getter
+        # ID плейлиста, куда добавляются загруженные видео ('' — не добавлять)
+        self.playlist_id = ''
+        self._pending = []
+        self._lock = Lock()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
 
+    def add_video(self, video_id):
+        if not video_id:
+            return
+        # статус обработки отслеживает ProcessingPoller
+        if not self.playlist_id:
+            return
+        ops = [{'video_id': video_id, 'op': 'playlist', 'playlist_id': self.playlist_id, 'attempt': 0}]
+        with self._lock:
+            self._pending.extend(ops)
+            full = len(self._pending) >= self.BATCH_LIMIT
+        if full:
+            self.flush()
+        else:
+            self._timer.start(self.FLUSH_DELAY_MS)
+
+    def flush(self):
+        self._timer.stop()
+        with self._lock:
+            ops, self._pending = self._pending, []
+        if ops:
+            Thread(target=self._run, args=(ops,), daemon=True).start()
+
+    @staticmethod
+    def _request(yt, op):
+        """HttpRequest для операции и имя метода API (для учёта квоты)."""
+        body = {'snippet': {'playlistId': op['playlist_id'],
+                            'resourceId': {'kind': 'youtube#video', 'videoId': op['video_id']}}}
+        return yt.playlistItems().insert(part='snippet', body=body), 'playlistItems.insert'
+
+    def _finish(self, op, ok, result):
+        if not ok:
+            logging.warning(f"Операция после загрузки {op['op']} для {op['video_id']} не выполнена: {result}")
+        self.op_done.emit(op['video_id'], op['op'], bool(ok), result)
+
+    def _run(self, ops):
+        policy = UploadRetryPolicy()
         try:
-            result = subprocess.run(
-                ['ffmpeg', '-v', 'error', '-i', path, '-f', 'null', '-'],
-                capture_output=True,
-                text=True
-            )
-            if result.stderr:
-                raise ValueError(f"Видео файл повреждён: {result.stderr}")
-        except FileNotFoundError:
-            # На случай, если бинарник удалили между проверкой и запуском
-            raise ValueError("FFmpeg бинарник не найден. Убедитесь, что ffmpeg доступен в PATH")
-        except subprocess.CalledProcessError as e:
-            raise ValueError(f"Ошибка проверки видео: {e.stderr if e.stderr else str(e)}")
-    
-    def _prepare_upload_body(self):
-        """Подготовка метаданных для загрузки."""
+            creds = self._creds_getter()
+            yt = youtube_services.get(creds)
+        except Exception as e:
+            for op in ops:
+                self._finish(op, False, str(e))
+            return
+        attempt = 0
+        while ops:
+            retry = []
+            need_refresh = False
+            for start in range(0, len(ops), self.BATCH_LIMIT):
+                part = ops[start:start + self.BATCH_LIMIT]
+                by_id = {}
+                reported = set()
+
+                def on_failure(op, exc):
+                    nonlocal need_refresh
+                    kind = policy.classify(exc)
+                    if kind in ('retryable', 'auth') and op['attempt'] + 1 < self.MAX_ATTEMPTS:
+                        op['attempt'] += 1
+                        need_refresh = need_refresh or kind == 'auth'
+                        retry.append(op)
+                    else:
+                        self._finish(op, False, str(exc))
+
+                def callback(request_id, response, exception):
+                    op = by_id[request_id]
+                    reported.add(request_id)
+                    if exception is None:
+                        self._finish(op, True, response)
+                    else:
+                        on_failure(op, exception)
+
+                batch = yt.new_batch_http_request(callback=callback)
+                for i, op in enumerate(part):
+                    req, method = self._request(yt, op)
+                    quota_ledger.spend(method)
+                    by_id[str(i)] = op
+                    batch.add(req, request_id=str(i))
+                try:
+                    batch.execute()
+                except Exception as e:
+                    # сбой всего batch-запроса — повторяем то, на что ответа не было
+                    logging.warning(f"Batch-запрос после загрузки не выполнен: {e}")
+                    for request_id, op in by_id.items():
+                        if request_id not in reported:
+                            on_failure(op, e)
+            ops = retry
+            if ops:
+                attempt += 1
+                if need_refresh:
+                    try:
+                        creds.refresh(youtube_services.auth_request())
+                    except Exception:
+                        logging.exception('Не удалось обновить токен для операций после загрузки')
+                time.sleep(policy.delay(attempt))
+        logging.info('Операции после загрузки выполнены')
+
+
+class ProcessingPoller(QObject):
+    """Отслеживание обработки загруженных видео на YouTube: ссылка становится рабочей
+    не сразу после videos.insert, а когда YouTube закончит обработку.
+
+    Все отслеживаемые видео запрашиваются одним videos.list за цикл (до 50 id), интервал
+    между циклами растёт (INITIAL_INTERVAL → MAX_INTERVAL) и сбрасывается при добавлении
+    нового видео. Когда все видео обработаны (или отслеживаются дольше MAX_TRACK_SECONDS),
+    опрос останавливается.
+    """
+    # video_id, {'upload_status', 'processing_status', 'playable', 'failure'}
+    status_changed = pyqtSignal(str, dict)
+    # результат цикла из фонового потока: {video_id: ресурс videos.list} или None при ошибке
+    _polled = pyqtSignal(object)
+
+    BATCH_LIMIT = 50                # id в одном videos.list
+    INITIAL_INTERVAL = 15.0
+    MAX_INTERVAL = 300.0
+    BACKOFF = 1.6
+    MAX_TRACK_SECONDS = 6 * 3600
+    FAILED_STATUSES = ('failed', 'rejected', 'deleted')
+
+    def __init__(self, creds_getter, parent=None):
+        super().__init__(parent)
+        self._creds_getter = creds_getter
+        self._tracked = {}          # video_id -> {'since': time.time(), 'status': последний dict}
+        self._interval = self.INITIAL_INTERVAL
+        self._busy = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._poll)
+        self._polled.connect(self._on_polled)
+
+    def track(self, video_id, since=None):
+        """Начать отслеживание видео (since — время загрузки, time.time())."""
+        if not video_id or video_id in self._tracked:
+            return
+        self._tracked[video_id] = {'since': since or time.time(), 'status': None}
+        self._interval = self.INITIAL_INTERVAL
+        if not self._busy:
+            self._timer.start(int(self._interval * 1000))
+
+    def tracked_count(self):
+        return len(self._tracked)
+
+    def stop(self):
+        self._timer.stop()
+        self._tracked.clear()
+
+    def _poll(self):
+        now = time.time()
+        for vid in [v for v, t in self._tracked.items() if now - t['since'] > self.MAX_TRACK_SECONDS]:
+            logging.info(f"Обработка видео {vid} не завершилась за {self.MAX_TRACK_SECONDS // 3600} ч, опрос прекращён")
+            self._tracked.pop(vid, None)
+        if not self._tracked:
+            return
+        self._busy = True
+        ids = list(self._tracked)
+        Thread(target=self._fetch, args=(ids,), daemon=True).start()
+
+    def _fetch(self, ids):
+        try:
+            yt = youtube_services.get(self._creds_getter())
+            found = {}
+            for start in range(0, len(ids), self.BATCH_LIMIT):
+                part = ids[start:start + self.BATCH_LIMIT]
+                quota_ledger.spend('videos.list')
+                # maxResults с id не поддерживается — объём ответа и так ограничен списком id
+                resp = yt.videos().list(part='status,processingDetails', id=','.join(part)).execute()
+                for item in resp.get('items') or []:
+                    found[item.get('id')] = item
+            # отсутствующие в ответе id — видео удалено или недоступно
+            self._polled.emit({vid: found.get(vid) for vid in ids})
+        except Exception as e:
+            logging.warning(f"Не удалось получить статус обработки видео: {e}")
+            self._polled.emit(None)
+
+    @classmethod
+    def _status(cls, item):
+        if item is None:
+            return {'upload_status': 'deleted', 'processing_status': '', 'playable': False,
+                    'failure': 'видео не найдено'}
+        status = item.get('status') or {}
+        details = item.get('processingDetails') or {}
+        upload_status = status.get('uploadStatus', '')
+        processing_status = details.get('processingStatus', '')
+        failure = status.get('failureReason') or status.get('rejectionReason') or details.get('processingFailureReason') or ''
         return {
-            'snippet': {
-                'title': self.title,
-                'description': self.desc,
-                'categoryId': '22',
-                'tags': ['complaint', 'report'],
-                'defaultLanguage': 'ru',
-                'defaultAudioLanguage': 'ru'
-            },
-            'status': {
-                'privacyStatus': self.privacy_status,
-                'selfDeclaredMadeForKids': False,
-                'embeddable': True,
-                'license': 'youtube'
-            },
-            'recordingDetails': {
-                'recordingDate': datetime.now().isoformat() + "Z"
-            }
+            'upload_status': upload_status,
+            'processing_status': processing_status,
+            'playable': upload_status == 'processed' or processing_status == 'succeeded',
+            'failure': failure,
         }
-    
-    def run(self):
-        try:
-            if self._is_cancelled:
-                return
-                
-            # Валидация файла перед загрузкой
-            try:
-                self.progress.emit("Проверка видео файла...")
-                self._validate_video_file(self.path)
-            except Exception as e:
-                self.finished.emit(False, f"Ошибка проверки видео: {str(e)}")
-                return
-                
-            # Подключение к API
-            self.progress.emit("Подключение к YouTube API...")
-            for attempt in range(self.MAX_RETRIES):
+
+    def _on_polled(self, result):
+        self._busy = False
+        if result is not None:
+            for vid, item in result.items():
+                entry = self._tracked.get(vid)
+                if entry is None:
+                    continue
+                info = self._status(item)
+                if info != entry['status']:
+                    entry['status'] = info
+                    self.status_changed.emit(vid, info)
+                if (info['playable'] or info['upload_status'] in self.FAILED_STATUSES
+                        or info['processing_status'] in ('failed', 'terminated')):
+                    self._tracked.pop(vid, None)
+        if not self._tracked:
+            logging.info('Обработка всех загруженных видео завершена, опрос остановлен')
+            self._interval = self.INITIAL_INTERVAL
+            return
+        self._timer.start(int(self._interval * 1000))
+        self._interval = min(self.MAX_INTERVAL, self._interval * self.BACKOFF)
+
+
+class PrevalidateThread(QThread):
+    """Фоновая подготовка выбранного файла, пока пользователь заполняет форму:
+    проверка видео (результат попадает в кэш VideoValidator) и прогрев page cache.
+
+    Emitted dict structure: {'ok': bool|None, 'path': str, 'error': str|None, 'elapsed': float}
+    ok=None — проверка отменена и не выполнялась (файл не считается проверенным).
+    После проверки считается хэш содержимого (ContentHashIndex): hashed({'path': str, 'hash': str}).
+    """
+    done = pyqtSignal(dict)
+    hashed = pyqtSignal(dict)
+
+    # сколько байт с начала файла читаем заранее (первые чанки загрузки)
+    WARMUP_BYTES = 512 * 1024 * 1024
+    READ_BLOCK = 4 * 1024 * 1024
+
+    def __init__(self, path, validation_mode='sampled', allow_missing_ffmpeg=False, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.validation_mode = validation_mode
+        self.allow_missing_ffmpeg = allow_missing_ffmpeg
+        self._is_cancelled = False
+
+    def cancel(self):
+        self._is_cancelled = True
+
+    def _warm_page_cache(self):
+        """Читаем начало файла, чтобы первые чанки загрузки шли из памяти, а не с диска."""
+        limit = min(get_file_size(self.path), self.WARMUP_BYTES)
+        fadvise = getattr(os, 'posix_fadvise', None)
+        with open(self.path, 'rb', buffering=0) as f:
+            if fadvise is not None:
                 try:
-                    yt = build('youtube', 'v3', credentials=self.creds)
+                    fadvise(f.fileno(), 0, limit, os.POSIX_FADV_WILLNEED)
+                    return
+                except OSError:
+                    pass
+            read = 0
+            while read < limit and not self._is_cancelled:
+                block = f.read(self.READ_BLOCK)
+                if not block:
                     break
-                except Exception as e:
-                    if attempt == self.MAX_RETRIES - 1:
-                        raise
-                    logging.warning(f"Попытка подключения {attempt + 1} не удалась: {e}")
-                    import time
-                    time.sleep(self.RETRY_DELAY)
-            
-            if self._is_cancelled:
-                return
-                
-            # Подготовка загрузки
-            self.progress.emit("Подготовка видео...")
-            file_size = get_file_size(self.path)  # Используем кэшированную функцию
-            
+                read += len(block)
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            self._warm_page_cache()
             if self._is_cancelled:
+                self.done.emit({'ok': None, 'path': self.path, 'error': 'проверка отменена',
+                                'elapsed': time.monotonic() - started})
                 return
-                
-            self.progress.emit("Загрузка на YouTube...")
-
-            # Подготовка метаданных
-            body = self._prepare_upload_body()
-
-            # Определяем MIME-тип на основе расширения файла
-            file_ext = os.path.splitext(self.path)[1].lower()
-            mime_types = {
-                '.mp4': 'video/mp4',
-                '.avi': 'video/x-msvideo',
-                '.mov': 'video/quicktime',
-                '.mkv': 'video/x-matroska',
-                '.flv': 'video/x-flv',
-                '.wmv': 'video/x-ms-wmv'
-            }
-            mime_type = mime_types.get(file_ext, 'video/mp4')
+            video_validator.validate(self.path, self.validation_mode, allow_missing_ffmpeg=self.allow_missing_ffmpeg,
+                                     low_priority=True, should_stop=lambda: self._is_cancelled)
+            self.done.emit({'ok': True, 'path': self.path, 'error': None, 'elapsed': time.monotonic() - started})
+        except UploadCancelled:
+            self.done.emit({'ok': None, 'path': self.path, 'error': 'проверка отменена',
+                            'elapsed': time.monotonic() - started})
+            return
+        except Exception as e:
+            logging.info(f"Предварительная проверка {os.path.basename(self.path)} не прошла: {e}")
+            self.done.emit({'ok': False, 'path': self.path, 'error': str(e), 'elapsed': time.monotonic() - started})
+            return
+        try:
+            digest = content_index.compute(self.path, lambda: self._is_cancelled)
+            if digest:
+                self.hashed.emit({'path': self.path, 'hash': digest})
+        except Exception:
+            logging.exception('Не удалось посчитать хэш содержимого')
 
-            media = MediaFileUpload(
-                self.path,
-                chunksize=self.CHUNK_SIZE,
-                resumable=True,
-                mimetype=mime_type
-            )
 
-            req = yt.videos().insert(
-                part='snippet,status,recordingDetails',
-                body=body,
-                media_body=media
-            )
+class FolderWatcher(QObject):
+    """Наблюдение за папками записи: новые видеофайлы передаются в file_ready, когда
+    их размер перестал меняться (запись завершена).
 
-            response = None
-            last_progress_time = 0
-            last_progress_value = 0
-            retry_count = 0
+    Уведомления файловой системы по отдельным файлам: watchdog (если установлен), иначе
+    NativeFolderEvents (ReadDirectoryChangesW / inotify). Только там, где их нет, используется
+    QFileSystemWatcher: он сообщает лишь об изменении папки, поэтому серия уведомлений
+    сводится в одну сверку списка имён. Периодически проверяются только файлы-кандидаты,
+    поэтому папки с тысячами старых записей почти не нагружают процессор.
+    """
+    # путь к файлу, настройки папки {'path', 'link', 'privacy'}
+    file_ready = pyqtSignal(str, dict)
+    # событие из фонового потока (watchdog, NativeFolderEvents) → обработка в потоке окна
+    _file_event = pyqtSignal(str)
+    # ОС потеряла события папки — сверяем список имён
+    _folder_overflow = pyqtSignal(str)
+
+    VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.flv', '.wmv')
+    CHECK_INTERVAL_MS = 2000
+    STABLE_CHECKS = 3           # столько проверок подряд размер и mtime не менялись
+    RESCAN_DELAY_MS = 1000      # QFileSystemWatcher: серия изменений папки → одна сверка
 
-            # Загрузка с обработкой ошибок и возобновлением
-            import time
-            while response is None:
-                if self._is_cancelled:
-                    return
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._folders = {}
+        self._candidates = {}
+        self._seen = set()
+        self._observer = None
+        self._native = None
+        self._qt_watcher = None
+        self._listing = {}
+        self._dirty = set()
+        self._file_event.connect(self._on_file_event)
+        self._folder_overflow.connect(self._rescan_folder)
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.CHECK_INTERVAL_MS)
+        self._timer.timeout.connect(self._check_candidates)
+        self._rescan_timer = QTimer(self)
+        self._rescan_timer.setSingleShot(True)
+        self._rescan_timer.setInterval(self.RESCAN_DELAY_MS)
+        self._rescan_timer.timeout.connect(self._rescan_dirty)
+
+    @staticmethod
+    def _norm(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def start(self, folders):
+        """folders — список путей или словарей {'path', 'link', 'privacy'}."""
+        self.stop()
+        for f in folders or []:
+            opts = dict(f) if isinstance(f, dict) else {'path': f}
+            if opts.get('path') and os.path.isdir(opts['path']):
+                self._folders[self._norm(opts['path'])] = opts
+            else:
+                logging.warning(f"Папка наблюдения не найдена: {opts.get('path')}")
+        if not self._folders:
+            return
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
 
-                try:
-                    status, response = req.next_chunk()
-                    retry_count = 0
-
-                    if status:
-                        uploaded = getattr(status, 'resumable_progress', None)
-                        if uploaded is None:
-                            # иногда status содержит progress в другом поле
-                            uploaded = getattr(status, 'progress', 0)
-                        percent = (uploaded / file_size) * 100 if file_size else 0
-
-                        cur_time = time.time()
-                        if (cur_time - last_progress_time >= 0.5) or (abs(percent - last_progress_value) >= 1):
-                            uploaded_mb = uploaded / (1024 * 1024)
-                            total_mb = file_size / (1024 * 1024) if file_size else 0
-                            self.progress.emit(f"Загружено: {int(percent)}% ({uploaded_mb:.1f}/{total_mb:.1f} MB)")
-                            last_progress_time = cur_time
-                            last_progress_value = percent
+            emit = self._file_event.emit
 
-                except Exception as e:
-                    retry_count += 1
-                    logging.warning(f"Ошибка при загрузке чанка (попытка {retry_count}): {e}")
-                    if retry_count > self.MAX_RETRIES:
-                        raise
-                    time.sleep(self.RETRY_DELAY)
-                    continue
+            class _Handler(FileSystemEventHandler):
+                def on_created(self, event):
+                    if not event.is_directory:
+                        emit(event.src_path)
 
-            video_id = response.get('id') if isinstance(response, dict) else None
-            if not video_id:
-                raise Exception('Не удалось получить id загруженного видео')
+                def on_moved(self, event):
+                    if not event.is_directory:
+                        emit(event.dest_path)
+
+            self._observer = Observer()
+            for folder in self._folders:
+                self._observer.schedule(_Handler(), folder, recursive=False)
+            self._observer.start()
+            logging.info(f"Наблюдение за папками (watchdog): {', '.join(self._folders)}")
+            return
+        except ImportError:
+            self._observer = None
+        # снимок имён нужен только для сверки после потери событий (или для QFileSystemWatcher)
+        for folder in self._folders:
+            try:
+                self._listing[folder] = set(os.listdir(folder))
+            except OSError:
+                self._listing[folder] = set()
+        if NativeFolderEvents.supported():
+            native = NativeFolderEvents(list(self._folders), self._file_event.emit, self._folder_overflow.emit)
+            if native.start():
+                self._native = native
+                logging.info(f"Наблюдение за папками (события ОС): {', '.join(self._folders)}")
+                return
+        self._qt_watcher = QFileSystemWatcher(list(self._folders), self)
+        self._qt_watcher.directoryChanged.connect(self._on_directory_changed)
+        logging.info(f"Наблюдение за папками (QFileSystemWatcher): {', '.join(self._folders)}")
+
+    def stop(self):
+        self._timer.stop()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(2)
+            except Exception:
+                logging.exception('Ошибка остановки наблюдения за папками')
+            self._observer = None
+        if self._native is not None:
+            try:
+                self._native.stop()
+            except Exception:
+                logging.exception('Ошибка остановки наблюдения за папками')
+            self._native = None
+        if self._qt_watcher is not None:
+            self._qt_watcher.deleteLater()
+            self._qt_watcher = None
+        self._rescan_timer.stop()
+        self._folders = {}
+        self._listing = {}
+        self._dirty = set()
+        self._candidates = {}
+
+    def _on_directory_changed(self, folder):
+        # во время записи папка «меняется» постоянно — сверяем список не чаще раза в RESCAN_DELAY_MS
+        self._dirty.add(folder)
+        if not self._rescan_timer.isActive():
+            self._rescan_timer.start()
+
+    def _rescan_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        for folder in dirty:
+            self._rescan_folder(folder)
+
+    def _rescan_folder(self, folder):
+        key = self._norm(folder)
+        if key not in self._folders:
+            return
+        try:
+            names = set(os.listdir(folder))
+        except OSError:
+            return
+        new = names - self._listing.get(key, set())
+        self._listing[key] = names
+        for name in new:
+            self._on_file_event(os.path.join(folder, name))
+
+    def _on_file_event(self, path):
+        if not path.lower().endswith(self.VIDEO_EXTENSIONS):
+            return
+        key = self._norm(path)
+        if key in self._seen or key in self._candidates:
+            return
+        if self._norm(os.path.dirname(path)) not in self._folders:
+            return
+        self._candidates[key] = {'path': path, 'sig': None, 'stable': 0}
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _check_candidates(self):
+        for key, c in list(self._candidates.items()):
+            try:
+                st = os.stat(c['path'])
+            except OSError:
+                # файл удалён или переименован — переименование придёт отдельным событием
+                self._candidates.pop(key, None)
+                continue
+            sig = (st.st_size, st.st_mtime)
+            c['stable'] = c['stable'] + 1 if sig == c['sig'] and st.st_size > 0 else 0
+            c['sig'] = sig
+            if c['stable'] < self.STABLE_CHECKS - 1:
+                continue
+            try:
+                # запись может держать файл открытым на запись — ждём, пока он станет доступен
+                with open(c['path'], 'rb'):
+                    pass
+            except OSError:
+                c['stable'] = 0
+                continue
+            self._candidates.pop(key, None)
+            self._seen.add(key)
+            opts = self._folders.get(self._norm(os.path.dirname(c['path'])), {})
+            logging.info(f"Новая запись готова к загрузке: {c['path']}")
+            self.file_ready.emit(c['path'], dict(opts))
+        if not self._candidates:
+            self._timer.stop()
 
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            logging.info(f"Видео успешно загружено: {url}")
-            self.finished.emit(True, url)
-            
-        except Exception as e:
-            logging.exception("Ошибка при загрузке видео")
-            error_msg = str(e)
-            if "quota" in error_msg.lower():
-                error_msg = "Превышен дневной лимит загрузок YouTube. Попробуйте позже."
-            elif "credentials" in error_msg.lower():
-                error_msg = "Ошибка авторизации. Попробуйте авторизоваться заново."
-            self.finished.emit(False, f"Ошибка: {error_msg}")
 
 class GradientWidget(QWidget):
     def __init__(self, parent=None):
@@ -752,6 +1304,28 @@ def format_time(ms):
     s = s % 60
     return f"{h:02d}:{m:02d}:{s:02d}"
 
+class KeyframeIndexThread(QThread):
+    """Построение индекса ключевых кадров (KeyframeIndex) в фоне; done(list | None)."""
+    done = pyqtSignal(object)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self._is_cancelled = False
+
+    def cancel(self):
+        self._is_cancelled = True
+
+    def run(self):
+        try:
+            keyframes = keyframe_index.get(self.path, should_stop=lambda: self._is_cancelled)
+        except Exception:
+            logging.exception('Ошибка построения индекса ключевых кадров')
+            keyframes = None
+        if not self._is_cancelled:
+            self.done.emit(keyframes)
+
+
 class VideoTrimDialog(QDialog):
     """Мини-редактор: выбор начала/конца, предпросмотр и экспорт обрезанной версии.
     
@@ -760,10 +1334,20 @@ class VideoTrimDialog(QDialog):
     # Константы для оптимизации производительности
     PREVIEW_CACHE_SIZE = 10  # Количество кадров для кэширования
     PROGRESS_UPDATE_INTERVAL = 100  # Миллисекунды между обновлениями прогресса
+    # обрезка идёт в рабочих потоках — прогресс и итог передаются в поток интерфейса сигналами
+    _trim_progress = pyqtSignal(int)
+    _trim_finished = pyqtSignal(bool, str, str)  # успех, временный файл, текст ошибки
     def __init__(self, parent, input_path):
         super().__init__(parent)
         self.input_path = input_path
         self.result_path = None
+        # отрезок для обрезки во время загрузки (вместо result_path), см. TrimPipeUpload
+        self.stream_trim = None
+        # времена ключевых кадров (с); None — индекс ещё строится или недоступен
+        self.keyframes = None
+        self._progress_dialog = None
+        self._trim_progress.connect(self._on_trim_progress)
+        self._trim_finished.connect(self._on_trim_finished)
         self.setWindowTitle("Редактировать видео")
         self.resize(800, 600)
         self.setStyleSheet("""
@@ -929,10 +1513,63 @@ class VideoTrimDialog(QDialog):
         end_layout.addWidget(self.end_label)
         end_layout.addWidget(self.trim_end_slider)
         tb.addLayout(end_layout)
+
+        # Привязка к ключевым кадрам (по желанию): начало на ключевом кадре — обрезка копированием.
+        # Исключает точную обрезку: привязка сдвигает выбранные границы на полгруппы кадров
+        snap_layout = QHBoxLayout()
+        self.snap_checkbox = QCheckBox("Привязать к ключевым кадрам")
+        self.snap_checkbox.setChecked(False)
+        self.snap_checkbox.setToolTip("Начало и конец фрагмента переносятся на ближайший ключевой кадр — "
+                                      "тогда видео обрезается почти мгновенно, без перекодирования, "
+                                      "но границы могут сдвинуться")
+        self.snap_checkbox.toggled.connect(self._on_snap_toggled)
+        snap_layout.addWidget(self.snap_checkbox)
+        self.smart_cut_checkbox = QCheckBox("Точная обрезка")
+        self.smart_cut_checkbox.setChecked(True)
+        self.smart_cut_checkbox.setToolTip("Если край фрагмента не на ключевом кадре, перекодируются только неполные "
+                                           "группы кадров на краях, середина копируется — быстро и точно до кадра")
+        self.smart_cut_checkbox.toggled.connect(self._on_smart_cut_toggled)
+        snap_layout.addWidget(self.smart_cut_checkbox)
+        self.cut_mode_label = QLabel("Построение индекса ключевых кадров...")
+        self.cut_mode_label.setStyleSheet("color: rgba(255,255,255,0.7); font-size: 12px;")
+        snap_layout.addWidget(self.cut_mode_label, 1)
+        tb.addLayout(snap_layout)
+
+        # Профиль перекодирования (если обрезать копированием нельзя)
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel("Кодирование:"))
+        self.profile_combo = QComboBox()
+        for key, spec in VideoEncoder.PROFILES.items():
+            self.profile_combo.addItem(spec['title'], key)
+        idx = self.profile_combo.findData(getattr(parent, 'encode_profile', VideoEncoder.DEFAULT_PROFILE))
+        if idx >= 0:
+            self.profile_combo.setCurrentIndex(idx)
+        self.profile_combo.currentIndexChanged.connect(lambda _i: self._on_profile_changed())
+        profile_layout.addWidget(self.profile_combo)
+        self.target_size_spin = QSpinBox()
+        self.target_size_spin.setRange(8, 16384)
+        self.target_size_spin.setValue(int(getattr(parent, 'encode_target_mb', 256)))
+        self.target_size_spin.setSuffix(" MB")
+        self.target_size_spin.setToolTip("Размер итогового файла для двухпроходного кодирования")
+        self.target_size_spin.valueChanged.connect(lambda _v: self._on_profile_changed())
+        profile_layout.addWidget(self.target_size_spin)
+        self.parallel_checkbox = QCheckBox("На всех ядрах")
+        self.parallel_checkbox.setChecked(bool(getattr(parent, 'encode_parallel', True)))
+        self.parallel_checkbox.setToolTip("Длинный фрагмент делится по ключевым кадрам на части, которые кодируются "
+                                          "одновременно, затем склеиваются без перекодирования")
+        self.parallel_checkbox.toggled.connect(lambda _on: self._on_profile_changed())
+        profile_layout.addWidget(self.parallel_checkbox)
+        self.encode_estimate_label = QLabel("")
+        self.encode_estimate_label.setStyleSheet("color: rgba(255,255,255,0.7); font-size: 12px;")
+        profile_layout.addWidget(self.encode_estimate_label, 1)
+        tb.addLayout(profile_layout)
+        self._on_profile_changed(save=False)
         
         # События изменения ползунков
         self.trim_start_slider.valueChanged.connect(self._on_trim_start_changed)
         self.trim_end_slider.valueChanged.connect(self._on_trim_end_changed)
+        self.trim_start_slider.sliderReleased.connect(self._snap_handles)
+        self.trim_end_slider.sliderReleased.connect(self._snap_handles)
         
         vbox.addWidget(timeline)
         vbox.addWidget(trim_box)
@@ -956,6 +1593,11 @@ class VideoTrimDialog(QDialog):
         """)
         al.addWidget(self.preview_btn)
 
+        self.stream_trim_checkbox = QCheckBox("Обрезать во время загрузки")
+        self.stream_trim_checkbox.setToolTip("Без временного файла: ffmpeg режет видео без перекодирования, "
+                                             "и результат сразу загружается на YouTube")
+        al.addWidget(self.stream_trim_checkbox)
+
         self.trim_btn = QPushButton("✓ Утвердить")
         self.trim_btn.clicked.connect(self.trim_and_accept)
         self.trim_btn.setStyleSheet("""
@@ -1007,6 +1649,99 @@ class VideoTrimDialog(QDialog):
         self._play_stop_ms = None
         self._is_playing = False
 
+        # индекс ключевых кадров: из кэша сразу, иначе строится в фоне
+        self._keyframe_thread = None
+        cached = keyframe_index.cached(self.input_path)
+        if cached is not None:
+            self._on_keyframes_ready(cached)
+        else:
+            self._keyframe_thread = KeyframeIndexThread(self.input_path, self)
+            self._keyframe_thread.done.connect(self._on_keyframes_ready)
+            self._keyframe_thread.start()
+
+    def _on_profile_changed(self, save=True):
+        """Выбран профиль кодирования: поле размера только для 'size', оценка времени по замерам."""
+        profile = self.profile_combo.currentData()
+        self.target_size_spin.setVisible(profile == 'size')
+        self._update_encode_estimate()
+        parent = self.parent()
+        if save and parent is not None and hasattr(parent, 'encode_profile'):
+            # выбор запоминается как профиль по умолчанию
+            parent.encode_profile = profile
+            parent.encode_target_mb = self.target_size_spin.value()
+            parent.encode_parallel = self.parallel_checkbox.isChecked()
+            try:
+                parent._save_settings()
+            except Exception:
+                logging.exception('Не удалось сохранить профиль кодирования')
+
+    def _update_encode_estimate(self):
+        if not hasattr(self, 'encode_estimate_label'):
+            return
+        profile = self.profile_combo.currentData()
+        seconds = (self.trim_end_slider.value() - self.trim_start_slider.value()) / 1000
+        est = video_encoder.estimate(profile, seconds) if seconds > 0 else None
+        speed = video_encoder.speed(profile)
+        self.encode_estimate_label.setText(
+            f"~{est:.0f} c ({speed:.1f}x, {video_encoder.preset(profile)})" if est is not None else "")
+
+    def _on_keyframes_ready(self, keyframes):
+        self.keyframes = keyframes or None
+        if self.keyframes is None:
+            self.snap_checkbox.setEnabled(False)
+            self.cut_mode_label.setText("Индекс ключевых кадров недоступен (нужен ffprobe)")
+            return
+        self._snap_handles()
+
+    def _snap_handles(self):
+        """Перенести начало и конец на ближайшие ключевые кадры (если привязка включена)."""
+        if self.keyframes and self.snap_checkbox.isChecked():
+            for slider in (self.trim_start_slider, self.trim_end_slider):
+                if slider.maximum() <= 0 or slider.isSliderDown():
+                    continue
+                snapped = int(round(KeyframeIndex.nearest(self.keyframes, slider.value() / 1000) * 1000))
+                # конец на последнем ключевом кадре отрезал бы хвост — оставляем конец файла
+                if slider is self.trim_end_slider and slider.value() >= slider.maximum():
+                    continue
+                if snapped != slider.value() and 0 <= snapped <= slider.maximum():
+                    slider.setValue(snapped)
+        self._update_cut_mode()
+
+    def _on_snap_toggled(self, on):
+        if on:
+            # границы переносятся на ключевые кадры — точная обрезка не понадобится
+            self.smart_cut_checkbox.setChecked(False)
+            self._snap_handles()
+
+    def _on_smart_cut_toggled(self, on):
+        if on:
+            # точная обрезка сохраняет выбранные кадры — привязка их бы сдвинула
+            self.snap_checkbox.setChecked(False)
+        self._update_cut_mode()
+
+    def _update_cut_mode(self):
+        """Подсказка: обрезается ли выбранный фрагмент копированием или потребует перекодирования."""
+        self._update_encode_estimate()
+        if self.keyframes is None:
+            return
+        start = self.trim_start_slider.value() / 1000
+        end = self.trim_end_slider.value() / 1000
+        if KeyframeIndex.is_copy_cut(self.keyframes, start):
+            self.cut_mode_label.setText("✓ Быстрая обрезка без перекодирования")
+            self.cut_mode_label.setStyleSheet("color: #51CF66; font-size: 12px;")
+        elif self.smart_cut_checkbox.isChecked() and smart_cutter.plan(self.keyframes, start, end):
+            k_in, k_out = smart_cutter.plan(self.keyframes, start, end)
+            self.cut_mode_label.setText(f"✂ Точная обрезка: перекодируется {(k_in - start) + (end - k_out):.1f} c на краях")
+            self.cut_mode_label.setStyleSheet("color: #51CF66; font-size: 12px;")
+        else:
+            self.cut_mode_label.setText("⚠ Начало не на ключевом кадре — потребуется перекодирование")
+            self.cut_mode_label.setStyleSheet("color: #FFB84D; font-size: 12px;")
+
+    def done(self, result):
+        if self._keyframe_thread is not None and self._keyframe_thread.isRunning():
+            self._keyframe_thread.cancel()
+        super().done(result)
+
     def _on_duration_changed(self, d):
         # d in ms
         self.duration_ms = d
@@ -1019,6 +1754,7 @@ class VideoTrimDialog(QDialog):
         
         # По умолчанию конец = длительность
         self.trim_end_slider.setValue(int(d))
+        self._snap_handles()
         
         # Обновляем метки времени
         self.time_label.setText(f"00:00:00 / {format_time(d)}")
@@ -1070,11 +1806,13 @@ class VideoTrimDialog(QDialog):
         if value >= self.trim_end_slider.value():
             self.trim_start_slider.setValue(self.trim_end_slider.value() - 1000)
         self.start_label.setText(format_time(value))
+        self._update_cut_mode()
     
     def _on_trim_end_changed(self, value):
         if value <= self.trim_start_slider.value():
             self.trim_end_slider.setValue(self.trim_start_slider.value() + 1000)
         self.end_label.setText(format_time(value))
+        self._update_cut_mode()
     
     def play_clip(self, preview_fragment=False):
         start = self.trim_start_slider.value()
@@ -1105,6 +1843,12 @@ class VideoTrimDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Время конца должно быть больше времени начала.")
             return
 
+        if self.stream_trim_checkbox.isChecked():
+            # обрезка пройдёт во время загрузки, временный файл не нужен
+            self.stream_trim = {'start': start, 'end': end, 'duration': self.duration_ms / 1000}
+            self.accept()
+            return
+
         # Создаем временный файл для обрезанного видео
         fd, temp_path = tempfile.mkstemp(suffix=".mp4")
         os.close(fd)
@@ -1114,35 +1858,64 @@ class VideoTrimDialog(QDialog):
         progress.setWindowModality(Qt.WindowModality.WindowModal)
         progress.setAutoClose(True)
         progress.setValue(0)
+        # отмена — флаг, а не progress.wasCanceled(): виджеты трогаются только из потока интерфейса
+        cancelled = Event()
+        progress.canceled.connect(cancelled.set)
+        self._progress_dialog = progress
+
+        # настройки читаются здесь, в потоке интерфейса
+        keyframes = self.keyframes
+        smart_cut = bool(keyframes) and self.smart_cut_checkbox.isChecked()
+        profile = self.profile_combo.currentData() if hasattr(self, 'profile_combo') else VideoEncoder.DEFAULT_PROFILE
+        target_mb = self.target_size_spin.value() if profile == 'size' else None
+        parallel = getattr(self, 'parallel_checkbox', None) is not None and self.parallel_checkbox.isChecked()
+        report = self._trim_progress.emit
 
         def process_video():
+            success = False
+            error = ''
             try:
-                # Сначала пробуем быстрое копирование потока
-                success = self._try_fast_trim(start, end, temp_path, progress)
+                # Сначала пробуем быстрое копирование потока; если по индексу видно, что начало
+                # не на ключевом кадре, копирование дало бы стоп-кадр в начале — сразу перекодируем
+                copy_ok = keyframes is None or KeyframeIndex.is_copy_cut(keyframes, start)
+                success = copy_ok and self._try_fast_trim(start, end, temp_path, report, cancelled.is_set)
+
+                # Точная обрезка: перекодируются только края, середина копируется
+                if not success and not cancelled.is_set() and smart_cut:
+                    success = self._try_smart_cut(start, end, temp_path, report, cancelled.is_set)
                 
                 # Если быстрое копирование не удалось, используем перекодирование
-                if not success and not progress.wasCanceled():
-                    success = self._try_encode_trim(start, end, temp_path, progress)
-                
-                if success and not progress.wasCanceled():
-                    self.result_path = temp_path
-                    progress.setValue(100)
-                    self.accept()
-                else:
-                    if os.path.exists(temp_path):
-                        os.unlink(temp_path)
-                        
+                if not success and not cancelled.is_set():
+                    success = self._try_encode_trim(start, end, temp_path, report, cancelled.is_set,
+                                                    profile, target_mb, parallel)
+                success = success and not cancelled.is_set()
             except Exception as e:
                 logging.exception('Ошибка обработки видео')
-                QMessageBox.warning(self, 'Ошибка', f'Не удалось обрезать видео: {str(e)}')
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-            finally:
-                progress.close()
+                success = False
+                error = str(e)
+            if not success and os.path.exists(temp_path):
+                os.unlink(temp_path)
+            self._trim_finished.emit(success, temp_path, error)
 
         # Запускаем обработку в отдельном потоке
         Thread(target=process_video, daemon=True).start()
 
+    def _on_trim_progress(self, value):
+        if self._progress_dialog is not None:
+            self._progress_dialog.setValue(value)
+
+    def _on_trim_finished(self, success, temp_path, error):
+        progress, self._progress_dialog = self._progress_dialog, None
+        if progress is not None:
+            if success:
+                progress.setValue(100)
+            progress.close()
+        if success:
+            self.result_path = temp_path
+            self.accept()
+        elif error:
+            QMessageBox.warning(self, 'Ошибка', f'Не удалось обрезать видео: {error}')
+
     def _check_ffmpeg(self):
         """Проверка наличия FFmpeg в системе."""
         # Проверяем бинарник сначала через shutil.which, это надёжнее и не вызывает исключение WinError 2
@@ -1184,8 +1957,8 @@ class VideoTrimDialog(QDialog):
             )
             return False
 
-    def _try_fast_trim(self, start, end, output_path, progress):
-        """Попытка быстрой обрезки без перекодирования."""
+    def _try_fast_trim(self, start, end, output_path, report, should_stop):
+        """Попытка быстрой обрезки без перекодирования; report(0..99) и should_stop() — из рабочего потока."""
         # Защитная проверка наличия ffmpeg перед вызовом
         if shutil.which('ffmpeg') is None:
             logging.error("FFmpeg не найден: быстрая обрезка невозможна")
@@ -1218,7 +1991,7 @@ class VideoTrimDialog(QDialog):
                 if not line:
                     break
                 
-                if progress.wasCanceled():
+                if should_stop():
                     process.terminate()
                     return False
                     
@@ -1226,7 +1999,7 @@ class VideoTrimDialog(QDialog):
                     try:
                         time_str = line.split('time=')[1].split()[0]
                         current_time = sum(float(x) * 60 ** i for i, x in enumerate(reversed(time_str.split(':'))))
-                        progress.setValue(int(min(current_time / duration * 100, 99)))
+                        report(int(min(current_time / duration * 100, 99)))
                     except:
                         pass
             
@@ -1236,166 +2009,60 @@ class VideoTrimDialog(QDialog):
             logging.error(f"Ошибка быстрой обрезки: {e}")
             return False
 
-    def _try_encode_trim(self, start, end, output_path, progress):
-        """
-        Оптимизированная обрезка видео с двухпроходным кодированием.
-        Обеспечивает лучшее качество при меньшем размере файла.
-        """
+    def _try_smart_cut(self, start, end, output_path, report, should_stop):
+        """Обрезка с перекодированием только неполных GOP на краях (SmartCutter)."""
+        try:
+            return smart_cutter.cut(self.input_path, start, end, output_path, self.keyframes,
+                                    on_progress=lambda f: report(int(min(f * 100, 99))),
+                                    should_stop=should_stop)
+        except Exception as e:
+            logging.error(f"Ошибка точной обрезки: {e}")
+            return False
+
+    def _try_encode_trim(self, start, end, output_path, report, should_stop, profile, target_mb=None, parallel=False):
+        """Обрезка с перекодированием по выбранному профилю (VideoEncoder): один проход CRF,
+        два прохода под размер или черновик."""
         # Защитная проверка наличия ffmpeg
         if shutil.which('ffmpeg') is None:
             logging.error("FFmpeg не найден: кодирование невозможно")
             return False
 
+        # on_progress вызывается из нескольких потоков encode_parallel — report() лишь отправляет сигнал
+        on_progress = lambda f: report(int(min(f * 100, 99)))
         try:
-            # Создаем временную директорию для логов двухпроходного кодирования
-            with tempfile.TemporaryDirectory() as temp_dir:
-                passlog_file = os.path.join(temp_dir, 'ffmpeg2pass.log')
-                
-                # Базовые параметры кодирования для обоих проходов
-                base_params = [
-                    '-ss', str(start),
-                    '-i', self.input_path,
-                    '-t', str(end - start),
-                    '-c:v', 'libx264',
-                    '-preset', 'faster',     # Оптимальный баланс скорость/качество
-                    '-profile:v', 'high',    # Профиль высокого качества
-                    '-level', '4.1',         # Максимальная совместимость
-                    '-pix_fmt', 'yuv420p',   # Стандартный формат пикселей
-                    '-movflags', '+faststart', # Оптимизация для веб
-                    '-maxrate', '5000k',     # Ограничение битрейта
-                    '-bufsize', '10000k',    # Размер буфера
-                    '-g', '50',              # GOP size
-                    '-keyint_min', '25',     # Минимальный интервал ключевых кадров
-                    '-sc_threshold', '40',    # Порог смены сцены
-                    '-c:a', 'aac',           # Аудиокодек
-                    '-b:a', '128k',          # Битрейт аудио
-                    '-ar', '44100',          # Частота дискретизации
-                    '-y'                     # Перезапись файла
-                ]
-                
-                # Первый проход - анализ
-                first_pass = [
-                    'ffmpeg',
-                    *base_params,
-                    '-pass', '1',
-                    '-an',                   # Без аудио в первом проходе
-                    '-f', 'null',
-                    'NUL'                    # Windows NUL device
-                ]
-                
-                # Второй проход - финальное кодирование
-                second_pass = [
-                    'ffmpeg',
-                    *base_params,
-                    '-pass', '2',
-                    '-crf', '23'             # Постоянное качество
-                ]
-                
-                # Выполняем первый проход
-                try:
-                    process = subprocess.Popen(
-                        first_pass,
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True
-                    )
-                except FileNotFoundError:
-                    logging.error("FFmpeg не найден при запуске первого прохода")
-                    return False
-                
-                # Мониторим прогресс первого прохода
-                duration = end - start
-                progress_value = 0
-                while True:
-                    if progress.wasCanceled():
-                        process.terminate()
-                        return False
-                        
-                    line = process.stderr.readline()
-                    if not line:
-                        break
-                        
-                    if 'time=' in line:
-                        try:
-                            time_str = line.split('time=')[1].split()[0]
-                            current_time = sum(float(x) * 60 ** i for i, x in enumerate(reversed(time_str.split(':'))))
-                            progress_value = int(min(current_time / duration * 50, 49))  # Первый проход до 50%
-                            progress.setValue(progress_value)
-                        except:
-                            pass
-                
-                if process.wait() != 0:
-                    logging.error("Ошибка в первом проходе кодирования")
-                    return False
-                
-                # Выполняем второй проход
-                try:
-                    process = subprocess.Popen(
-                        [*second_pass, output_path],
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True
-                    )
-                except FileNotFoundError:
-                    logging.error("FFmpeg не найден при запуске второго прохода")
-                    return False
-                
-                # Мониторим прогресс второго прохода
-                while True:
-                    if progress.wasCanceled():
-                        process.terminate()
-                        return False
-                        
-                    line = process.stderr.readline()
-                    if not line:
-                        break
-                        
-                    if 'time=' in line:
-                        try:
-                            time_str = line.split('time=')[1].split()[0]
-                            current_time = sum(float(x) * 60 ** i for i, x in enumerate(reversed(time_str.split(':'))))
-                            progress_value = 50 + int(min(current_time / duration * 50, 49))  # Второй проход от 50% до 100%
-                            progress.setValue(progress_value)
-                        except:
-                            pass
-                
-                if process.wait() != 0:
-                    logging.error("Ошибка во втором проходе кодирования")
-                    return False
-                
-                # Проверяем результат
-                if os.path.exists(output_path):
-                    file_size = os.path.getsize(output_path)
-                    input_size = os.path.getsize(self.input_path)
-                    compression_ratio = (1 - file_size/input_size) * 100
-                    
-                    logging.info(
-                        f"Видео успешно обработано:\n"
-                        f"- Размер файла: {file_size / (1024*1024):.2f} MB\n"
-                        f"- Сжатие: {compression_ratio:.1f}%\n"
-                        f"- Длительность: {end - start:.1f} сек"
-                    )
-                    return True
-                    
-                return False
-                
+            if parallel:
+                # короткие фрагменты encode_parallel сам кодирует одним процессом
+                ok = video_encoder.encode_parallel(self.input_path, start, end, output_path, profile,
+                                                   keyframes=self.keyframes, target_mb=target_mb,
+                                                   on_progress=on_progress, should_stop=should_stop)
+                if not ok and not should_stop():
+                    # например, не закодировался звук — пробуем одним процессом
+                    logging.info("Параллельное кодирование не удалось, кодируем одним процессом")
+                    ok = video_encoder.encode(self.input_path, start, end, output_path, profile, target_mb=target_mb,
+                                              on_progress=on_progress, should_stop=should_stop)
+            else:
+                ok = video_encoder.encode(self.input_path, start, end, output_path, profile, target_mb=target_mb,
+                                          on_progress=on_progress, should_stop=should_stop)
+        except FileNotFoundError:
+            logging.error("FFmpeg не найден при запуске кодирования")
+            return False
         except Exception as e:
             logging.error(f"Ошибка обрезки с кодированием: {e}")
             return False
-        finally:
-            # Очистка временных файлов FFmpeg
-            patterns = ['*.log', '*.mbtree', '*.temp.*', '*.tmp']
-            clean_dirs = [os.getcwd(), tempfile.gettempdir()]
-            
-            for directory in clean_dirs:
-                for pattern in patterns:
-                    try:
-                        for file in glob.glob(os.path.join(directory, pattern)):
-                            try:
-                                os.remove(file)
-                            except OSError as e:
-                                logging.debug(f"Не удалось удалить временный файл {file}: {e}")
-                    except Exception as e:
-                        logging.debug(f"Ошибка при поиске временных файлов: {e}")
-                        continue
+
+        # Проверяем результат
+        if ok and os.path.exists(output_path):
+            file_size = os.path.getsize(output_path)
+            input_size = os.path.getsize(self.input_path)
+            compression_ratio = (1 - file_size/input_size) * 100
+            logging.info(
+                f"Видео успешно обработано (профиль {profile}):\n"
+                f"- Размер файла: {file_size / (1024*1024):.2f} MB\n"
+                f"- Сжатие: {compression_ratio:.1f}%\n"
+                f"- Длительность: {end - start:.1f} сек"
+            )
+            return True
+        return False
 
 class MainWindow(QMainWindow):
     """Главное окно приложения с оптимизированным управлением ресурсами."""
@@ -1405,16 +2072,23 @@ class MainWindow(QMainWindow):
     CREDENTIALS_FILE = 'token.pickle'
     THEME_FILE = 'theme.txt'
     AHK_DATA_FILE = 'ahk_data.json'
+    HISTORY_FILE = 'upload_history.json'
+    # сколько ждать отменённые фоновые потоки при закрытии; дальше процесс завершается без них
+    CLOSE_WAIT_SECONDS = 15
     
     def __init__(self):
         super().__init__()
         # Инициализация базовых атрибутов
         self.creds = None
         self.video_path = None
-        self.upload_thread = None
         self.drag_pos = None
         self.video_url = None
         self._temp_trim_files = []
+        # отрезок потоковой обрезки для выбранного файла: {'source', 'start', 'end', 'duration'}
+        self._stream_trim = None
+        # фоновая предварительная проверка выбранного файла (PrevalidateThread) и её результат
+        self._prevalidate_thread = None
+        self._prevalidation = None
         
         # Настройки по умолчанию
         self.channel = "не определен"
@@ -1430,6 +2104,43 @@ class MainWindow(QMainWindow):
         self.github_repo = GITHUB_REPO
         # Авто-проверка при старте (если False — автопроверка отключена, можно включить в настройках)
         self.auto_check_on_start = True
+        # сколько видео из очереди загружаются одновременно
+        self.max_concurrent_uploads = 2
+        # уровень проверки видео перед загрузкой: 'probe' | 'sampled' | 'full'
+        self.validation_mode = 'sampled'
+        # ремукс MP4 с moov в конце (OBS) перед загрузкой — YouTube начинает обработку раньше
+        self.faststart_before_upload = False
+        # профиль перекодирования в редакторе (VideoEncoder.PROFILES) и размер для двухпроходного
+        self.encode_profile = VideoEncoder.DEFAULT_PROFILE
+        self.encode_target_mb = 256
+        # длинные фрагменты кодировать сегментами параллельно (VideoEncoder.encode_parallel)
+        self.encode_parallel = True
+        # ограничение скорости загрузки, КБ/с (0 — без ограничения) и отдельный лимит на рабочие часы
+        self.upload_limit_kbps = 0
+        self.work_hours_limit_kbps = 0
+        self.work_hours = '09:00-18:00'
+        self._bandwidth_timer = QTimer(self)
+        self._bandwidth_timer.timeout.connect(self._apply_upload_limit)
+        self._bandwidth_timer.start(60 * 1000)
+        self.upload_queue = UploadQueue(lambda: self.creds, self.max_concurrent_uploads, parent=self)
+        self.upload_queue.item_changed.connect(self._on_queue_item_changed)
+        self.upload_queue.item_finished.connect(self.upload_done)
+        # плейлист доказательств — batch-запросами сразу для нескольких видео
+        self.evidence_playlist_id = ''
+        self.post_upload = PostUploadBatcher(lambda: self.creds, parent=self)
+        self.post_upload.op_done.connect(self._on_post_upload_op)
+        # статус обработки загруженных видео (ссылка рабочая, когда YouTube закончит обработку):
+        # все отслеживаемые id — одним videos.list за цикл, интервал растёт
+        self.processing_poller = ProcessingPoller(lambda: self.creds, parent=self)
+        self.processing_poller.status_changed.connect(self._on_processing_status)
+        # автозагрузка новых записей из папок наблюдения
+        self.watch_enabled = False
+        self.watch_folders = []
+        self._watch_threads = []
+        # id элементов очереди из автозагрузки: их неудачи записываются в историю
+        self._watched_items = set()
+        self.folder_watcher = FolderWatcher(self)
+        self.folder_watcher.file_ready.connect(self._on_watched_file_ready)
         
         # Настройка логирования (вызов модульной функции напрямую для надежности)
         try:
@@ -1499,12 +2210,17 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, e):
         """Корректное закрытие приложения с очисткой ресурсов."""
+        stuck = []
         try:
-            # Останавливаем все фоновые процессы
-            if self.upload_thread and self.upload_thread.isRunning():
-                self.upload_thread.cancel()  # Отменяем загрузку
-                self.upload_thread.quit()
-                self.upload_thread.wait()
+            # Останавливаем все фоновые процессы (сессии остаются в журнале для возобновления)
+            pending = self.upload_queue.cancel_all()
+            self.folder_watcher.stop()
+            self.processing_poller.stop()
+            background = [th for th in list(self._watch_threads) + [self._prevalidate_thread]
+                          if th and th.isRunning()]
+            for th in background:
+                th.cancel()
+            stuck = self._wait_threads_on_close(pending + background)
             
             # Очищаем временные файлы
             self._cleanup_temp_files()
@@ -1520,6 +2236,38 @@ class MainWindow(QMainWindow):
             
         finally:
             e.accept()
+        if stuck:
+            # уничтожение идущего QThread аварийно завершает процесс — выходим сразу;
+            # сессии загрузок остаются в журнале и продолжатся при следующем запуске
+            logging.warning(f"Фоновые задачи не завершились за {self.CLOSE_WAIT_SECONDS} с, выход без них")
+            logging.shutdown()
+            os._exit(0)
+
+    def _wait_threads_on_close(self, threads):
+        """Дождаться уже отменённых потоков, не дольше CLOSE_WAIT_SECONDS на все, показывая прогресс.
+        Отмена обрывает не всё сразу (установка соединения, обновление токена, ffprobe), поэтому
+        окно не ждёт без предела. Возвращает потоки, которые так и не завершились."""
+        threads = [th for th in threads if th.isRunning()]
+        if not threads:
+            return []
+        progress = QProgressDialog('Завершение фоновых задач...', '', 0, len(threads), self)
+        progress.setCancelButton(None)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setWindowTitle('Закрытие')
+        progress.setMinimumDuration(500)
+        try:
+            self._style_dialog(progress)
+        except Exception:
+            pass
+        deadline = time.monotonic() + self.CLOSE_WAIT_SECONDS
+        while threads and time.monotonic() < deadline:
+            threads = [th for th in threads if not th.wait(100)]
+            left = max(0, int(deadline - time.monotonic()))
+            progress.setLabelText(f'Завершение фоновых задач: осталось {len(threads)}, не дольше {left} с...')
+            progress.setValue(progress.maximum() - len(threads))
+            QApplication.processEvents()
+        progress.close()
+        return threads
     
     def _cleanup_temp_files(self):
         """Очистка временных файлов с оптимизированной обработкой."""
@@ -1586,7 +2334,20 @@ class MainWindow(QMainWindow):
                         'disable_editor_completely': bool(getattr(self, 'disable_editor_completely', False)),
                         'default_privacy': str(getattr(self, 'default_privacy', 'private')),
                         'github_repo': str(getattr(self, 'github_repo', GITHUB_REPO)),
-                        'auto_check_on_start': bool(getattr(self, 'auto_check_on_start', True))
+                        'auto_check_on_start': bool(getattr(self, 'auto_check_on_start', True)),
+                        'max_concurrent_uploads': int(getattr(self, 'max_concurrent_uploads', 2)),
+                        'validation_mode': str(getattr(self, 'validation_mode', 'sampled')),
+                        'faststart_before_upload': bool(getattr(self, 'faststart_before_upload', False)),
+                        'encode_profile': str(getattr(self, 'encode_profile', VideoEncoder.DEFAULT_PROFILE)),
+                        'encode_target_mb': int(getattr(self, 'encode_target_mb', 256)),
+                        'encode_parallel': bool(getattr(self, 'encode_parallel', True)),
+                        'upload_limit_kbps': int(getattr(self, 'upload_limit_kbps', 0)),
+                        'work_hours_limit_kbps': int(getattr(self, 'work_hours_limit_kbps', 0)),
+                        'work_hours': str(getattr(self, 'work_hours', '09:00-18:00')),
+                        'daily_quota': int(quota_ledger.daily_limit),
+                        'evidence_playlist_id': str(getattr(self, 'evidence_playlist_id', '')),
+                        'watch_enabled': bool(getattr(self, 'watch_enabled', False)),
+                        'watch_folders': list(getattr(self, 'watch_folders', []))
                     }
                     with open(temp_cfg.name, 'w', encoding='utf-8') as f:
                         json.dump(cfg, f, ensure_ascii=False, indent=2)
@@ -1893,6 +2654,14 @@ class MainWindow(QMainWindow):
         self.status_label.setStyleSheet("font-size: 13px; padding: 8px;")
         il.addWidget(self.status_label)
 
+        # Общий прогресс выполняющихся загрузок очереди
+        self.upload_progress_bar = QProgressBar()
+        self.upload_progress_bar.setRange(0, 1000)
+        self.upload_progress_bar.setTextVisible(True)
+        self.upload_progress_bar.setFixedHeight(18)
+        self.upload_progress_bar.setVisible(False)
+        il.addWidget(self.upload_progress_bar)
+
         # Индикатор состояния FFmpeg / редактора (видно пользователю)
         self.editor_indicator_label = QLabel("")
         self.editor_indicator_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -1920,6 +2689,34 @@ class MainWindow(QMainWindow):
         lcl2.addLayout(lr)
         self.link_container.setVisible(False)
         il.addWidget(self.link_container)
+
+        # Очередь загрузок: строка со статусом и прогрессом для каждого видео
+        try:
+            queue_box = QGroupBox("Очередь загрузок")
+            queue_l = QVBoxLayout(queue_box)
+            queue_l.setContentsMargins(8,8,8,8)
+            queue_l.setSpacing(6)
+
+            self.queue_list = QListWidget()
+            self.queue_list.setFixedHeight(150)
+            queue_l.addWidget(self.queue_list)
+
+            qbtns = QWidget()
+            qbl = QHBoxLayout(qbtns)
+            qbl.setContentsMargins(0,0,0,0)
+            qbl.setSpacing(6)
+            qclear_btn = QPushButton('Убрать завершённые')
+            qclear_btn.clicked.connect(self._clear_finished_queue)
+            qcancel_btn = QPushButton('Отменить все')
+            qcancel_btn.clicked.connect(self._cancel_queue)
+            for b in (qclear_btn, qcancel_btn):
+                b.setFixedHeight(28)
+                b.setStyleSheet('QPushButton{ padding:6px; border-radius:6px; }')
+                qbl.addWidget(b)
+            queue_l.addWidget(qbtns)
+            il.addWidget(queue_box)
+        except Exception:
+            pass
         
         inst = QLabel("📋 Как загрузить видео:\ВАЖНО\nВ настройках Вы можете выбрать тип приватности\n(Только я, достоп по ссылке\n\n1. Выберите видео файл\n2. Введите имя и фамилию\n3. Вставьте ссылку на жалобу\n4. При желании добавьте описание\n5. Нажмите кнопку загрузки\n\n⚡ После загрузки вы получите\nссылку на видео")
         inst.setWordWrap(True)
@@ -1936,7 +2733,7 @@ class MainWindow(QMainWindow):
             from PyQt6.QtWidgets import QListWidget, QListWidgetItem
             self.upload_history_list = QListWidget()
             self.upload_history_list.setFixedHeight(180)
-            self.upload_history_list.itemDoubleClicked.connect(lambda it: webbrowser.open(it.data(Qt.ItemDataRole.UserRole)))
+            self.upload_history_list.itemDoubleClicked.connect(lambda it: it.data(Qt.ItemDataRole.UserRole) and webbrowser.open(it.data(Qt.ItemDataRole.UserRole)))
             hist_l.addWidget(self.upload_history_list)
 
             btns = QWidget()
@@ -2379,6 +3176,145 @@ class MainWindow(QMainWindow):
             tl.addWidget(row2)
         except Exception:
             pass
+        # Настройка: число одновременных загрузок из очереди
+        try:
+            row3 = QWidget()
+            row3_l = QHBoxLayout(row3)
+            row3_l.setContentsMargins(0,0,0,0)
+            row3_l.setSpacing(8)
+
+            self.max_concurrent_spin = QSpinBox()
+            self.max_concurrent_spin.setRange(1, 6)
+            self.max_concurrent_spin.setValue(getattr(self, 'max_concurrent_uploads', 2))
+            self.max_concurrent_spin.setFixedWidth(70)
+            self.max_concurrent_spin.valueChanged.connect(self.on_max_concurrent_changed)
+
+            lbl3 = QLabel("Одновременных загрузок")
+            lbl3.setStyleSheet("color: white; font-size: 13px; padding: 6px; border: 1px solid rgba(255,255,255,0.08); border-radius: 8px;")
+
+            row3_l.addWidget(self.max_concurrent_spin, 0)
+            row3_l.addWidget(lbl3, 1)
+            tl.addWidget(row3)
+        except Exception:
+            pass
+        # Настройка: глубина проверки видео перед загрузкой
+        try:
+            row4 = QWidget()
+            row4_l = QHBoxLayout(row4)
+            row4_l.setContentsMargins(0,0,0,0)
+            row4_l.setSpacing(8)
+
+            self.validation_combo = QComboBox()
+            self.validation_combo.addItem('Быстрая (заголовок)', 'probe')
+            self.validation_combo.addItem('Выборочная', 'sampled')
+            self.validation_combo.addItem('Полная (медленно)', 'full')
+            idx = self.validation_combo.findData(getattr(self, 'validation_mode', 'sampled'))
+            if idx >= 0:
+                self.validation_combo.setCurrentIndex(idx)
+            self.validation_combo.setFixedWidth(190)
+            self.validation_combo.currentIndexChanged.connect(lambda _i: self.on_validation_mode_changed(self.validation_combo.currentData()))
+
+            lbl4 = QLabel("Проверка видео")
+            lbl4.setStyleSheet("color: white; font-size: 13px; padding: 6px; border: 1px solid rgba(255,255,255,0.08); border-radius: 8px;")
+            info4 = QLabel("ℹ️")
+            info4.setToolTip("Быстрая — только заголовок (ffprobe), выборочная — декодирование нескольких фрагментов, полная — весь файл. Проверенные файлы повторно не проверяются.")
+            info4.setStyleSheet("color: rgba(255,255,255,0.9); font-size: 12px; padding: 4px; border-radius: 6px; background: rgba(255,255,255,0.02);")
+
+            row4_l.addWidget(self.validation_combo, 0)
+            row4_l.addWidget(lbl4, 1)
+            row4_l.addWidget(info4, 0)
+            tl.addWidget(row4)
+        except Exception:
+            pass
+        # Настройка: faststart-ремукс перед загрузкой
+        try:
+            row7 = QWidget()
+            row7_l = QHBoxLayout(row7)
+            row7_l.setContentsMargins(0,0,0,0)
+            row7_l.setSpacing(8)
+
+            self.faststart_checkbox = QCheckBox()
+            self.faststart_checkbox.setChecked(getattr(self, 'faststart_before_upload', False))
+            self.faststart_checkbox.toggled.connect(self.on_toggle_faststart)
+
+            lbl7 = QLabel("Индекс MP4 в начало файла")
+            lbl7.setStyleSheet("color: white; font-size: 13px; padding: 6px; border: 1px solid rgba(255,255,255,0.08); border-radius: 8px;")
+            lbl7.mousePressEvent = lambda e, cb=self.faststart_checkbox: cb.toggle()
+            info7 = QLabel("ℹ️")
+            info7.setToolTip("Если OBS или рекордер записал индекс (moov) в конец файла, перед загрузкой он переносится в начало без перекодирования — YouTube начинает обработку раньше. Требует копии файла во временной папке, отправка начнётся после неё.")
+            info7.setStyleSheet("color: rgba(255,255,255,0.9); font-size: 12px; padding: 4px; border-radius: 6px; background: rgba(255,255,255,0.02);")
+
+            row7_l.addWidget(self.faststart_checkbox, 0)
+            row7_l.addWidget(lbl7, 1)
+            row7_l.addWidget(info7, 0)
+            tl.addWidget(row7)
+        except Exception:
+            pass
+        # Настройка: автозагрузка новых записей из папок
+        try:
+            row6 = QWidget()
+            row6_l = QHBoxLayout(row6)
+            row6_l.setContentsMargins(0,0,0,0)
+            row6_l.setSpacing(8)
+
+            self.watch_checkbox = QCheckBox()
+            self.watch_checkbox.setChecked(getattr(self, 'watch_enabled', False))
+            self.watch_checkbox.toggled.connect(self.on_toggle_watch)
+
+            self.watch_label = QLabel("Автозагрузка новых записей")
+            self.watch_label.setStyleSheet("color: white; font-size: 13px; padding: 6px; border: 1px solid rgba(255,255,255,0.08); border-radius: 8px;")
+
+            add_folder_btn = QPushButton("📁 Добавить папку")
+            add_folder_btn.clicked.connect(self._add_watch_folder)
+            clear_folders_btn = QPushButton("Сбросить")
+            clear_folders_btn.clicked.connect(self._clear_watch_folders)
+
+            row6_l.addWidget(self.watch_checkbox, 0)
+            row6_l.addWidget(self.watch_label, 1)
+            row6_l.addWidget(add_folder_btn, 0)
+            row6_l.addWidget(clear_folders_btn, 0)
+            tl.addWidget(row6)
+            self._update_watch_label()
+        except Exception:
+            pass
+        # Настройка: ограничение скорости загрузки (общее и в рабочие часы)
+        try:
+            row5 = QWidget()
+            row5_l = QHBoxLayout(row5)
+            row5_l.setContentsMargins(0,0,0,0)
+            row5_l.setSpacing(8)
+
+            self.upload_limit_spin = QSpinBox()
+            self.upload_limit_spin.setRange(0, 1000000)
+            self.upload_limit_spin.setSingleStep(256)
+            self.upload_limit_spin.setSuffix(' КБ/с')
+            self.upload_limit_spin.setSpecialValueText('без лимита')
+            self.upload_limit_spin.setValue(getattr(self, 'upload_limit_kbps', 0))
+            self.upload_limit_spin.setFixedWidth(120)
+            self.upload_limit_spin.valueChanged.connect(lambda v: self.on_upload_limit_changed('upload_limit_kbps', v))
+
+            self.work_limit_spin = QSpinBox()
+            self.work_limit_spin.setRange(0, 1000000)
+            self.work_limit_spin.setSingleStep(256)
+            self.work_limit_spin.setSuffix(' КБ/с')
+            self.work_limit_spin.setSpecialValueText('как обычно')
+            self.work_limit_spin.setValue(getattr(self, 'work_hours_limit_kbps', 0))
+            self.work_limit_spin.setFixedWidth(120)
+            self.work_limit_spin.valueChanged.connect(lambda v: self.on_upload_limit_changed('work_hours_limit_kbps', v))
+
+            lbl5 = QLabel("Лимит скорости / в рабочие часы")
+            lbl5.setStyleSheet("color: white; font-size: 13px; padding: 6px; border: 1px solid rgba(255,255,255,0.08); border-radius: 8px;")
+            info5 = QLabel("ℹ️")
+            info5.setToolTip(f"Ограничение применяется сразу, в том числе к идущим загрузкам. Рабочие часы (пн–пт): {getattr(self, 'work_hours', '09:00-18:00')}, задаются в config.json.")
+            info5.setStyleSheet("color: rgba(255,255,255,0.9); font-size: 12px; padding: 4px; border-radius: 6px; background: rgba(255,255,255,0.02);")
+
+            row5_l.addWidget(self.upload_limit_spin, 0)
+            row5_l.addWidget(self.work_limit_spin, 0)
+            row5_l.addWidget(lbl5, 1)
+            row5_l.addWidget(info5, 0)
+            tl.addWidget(row5)
+        except Exception:
+            pass
         # Сделаем две визуальные карточки (без скролла): слева — настройки, справа — краткая помощь
         cards = QWidget()
         cards_l = QHBoxLayout(cards)
@@ -2610,8 +3546,20 @@ class MainWindow(QMainWindow):
         # load upload history
         try:
             self._load_upload_history()
+            self._track_unprocessed_history()
+        except Exception:
+            pass
+        # незавершённые загрузки из журнала — предлагаем продолжить после показа окна
+        try:
+            QTimer.singleShot(800, self._offer_resume_pending_uploads)
         except Exception:
             pass
+        # ремуксы загрузок, которые не завершились и уже не будут продолжены
+        try:
+            Thread(target=lambda: FaststartRemuxer.prune(upload_journal.pending()),
+                   name='faststart-prune', daemon=True).start()
+        except Exception:
+            logging.exception('Не удалось запустить очистку ремуксов')
 
     # ---- helper для pill-стилей статусов ----
     def _pill_style(self, fg="#FFFFFF"):
@@ -2647,7 +3595,7 @@ class MainWindow(QMainWindow):
                 with open('token.pickle', 'rb') as f:
                     self.creds = pickle.load(f)
                 if self.creds and self.creds.expired and self.creds.refresh_token:
-                    self.creds.refresh(Request())
+                    self.creds.refresh(youtube_services.auth_request())
                 if self.creds and self.creds.valid:
                     self.set_auth_pill("✓ авторизован", "#51CF66")
                     self.auth_btn.setText("🔄 Повторить")
@@ -2659,7 +3607,8 @@ class MainWindow(QMainWindow):
     
     def get_channel(self):
         try:
-            yt = build('youtube', 'v3', credentials=self.creds)
+            yt = youtube_services.get(self.creds)
+            quota_ledger.spend('channels.list')
             r = yt.channels().list(part='snippet', mine=True).execute()
             if 'items' in r and r['items']:
                 self.channel = r['items'][0]['snippet']['title']
@@ -2702,6 +3651,45 @@ class MainWindow(QMainWindow):
                 self.github_repo = str(cfg.get('github_repo', getattr(self, 'github_repo', GITHUB_REPO)))
                 # auto-check flag
                 self.auto_check_on_start = bool(cfg.get('auto_check_on_start', getattr(self, 'auto_check_on_start', True)))
+                # параллельные загрузки очереди (1..6)
+                try:
+                    self.max_concurrent_uploads = min(6, max(1, int(cfg.get('max_concurrent_uploads', self.max_concurrent_uploads))))
+                except (TypeError, ValueError):
+                    pass
+                self.upload_queue.set_max_concurrent(self.max_concurrent_uploads)
+                mode = str(cfg.get('validation_mode', self.validation_mode))
+                self.validation_mode = mode if mode in VideoValidator.MODES else 'sampled'
+                self.upload_queue.validation_mode = self.validation_mode
+                self.faststart_before_upload = bool(cfg.get('faststart_before_upload', False))
+                self.upload_queue.faststart = self.faststart_before_upload
+                profile = str(cfg.get('encode_profile', self.encode_profile))
+                self.encode_profile = profile if profile in VideoEncoder.PROFILES else VideoEncoder.DEFAULT_PROFILE
+                try:
+                    self.encode_target_mb = max(8, int(cfg.get('encode_target_mb', self.encode_target_mb)))
+                except (TypeError, ValueError):
+                    pass
+                self.encode_parallel = bool(cfg.get('encode_parallel', True))
+                # ограничение скорости загрузки
+                try:
+                    self.upload_limit_kbps = max(0, int(cfg.get('upload_limit_kbps', self.upload_limit_kbps)))
+                    self.work_hours_limit_kbps = max(0, int(cfg.get('work_hours_limit_kbps', self.work_hours_limit_kbps)))
+                except (TypeError, ValueError):
+                    pass
+                self.work_hours = str(cfg.get('work_hours', self.work_hours))
+                self._apply_upload_limit()
+                # дневная квота проекта Google Cloud (10000 по умолчанию, больше — если её увеличили)
+                try:
+                    quota_ledger.daily_limit = max(1, int(cfg.get('daily_quota', quota_ledger.daily_limit)))
+                except (TypeError, ValueError):
+                    pass
+                # плейлист, в который добавляются загруженные видео ('' — не добавлять)
+                self.evidence_playlist_id = str(cfg.get('evidence_playlist_id', '') or '').strip()
+                self.post_upload.playlist_id = self.evidence_playlist_id
+                # папки наблюдения: пути или {'path', 'link', 'privacy'}
+                folders = cfg.get('watch_folders', [])
+                self.watch_folders = folders if isinstance(folders, list) else []
+                self.watch_enabled = bool(cfg.get('watch_enabled', False))
+                self._apply_watch_folders()
                 # если UI уже создан — применяем состояние чекбокса
                 try:
                     # (репозиторий для авто-проверки хранится в config.json или в GITHUB_REPO; UI поле удалено)
@@ -2714,6 +3702,21 @@ class MainWindow(QMainWindow):
                         self.allow_upload_checkbox.setChecked(self.allow_upload_without_ffmpeg)
                     if hasattr(self, 'disable_editor_checkbox'):
                         self.disable_editor_checkbox.setChecked(self.disable_editor_completely)
+                    if hasattr(self, 'max_concurrent_spin'):
+                        self.max_concurrent_spin.setValue(self.max_concurrent_uploads)
+                    if hasattr(self, 'validation_combo'):
+                        idx = self.validation_combo.findData(self.validation_mode)
+                        if idx >= 0:
+                            self.validation_combo.setCurrentIndex(idx)
+                    if hasattr(self, 'faststart_checkbox'):
+                        self.faststart_checkbox.setChecked(self.faststart_before_upload)
+                    if hasattr(self, 'watch_checkbox'):
+                        self.watch_checkbox.setChecked(self.watch_enabled)
+                        self._update_watch_label()
+                    if hasattr(self, 'upload_limit_spin'):
+                        self.upload_limit_spin.setValue(self.upload_limit_kbps)
+                    if hasattr(self, 'work_limit_spin'):
+                        self.work_limit_spin.setValue(self.work_hours_limit_kbps)
                     # если существует комбобокс приватности — применяем значение
                     try:
                         if hasattr(self, 'privacy_combo') and self.privacy_combo is not None:
@@ -2738,6 +3741,7 @@ class MainWindow(QMainWindow):
             self.video_path = p
             self.vid_label.setText(os.path.basename(p))
             self.vid_label.setStyleSheet("color: #51CF66; font-size: 12px; font-weight: bold;")
+            self._start_prevalidation(p)
             # Обновляем индикатор/состояние редактора
             try:
                 if hasattr(self, 'update_editor_indicator'):
@@ -2773,7 +3777,14 @@ class MainWindow(QMainWindow):
         dlg = VideoTrimDialog(self, self.video_path)
         # exec will accept() when trimming finished; VideoTrimDialog.result_path contains path
         if dlg.exec() == QDialog.DialogCode.Accepted:
-            if getattr(dlg, 'result_path', None):
+            if getattr(dlg, 'stream_trim', None):
+                self._stream_trim = dict(dlg.stream_trim, source=self.video_path)
+                try:
+                    self.vid_label.setText(os.path.basename(self.video_path) + ' (обрез. при загрузке)')
+                    self.vid_label.setStyleSheet("color: #FFD93D; font-size: 12px; font-weight: bold;")
+                except Exception:
+                    pass
+            elif getattr(dlg, 'result_path', None):
                 self.video_path = dlg.result_path
                 # mark label to indicate trimmed file is used
                 try:
@@ -2786,7 +3797,77 @@ class MainWindow(QMainWindow):
                     self._temp_trim_files.append(self.video_path)
                 except Exception:
                     pass
+                self._start_prevalidation(self.video_path)
+
+    def _start_prevalidation(self, path):
+        """Запускаем проверку и прогрев файла в фоне, пока пользователь заполняет форму."""
+        try:
+            if self._prevalidate_thread and self._prevalidate_thread.isRunning():
+                self._prevalidate_thread.cancel()
+            self._prevalidation = {'path': path, 'ok': None, 'error': None}
+            th = PrevalidateThread(path, validation_mode=getattr(self, 'validation_mode', 'sampled'),
+                                   allow_missing_ffmpeg=getattr(self, 'allow_upload_without_ffmpeg', False), parent=self)
+            th.done.connect(self._on_prevalidated)
+            th.hashed.connect(self._on_content_hashed)
+            self._prevalidate_thread = th
+            self.vid_label.setToolTip('Проверка видео в фоне...')
+            th.start(QThread.Priority.LowPriority)
+        except Exception:
+            logging.exception('Не удалось запустить предварительную проверку видео')
+
+    def _on_prevalidated(self, res: dict):
+        try:
+            if not self._prevalidation or res.get('path') != self._prevalidation.get('path'):
+                return
+            if res.get('ok') is None:
+                # отменённая проверка ничего не говорит о файле — проверит UploadJob
+                return
+            self._prevalidation.update(ok=res.get('ok'), error=res.get('error'))
+            if res.get('path') != self.video_path:
+                return
+            if res.get('ok'):
+                logging.info(f"Файл подготовлен к загрузке за {res.get('elapsed', 0):.2f} c")
+                self.vid_label.setToolTip('✓ Видео проверено')
+            else:
+                self.vid_label.setToolTip(f"❌ {res.get('error')}")
+                self.vid_label.setStyleSheet("color: #FF6B6B; font-size: 12px; font-weight: bold;")
+        except Exception:
+            logging.exception('Ошибка обработки результата предварительной проверки')
     
+    def _on_content_hashed(self, res: dict):
+        try:
+            if self._prevalidation and res.get('path') == self._prevalidation.get('path'):
+                self._prevalidation['hash'] = res.get('hash')
+        except Exception:
+            logging.exception('Ошибка обработки хэша содержимого')
+
+    def _offer_existing_upload(self, path):
+        """Если такое же видео уже загружалось — предлагаем готовую ссылку.
+        Возвращает True, если пользователь выбрал существующую ссылку (загрузка не нужна)."""
+        pv = self._prevalidation or {}
+        digest = pv.get('hash') if pv.get('path') == path else None
+        entry = content_index.lookup(digest or content_index.cached_hash(path))
+        if not entry:
+            return False
+        m = QMessageBox(self)
+        m.setWindowTitle('Видео уже загружено')
+        m.setText(f"Это видео уже загружено ({entry.get('title', '')}, {str(entry.get('time', '')).split('T')[0]}):\n"
+                  f"{entry['url']}\n\nИспользовать существующую ссылку?")
+        use_btn = m.addButton('Использовать ссылку', QMessageBox.ButtonRole.AcceptRole)
+        m.addButton('Загрузить снова', QMessageBox.ButtonRole.RejectRole)
+        try: self._style_dialog(m)
+        except: pass
+        m.exec()
+        if m.clickedButton() is not use_btn:
+            return False
+        self.video_url = entry['url']
+        self.vid_link.setText(entry['url'])
+        self.link_container.setVisible(True)
+        self.status_label.setText("✓ Видео уже было загружено — используется существующая ссылка")
+        self.status_label.setStyleSheet("color: #51CF66; font-size: 12px; padding: 8px;")
+        logging.info(f"Повторная загрузка пропущена, найдено по содержимому: {entry['url']}")
+        return True
+
     def start_upload(self):
         if not self.video_path:
             self.status_label.setText("❌ Выберите видео")
@@ -2819,16 +3900,13 @@ class MainWindow(QMainWindow):
             self.status_label.setText("❌ Авторизуйтесь")
             self.status_label.setStyleSheet("color: #FF6B6B; font-size: 12px; padding: 8px;")
             return
-        d = f"Ссылка на жалобу: {lk}"
-        ex = self.desc_input.toPlainText().strip()
-        if ex: d += f"\n\n{ex}"
-        self.upload_btn.setEnabled(False)
-        self.status_label.setText("⏳ Подготовка...")
-        self.status_label.setStyleSheet("color: #FFD93D; font-size: 12px; padding: 8px;")
-        self.link_container.setVisible(False)
-        if self.upload_thread and self.upload_thread.isRunning():
-            self.upload_thread.quit()
-            self.upload_thread.wait()
+        # результат фоновой проверки: ошибку показываем сразу, успешная проверка уже в кэше валидатора
+        pv = self._prevalidation
+        if pv and pv.get('path') == self.video_path and pv.get('ok') is False:
+            self.status_label.setText(f"❌ Ошибка проверки видео: {pv.get('error')}")
+            self.status_label.setStyleSheet("color: #FF6B6B; font-size: 12px; padding: 8px;")
+            return
+        d = build_description(lk, self.desc_input.toPlainText().strip())
         # determine privacy for this upload (per-upload override or default)
         try:
             if getattr(self, 'upload_privacy_combo', None):
@@ -2838,58 +3916,169 @@ class MainWindow(QMainWindow):
         except Exception:
             privacy = getattr(self, 'default_privacy', 'private')
 
-        # remember title/privacy for history
+        is_temp = self.video_path in getattr(self, '_temp_trim_files', [])
+        trim = self._stream_trim if self._stream_trim and self._stream_trim.get('source') == self.video_path else None
+        # то же содержимое уже загружалось — не тратим трафик и квоту (для потоковой обрезки хэша нет)
         try:
-            self._last_upload_title = n
-            self._last_upload_privacy = privacy
+            if trim is None and self._offer_existing_upload(self.video_path):
+                return
         except Exception:
-            self._last_upload_title = n
-            self._last_upload_privacy = privacy
-
-        self.upload_thread = UploadThread(self.creds, self.video_path, n, d, allow_missing_ffmpeg=getattr(self, 'allow_upload_without_ffmpeg', False), privacy_status=privacy)
-        self.upload_thread.progress.connect(self.update_progress)
-        self.upload_thread.finished.connect(self.upload_done)
-        self.upload_thread.start()
-    
-    def update_progress(self, m):
-        self.status_label.setText(f"⏳ {m}")
+            logging.exception('Ошибка проверки повторной загрузки')
+        self._stream_trim = None
+        item_id = self.upload_queue.enqueue(self.video_path, n, d, privacy,
+                                            allow_missing_ffmpeg=getattr(self, 'allow_upload_without_ffmpeg', False),
+                                            temp_file=is_temp, trim=trim)
+        if is_temp:
+            # временный файл теперь удаляет очередь после загрузки
+            self._temp_trim_files.remove(self.video_path)
+
+        # форма сразу освобождается под следующее видео
+        self.name_input.clear()
+        self.link_input.clear()
+        self.desc_input.clear()
+        self.video_path = None
+        self.vid_label.setText("Файл не выбран")
+        self.vid_label.setStyleSheet("color: rgba(255,255,255,0.5); font-size: 12px;")
+        try:
+            self.update_editor_indicator()
+        except Exception:
+            pass
+        queued = self.upload_queue.get(item_id)
+        if queued is not None and queued['status'] == 'deferred':
+            self.status_label.setText(f"⏸ Квота YouTube на сегодня исчерпана — загрузка начнётся после {quota_ledger.reset_at_local()}")
+        else:
+            self.status_label.setText(f"⏳ Добавлено в очередь (активных: {self.upload_queue.pending_count()})")
         self.status_label.setStyleSheet("color: #FFD93D; font-size: 12px; padding: 8px;")
+
+    def _offer_resume_pending_uploads(self):
+        """При старте предлагаем продолжить загрузки, прерванные закрытием/сбоем приложения."""
+        try:
+            pending = upload_journal.pending()
+            if not pending or not self.creds or not self.creds.valid:
+                return
+            queued = {os.path.abspath(it['path']) for it in self.upload_queue.items
+                      if it['status'] in ('queued', 'deferred', 'running')}
+            pending = [e for e in pending if os.path.abspath(e['path']) not in queued]
+            if not pending:
+                return
+            lines = []
+            for entry in pending[:10]:
+                done_mb = entry.get('offset', 0) / (1024 * 1024)
+                total_mb = entry.get('size', 0) / (1024 * 1024)
+                lines.append(f"{os.path.basename(entry['path'])} ({done_mb:.1f}/{total_mb:.1f} MB)")
+            m = QMessageBox(self)
+            m.setWindowTitle('Незавершённые загрузки')
+            m.setText("Найдены прерванные загрузки:\n" + "\n".join(lines) + "\n\nПродолжить?")
+            resume_btn = m.addButton('Продолжить', QMessageBox.ButtonRole.AcceptRole)
+            drop_btn = m.addButton('Удалить', QMessageBox.ButtonRole.DestructiveRole)
+            m.addButton('Позже', QMessageBox.ButtonRole.RejectRole)
+            try: self._style_dialog(m)
+            except: pass
+            m.exec()
+            clicked = m.clickedButton()
+            if clicked is resume_btn:
+                self.switch_page(1)
+                for entry in pending:
+                    meta = entry.get('meta') or {}
+                    self.upload_queue.enqueue(entry['path'], meta.get('title', ''), meta.get('desc', ''),
+                                              meta.get('privacy', getattr(self, 'default_privacy', 'private')),
+                                              allow_missing_ffmpeg=getattr(self, 'allow_upload_without_ffmpeg', False))
+            elif clicked is drop_btn:
+                for entry in pending:
+                    upload_journal.remove(entry['path'], discard_prepared=True)
+        except Exception:
+            logging.exception('Ошибка проверки незавершённых загрузок')
+
+    def _on_queue_item_changed(self, item_id):
+        """Обновление строки очереди (статус/прогресс отдельного видео)."""
+        try:
+            it = self.upload_queue.get(item_id)
+            if it is None or not hasattr(self, 'queue_list'):
+                return
+            self._update_upload_progress_bar()
+            text = self.upload_queue.describe(it)
+            for row in range(self.queue_list.count()):
+                li = self.queue_list.item(row)
+                if li.data(Qt.ItemDataRole.UserRole) == item_id:
+                    li.setText(text)
+                    return
+            li = QListWidgetItem(text)
+            li.setData(Qt.ItemDataRole.UserRole, item_id)
+            self.queue_list.addItem(li)
+        except Exception:
+            logging.exception('Ошибка обновления строки очереди')
+
+    def _update_upload_progress_bar(self):
+        try:
+            if not hasattr(self, 'upload_progress_bar'):
+                return
+            sent, total, rate = self.upload_queue.overall_progress()
+            if not total:
+                self.upload_progress_bar.setVisible(False)
+                return
+            self.upload_progress_bar.setVisible(True)
+            self.upload_progress_bar.setValue(int(sent / total * 1000))
+            text = f"{sent / total * 100:.0f}%"
+            if rate:
+                text += f" · {rate / (1024 * 1024):.2f} MB/s"
+                left = int((total - sent) / rate)
+                text += f" · осталось {left // 60}:{left % 60:02d}"
+            self.upload_progress_bar.setFormat(text)
+        except Exception:
+            logging.exception('Ошибка обновления общего прогресса')
+
+    def _clear_finished_queue(self):
+        try:
+            self.upload_queue.clear_finished()
+            alive = {it['id'] for it in self.upload_queue.items}
+            for row in reversed(range(self.queue_list.count())):
+                if self.queue_list.item(row).data(Qt.ItemDataRole.UserRole) not in alive:
+                    self.queue_list.takeItem(row)
+        except Exception:
+            pass
+
+    def _cancel_queue(self):
+        try:
+            self.upload_queue.cancel_all()
+            self.status_label.setText("✕ Загрузки отменены")
+            self.status_label.setStyleSheet("color: #FF6B6B; font-size: 12px; padding: 8px;")
+        except Exception:
+            logging.exception('Ошибка отмены очереди')
     
-    def upload_done(self, s, r):
-        self.upload_btn.setEnabled(True)
+    def upload_done(self, item_id, s, r):
+        it = self.upload_queue.get(item_id) or {}
+        left = self.upload_queue.pending_count()
+        watched = item_id in self._watched_items
+        self._watched_items.discard(item_id)
         if s:
             self.video_url = r
-            self.status_label.setText("✓ Загружено!")
+            suffix = f" (в очереди ещё {left})" if left else ""
+            self.status_label.setText(f"✓ Загружено, идёт обработка на YouTube: {it.get('title', '')}{suffix}")
             self.status_label.setStyleSheet("color: #51CF66; font-size: 12px; padding: 8px;")
             self.vid_link.setText(r)
             self.link_container.setVisible(True)
-            self.name_input.clear()
-            self.link_input.clear()
-            self.desc_input.clear()
-            # cleanup temporary trimmed files if any
+            # Добавляем запись в историю
             try:
-                for tf in list(getattr(self, '_temp_trim_files', [])):
-                    try:
-                        if os.path.exists(tf):
-                            os.unlink(tf)
-                    except Exception:
-                        pass
-                self._temp_trim_files = []
+                privacy = it.get('privacy', getattr(self, 'default_privacy', 'private'))
+                self._add_history_entry(self.video_url, it.get('title', ''), privacy, stats=it.get('stats'),
+                                        content_hash=it.get('hash'), video_id=it.get('video_id'))
             except Exception:
                 pass
-            self.video_path = None
-            self.vid_label.setText("Файл не выбран")
-            self.vid_label.setStyleSheet("color: rgba(255,255,255,0.5); font-size: 12px;")
-            # Добавляем запись в историю
+            self.processing_poller.track(it.get('video_id'))
             try:
-                title = getattr(self, '_last_upload_title', '')
-                privacy = getattr(self, '_last_upload_privacy', getattr(self, 'default_privacy', 'private'))
-                self._add_history_entry(self.video_url, title, privacy)
+                self.post_upload.add_video(it.get('video_id'))
+                if not self.upload_queue.pending_count():
+                    # очередь закончилась — дожидаться остальных видео незачем
+                    self.post_upload.flush()
             except Exception:
-                pass
+                logging.exception('Не удалось запланировать операции после загрузки')
         else:
-            self.status_label.setText(f"❌ {r}")
+            self.status_label.setText(f"❌ {it.get('title', '')}: {r}")
             self.status_label.setStyleSheet("color: #FF6B6B; font-size: 12px; padding: 8px;")
+            if watched:
+                # автозагрузка идёт без присмотра — неудача остаётся в истории, а не только в строке статуса
+                privacy = it.get('privacy', getattr(self, 'default_privacy', 'private'))
+                self._add_history_entry('', it.get('title', ''), privacy, skipped='failed', error=str(r))
     
     def copy_link(self):
         if self.video_url:
@@ -2916,6 +4105,7 @@ class MainWindow(QMainWindow):
             if os.path.exists(self.HISTORY_FILE):
                 with open(self.HISTORY_FILE, 'r', encoding='utf-8') as f:
                     self.upload_history = json.load(f) or []
+            content_index.merge_history(self.upload_history)
         except Exception:
             self.upload_history = []
         # refresh UI if possible
@@ -2932,7 +4122,59 @@ class MainWindow(QMainWindow):
         except Exception:
             logging.exception('Не удалось сохранить историю загрузок')
 
-    def _add_history_entry(self, url, title, privacy):
+    def _on_post_upload_op(self, video_id, op, ok, result):
+        """Результат операции после загрузки: отмечаем его в записи истории."""
+        try:
+            if not ok:
+                return
+            for e in self.upload_history:
+                if not e.get('skipped') and str(e.get('url', '')).endswith(f"v={video_id}"):
+                    if op == 'playlist':
+                        e['playlist_id'] = (result or {}).get('snippet', {}).get('playlistId', '')
+                    self._save_upload_history()
+                    break
+            logging.info(f"Операция после загрузки {op} для {video_id} выполнена")
+        except Exception:
+            logging.exception('Ошибка обработки результата операции после загрузки')
+
+    def _on_processing_status(self, video_id, info):
+        """Изменился статус обработки видео: обновляем запись истории."""
+        try:
+            for e in self.upload_history:
+                if not e.get('skipped') and str(e.get('url', '')).endswith(f"v={video_id}"):
+                    e['upload_status'] = info.get('upload_status', '')
+                    e['processing_status'] = info.get('processing_status', '')
+                    e['playable'] = bool(info.get('playable'))
+                    if info.get('failure'):
+                        e['processing_failure'] = info['failure']
+                    self._save_upload_history()
+                    self._refresh_history_ui()
+                    if e['playable']:
+                        logging.info(f"Видео {video_id} обработано YouTube и доступно для просмотра")
+                        self.status_label.setText(f"▶ Обработка завершена: {e.get('title', '')}")
+                        self.status_label.setStyleSheet("color: #51CF66; font-size: 12px; padding: 8px;")
+                    elif info.get('failure') or info.get('upload_status') in ProcessingPoller.FAILED_STATUSES:
+                        logging.warning(f"Обработка видео {video_id} не удалась: {info}")
+                    break
+        except Exception:
+            logging.exception('Ошибка обновления статуса обработки')
+
+    def _track_unprocessed_history(self):
+        """После запуска продолжаем следить за видео из истории, обработка которых не завершилась."""
+        now = datetime.now()
+        for e in self.upload_history:
+            if e.get('playable') is not False or not e.get('video_id') or e.get('processing_failure'):
+                continue
+            try:
+                since = datetime.fromisoformat(e.get('time', ''))
+            except (TypeError, ValueError):
+                continue
+            age = (now - since).total_seconds()
+            if age < ProcessingPoller.MAX_TRACK_SECONDS:
+                self.processing_poller.track(e['video_id'], since=time.time() - age)
+
+    def _add_history_entry(self, url, title, privacy, stats=None, content_hash=None, video_id=None,
+                           skipped=None, error=None):
         try:
             entry = {
                 'url': url,
@@ -2940,6 +4182,22 @@ class MainWindow(QMainWindow):
                 'privacy': privacy,
                 'time': datetime.now().isoformat()
             }
+            if skipped:
+                # автозагрузка не выполнена: 'invalid' — файл не прошёл проверку,
+                # 'duplicate' — такое видео уже загружено (url — существующая ссылка),
+                # 'no_auth' — нет авторизации, 'failed' — загрузка завершилась ошибкой
+                entry['skipped'] = skipped
+                if error:
+                    entry['error'] = error
+            if video_id:
+                # ссылка рабочая только после обработки на YouTube (ProcessingPoller)
+                entry['video_id'] = video_id
+                entry['playable'] = False
+            # статистика загрузки (UploadStats.summary): скорость, задержки чанков, повторы, этапы
+            if stats:
+                entry['stats'] = stats
+            if content_hash:
+                entry['hash'] = content_hash
             # prepend
             self.upload_history.insert(0, entry)
             # keep only last 100 entries
@@ -2959,8 +4217,30 @@ class MainWindow(QMainWindow):
                     p = e.get('privacy', '')
                     url = e.get('url', '')
                     label = f"{t} — {p} — {dt.split('T')[0]}"
+                    if e.get('skipped') == 'invalid':
+                        label += " — ❌ не прошёл проверку"
+                    elif e.get('skipped') == 'duplicate':
+                        label += " — ↺ уже загружено"
+                    elif e.get('skipped') == 'no_auth':
+                        label += " — 🔒 не загружено: нет авторизации"
+                    elif e.get('skipped') == 'failed':
+                        label += " — ❌ ошибка загрузки"
+                    elif e.get('playable') is False:
+                        failed = e.get('processing_failure') or e.get('upload_status') in ProcessingPoller.FAILED_STATUSES
+                        label += " — ❌ ошибка обработки" if failed else " — ⏳ обрабатывается"
                     item = QListWidgetItem(label)
                     item.setData(Qt.ItemDataRole.UserRole, url)
+                    if e.get('error'):
+                        item.setToolTip(f"Автозагрузка: {e['error']}")
+                    st = e.get('stats')
+                    if st:
+                        phases = ', '.join(f"{k} {v:.1f} c" for k, v in (st.get('phases') or {}).items())
+                        lat = st.get('latency_avg')
+                        item.setToolTip(
+                            f"Время: {st.get('elapsed', 0):.0f} c ({phases})\n"
+                            f"Скорость: {st.get('avg_rate', 0) / (1024 * 1024):.2f} MB/s, чанков: {st.get('chunks', 0)}\n"
+                            f"Ответ сервера: ср. {(lat or 0) * 1000:.0f} мс, макс. {(st.get('latency_max') or 0) * 1000:.0f} мс\n"
+                            f"Повторов: {st.get('retries', 0)} (ожидание {st.get('retry_wait', 0):.0f} c)")
                     self.upload_history_list.addItem(item)
         except Exception:
             pass
@@ -3489,6 +4769,173 @@ class MainWindow(QMainWindow):
         except Exception:
             logging.exception('Ошибка обновления allow_upload_without_ffmpeg')
 
+    def on_max_concurrent_changed(self, value: int):
+        """Изменение числа одновременных загрузок очереди."""
+        try:
+            self.max_concurrent_uploads = int(value)
+            self.upload_queue.set_max_concurrent(self.max_concurrent_uploads)
+            try:
+                self._save_settings()
+            except Exception:
+                logging.exception('Не удалось сохранить настройку max_concurrent_uploads')
+        except Exception:
+            logging.exception('Ошибка обновления max_concurrent_uploads')
+
+    def on_validation_mode_changed(self, mode):
+        """Изменение уровня проверки видео перед загрузкой."""
+        try:
+            if mode not in VideoValidator.MODES:
+                return
+            self.validation_mode = mode
+            self.upload_queue.validation_mode = mode
+            try:
+                self._save_settings()
+            except Exception:
+                logging.exception('Не удалось сохранить настройку validation_mode')
+        except Exception:
+            logging.exception('Ошибка обновления validation_mode')
+
+    def on_toggle_faststart(self, enabled: bool):
+        """Включение/выключение faststart-ремукса перед загрузкой."""
+        try:
+            self.faststart_before_upload = bool(enabled)
+            self.upload_queue.faststart = self.faststart_before_upload
+            try:
+                self._save_settings()
+            except Exception:
+                logging.exception('Не удалось сохранить настройку faststart_before_upload')
+        except Exception:
+            logging.exception('Ошибка обновления faststart_before_upload')
+
+    def _watch_folder_paths(self):
+        return [f.get('path') if isinstance(f, dict) else f for f in getattr(self, 'watch_folders', [])]
+
+    def _update_watch_label(self):
+        try:
+            paths = self._watch_folder_paths()
+            self.watch_label.setText(f"Автозагрузка новых записей ({len(paths)} папок)")
+            self.watch_label.setToolTip("\n".join(paths) or "Папки не выбраны")
+        except Exception:
+            pass
+
+    def _apply_watch_folders(self):
+        """Запуск/остановка наблюдения по текущим настройкам."""
+        try:
+            if getattr(self, 'watch_enabled', False) and self.watch_folders:
+                self.folder_watcher.start(self.watch_folders)
+            else:
+                self.folder_watcher.stop()
+        except Exception:
+            logging.exception('Ошибка запуска наблюдения за папками')
+
+    def on_toggle_watch(self, enabled: bool):
+        try:
+            self.watch_enabled = bool(enabled)
+            self._apply_watch_folders()
+            try:
+                self._save_settings()
+            except Exception:
+                logging.exception('Не удалось сохранить настройку watch_enabled')
+        except Exception:
+            logging.exception('Ошибка обновления watch_enabled')
+
+    def _add_watch_folder(self):
+        try:
+            folder = QFileDialog.getExistingDirectory(self, 'Папка с записями')
+            if not folder or folder in self._watch_folder_paths():
+                return
+            self.watch_folders.append(folder)
+            self._update_watch_label()
+            self._apply_watch_folders()
+            self._save_settings()
+        except Exception:
+            logging.exception('Ошибка добавления папки наблюдения')
+
+    def _clear_watch_folders(self):
+        try:
+            self.watch_folders = []
+            self._update_watch_label()
+            self._apply_watch_folders()
+            self._save_settings()
+        except Exception:
+            logging.exception('Ошибка очистки папок наблюдения')
+
+    def _on_watched_file_ready(self, path, opts):
+        """Новая запись в папке наблюдения: проверка и хэш в фоне, затем постановка в очередь."""
+        try:
+            res = {'path': path, 'ok': None, 'error': None, 'hash': None}
+            th = PrevalidateThread(path, validation_mode=getattr(self, 'validation_mode', 'sampled'),
+                                   allow_missing_ffmpeg=getattr(self, 'allow_upload_without_ffmpeg', False), parent=self)
+            th.done.connect(lambda r, res=res: res.update(ok=r.get('ok'), error=r.get('error')))
+            th.hashed.connect(lambda r, res=res: res.update(hash=r.get('hash')))
+            th.finished.connect(lambda res=res, opts=opts, th=th: self._enqueue_watched(res, opts, th))
+            self._watch_threads.append(th)
+            th.start(QThread.Priority.LowPriority)
+        except Exception:
+            logging.exception('Ошибка обработки новой записи')
+
+    def _enqueue_watched(self, res, opts, th):
+        try:
+            if th in self._watch_threads:
+                self._watch_threads.remove(th)
+            path = res['path']
+            name = os.path.basename(path)
+            if res.get('ok') is None:
+                # проверка прервана (закрытие окна, смена папок) — файл не проверен, в очередь не ставим
+                logging.info(f"Автозагрузка: проверка {name} прервана, файл пропущен")
+                return
+            privacy = opts.get('privacy') or getattr(self, 'default_privacy', 'private')
+            if not res.get('ok'):
+                logging.warning(f"Автозагрузка: {name} не прошёл проверку: {res.get('error')}")
+                self.status_label.setText(f"❌ Автозагрузка: {name}: {res.get('error')}")
+                self.status_label.setStyleSheet("color: #FF6B6B; font-size: 12px; padding: 8px;")
+                self._add_history_entry('', name, privacy, skipped='invalid', error=res.get('error'))
+                return
+            existing = content_index.lookup(res.get('hash'))
+            if existing:
+                logging.info(f"Автозагрузка: {name} уже загружен ({existing['url']}), пропускаем")
+                self._add_history_entry(existing['url'], name, privacy, skipped='duplicate')
+                return
+            if not self.creds or not self.creds.valid:
+                logging.warning(f"Автозагрузка: {name} пропущен — нет авторизации")
+                self.status_label.setText(f"🔒 Автозагрузка: {name} пропущен — войдите в аккаунт YouTube")
+                self.status_label.setStyleSheet("color: #FF6B6B; font-size: 12px; padding: 8px;")
+                self._add_history_entry('', name, privacy, skipped='no_auth', error='нет авторизации')
+                return
+            link = opts.get('link', '')
+            desc = build_description(link) if link else ''
+            item_id = self.upload_queue.enqueue(path, os.path.splitext(name)[0], desc, privacy,
+                                                allow_missing_ffmpeg=getattr(self, 'allow_upload_without_ffmpeg', False))
+            self._watched_items.add(item_id)
+            self.status_label.setText(f"⏳ Автозагрузка: {name} добавлен в очередь")
+            self.status_label.setStyleSheet("color: #FFD93D; font-size: 12px; padding: 8px;")
+        except Exception:
+            logging.exception('Ошибка постановки новой записи в очередь')
+
+    def on_upload_limit_changed(self, key, value):
+        """Изменение лимита скорости загрузки (применяется и к идущим загрузкам)."""
+        try:
+            setattr(self, key, max(0, int(value)))
+            self._apply_upload_limit()
+            try:
+                self._save_settings()
+            except Exception:
+                logging.exception(f'Не удалось сохранить настройку {key}')
+        except Exception:
+            logging.exception(f'Ошибка обновления {key}')
+
+    def _apply_upload_limit(self):
+        """Выставляет лимит upload_bandwidth по расписанию (вызывается таймером раз в минуту)."""
+        try:
+            kbps = scheduled_upload_limit_kbps(getattr(self, 'upload_limit_kbps', 0),
+                                               getattr(self, 'work_hours_limit_kbps', 0),
+                                               getattr(self, 'work_hours', ''))
+            if kbps * 1024 != upload_bandwidth.rate:
+                upload_bandwidth.set_rate(kbps * 1024)
+                logging.info(f"Лимит скорости загрузки: {kbps} КБ/с" if kbps else "Лимит скорости загрузки снят")
+        except Exception:
+            logging.exception('Ошибка применения лимита скорости загрузки')
+
     def on_toggle_auto_check(self, enabled: bool):
         """Handler for auto-check checkbox."""
         try: